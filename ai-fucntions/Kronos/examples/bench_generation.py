@@ -0,0 +1,189 @@
+"""
+Per-step latency benchmark for auto_regressive_inference.
+
+Compares the original generation loop (copied below as original_auto_regressive_inference: inputs repeated
+sample_count times up front, full recompute every step, torch.cat token growth, empty_cache after every step)
+with the current auto_regressive_inference in several configurations, and with --compile the eager decode
+step against the compiled one (torch.compile, CUDA graph on GPU). Uses randomly initialised
+models by default, so no checkpoint download is needed; pass --pretrained to load the Hub models instead.
+
+Usage:
+    python examples/bench_generation.py --device cuda:0 --lookback 400 --pred-len 120 --sample-count 5
+    python examples/bench_generation.py --device cpu --compile
+    python examples/bench_generation.py --pretrained NeoQuasar/Kronos-small NeoQuasar/Kronos-Tokenizer-base
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import numpy as np
+
+from model.kronos import Kronos, KronosTokenizer, StaticDecoder, auto_regressive_inference, sample_from_logits
+
+
+def original_auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5):
+    """The generation loop as it was before the KV cache / buffer work, kept verbatim as the benchmark baseline."""
+    with torch.no_grad():
+        batch_size = x.size(0)
+        initial_seq_len = x.size(1)
+        x = torch.clip(x, -clip, clip)
+
+        device = x.device
+        x = x.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x.size(1), x.size(2)).to(device)
+        x_stamp = x_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x_stamp.size(1), x_stamp.size(2)).to(device)
+        y_stamp = y_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, y_stamp.size(1), y_stamp.size(2)).to(device)
+
+        x_token = tokenizer.encode(x, half=True)
+
+        def get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, pred_step):
+
+            if current_seq_len <= max_context - pred_step:
+                return torch.cat([x_stamp, y_stamp[:, :pred_step, :]], dim=1)
+            else:
+                start_idx = max_context - pred_step
+                return torch.cat([x_stamp[:, -start_idx:, :], y_stamp[:, :pred_step, :]], dim=1)
+
+        for i in range(pred_len):
+            current_seq_len = initial_seq_len + i
+
+            if current_seq_len <= max_context:
+                input_tokens = x_token
+            else:
+                input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
+
+            current_stamp = get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, i)
+
+            s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp)
+            s1_logits = s1_logits[:, -1, :]
+            sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+
+            s2_logits = model.decode_s2(context, sample_pre)
+            s2_logits = s2_logits[:, -1, :]
+            sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
+
+            x_token[0] = torch.cat([x_token[0], sample_pre], dim=1)
+            x_token[1] = torch.cat([x_token[1], sample_post], dim=1)
+            if torch.device("mps") == device:
+                torch.mps.empty_cache()
+            else:
+                torch.cuda.empty_cache()
+
+        input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
+        z = tokenizer.decode(input_tokens, half=True)
+        z = z.reshape(batch_size, sample_count, z.size(1), z.size(2))
+        preds = z.cpu().numpy()
+        preds = np.mean(preds, axis=1)
+
+        return preds
+
+
+def build_models(args):
+    if args.pretrained:
+        model = Kronos.from_pretrained(args.pretrained[0])
+        tokenizer = KronosTokenizer.from_pretrained(args.pretrained[1])
+    else:
+        torch.manual_seed(0)
+        tokenizer = KronosTokenizer(d_in=6, d_model=args.d_model, n_heads=args.n_heads, ff_dim=args.ff_dim,
+                                    n_enc_layers=4, n_dec_layers=4, ffn_dropout_p=0.0, attn_dropout_p=0.0, resid_dropout_p=0.0,
+                                    s1_bits=args.s_bits, s2_bits=args.s_bits, beta=0.05, gamma0=1.0, gamma=1.1, zeta=0.05,
+                                    group_size=args.s_bits)
+        model = Kronos(s1_bits=args.s_bits, s2_bits=args.s_bits, n_layers=args.n_layers, d_model=args.d_model,
+                       n_heads=args.n_heads, ff_dim=args.ff_dim, ffn_dropout_p=0.0, attn_dropout_p=0.0,
+                       resid_dropout_p=0.0, token_dropout_p=0.0, learn_te=True)
+    return tokenizer.to(args.device).eval(), model.to(args.device).eval()
+
+
+def make_inputs(args):
+    g = torch.Generator().manual_seed(1)
+    x = torch.randn(args.batch, args.lookback, 6, generator=g)
+
+    def stamps(length):
+        return torch.stack([
+            torch.zeros(args.batch, length), torch.zeros(args.batch, length),
+            torch.randint(0, 5, (args.batch, length), generator=g).float(),
+            torch.randint(1, 29, (args.batch, length), generator=g).float(),
+            torch.randint(1, 13, (args.batch, length), generator=g).float(),
+        ], dim=-1)
+
+    return x.to(args.device), stamps(args.lookback).to(args.device), stamps(args.pred_len).to(args.device)
+
+
+def synchronize(device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+
+def run(tokenizer, model, inputs, args, fn=auto_regressive_inference, **kwargs):
+    x, x_stamp, y_stamp = inputs
+    best = float("inf")
+    for r in range(args.repeat + 1):
+        torch.manual_seed(r)
+        synchronize(args.device)
+        t0 = time.perf_counter()
+        fn(tokenizer, model, x, x_stamp, y_stamp, args.max_context, args.pred_len,
+           T=1.0, top_k=0, top_p=0.9, sample_count=args.sample_count, **kwargs)
+        synchronize(args.device)
+        if r > 0:  # first run is warm-up
+            best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--pretrained", nargs=2, metavar=("MODEL", "TOKENIZER"))
+    parser.add_argument("--d-model", type=int, default=256)
+    parser.add_argument("--n-heads", type=int, default=4)
+    parser.add_argument("--ff-dim", type=int, default=512)
+    parser.add_argument("--n-layers", type=int, default=8)
+    parser.add_argument("--s-bits", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--lookback", type=int, default=400)
+    parser.add_argument("--pred-len", type=int, default=120)
+    parser.add_argument("--max-context", type=int, default=512)
+    parser.add_argument("--sample-count", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compile", action="store_true", help="also benchmark the compiled decode step")
+    parser.add_argument("--no-cuda-graph", action="store_true", help="compile without CUDA-graph capture")
+    args = parser.parse_args()
+
+    tokenizer, model = build_models(args)
+    inputs = make_inputs(args)
+    print(f"torch {torch.__version__} | device {args.device} | batch {args.batch} x samples {args.sample_count} | "
+          f"lookback {args.lookback} | pred_len {args.pred_len} | max_context {args.max_context}")
+
+    variants = [
+        ("before: original loop", dict(fn=original_auto_regressive_inference)),
+        ("recompute + per-step empty_cache", dict(use_kv_cache=False, release_memory="step")),
+        ("recompute, no per-step empty_cache", dict(use_kv_cache=False, release_memory="none")),
+        ("after: kv-cache, release at end", dict(use_kv_cache=True, release_memory="end")),
+        ("after: kv-cache, keep allocator pool", dict(use_kv_cache=True, release_memory="none")),
+    ]
+    if args.compile:
+        t0 = time.perf_counter()
+        decoder = StaticDecoder(model, args.batch * args.sample_count, args.max_context, args.device,
+                                compile=True, cuda_graph=not args.no_cuda_graph)
+        decoder.warmup()
+        graph = "CUDA graph" if decoder.graph is not None else "no CUDA graph"
+        print(f"compiled decode step ready in {time.perf_counter() - t0:.1f} s ({graph})")
+        variants.append((f"compiled kv-cache step ({graph})", dict(use_kv_cache=True, release_memory="none", static_decoder=decoder)))
+
+    baseline = None
+    rows = args.batch * args.sample_count
+    for name, kwargs in variants:
+        elapsed = run(tokenizer, model, inputs, args, **kwargs)
+        per_step = elapsed / args.pred_len * 1000
+        tokens_per_s = rows * args.pred_len / elapsed
+        baseline = baseline or per_step
+        print(f"{name:<40} {per_step:8.2f} ms/step | {tokens_per_s:9.1f} tokens/s | {elapsed:7.2f} s total | {baseline / per_step:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
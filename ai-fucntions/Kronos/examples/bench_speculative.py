@@ -0,0 +1,166 @@
+"""
+Quality / latency benchmark of speculative decoding (auto_regressive_inference with draft_model) against the plain
+auto_regressive_inference.
+
+The draft has to share the model's tokenizer, e.g. Kronos-small drafting for Kronos-base (both Kronos-Tokenizer-base).
+For every window of a K-line CSV (like examples/data/XSHG_5min_600977.csv; a random walk when the file is missing)
+the report shows, per draft_len:
+
+- latency per forecast and speedup over the plain loop
+- bars per round (target passes) and draft acceptance, in lockstep over all rows and per row
+- close MAE against the actual bars, and the mean absolute difference of the forecast to the plain forecast,
+  next to the same difference between two plain runs with different seeds (the sampling noise floor)
+
+All values are in normalized units (history mean / std, as in KronosPredictor). --random uses randomly initialised
+models (no download); only the latency columns are meaningful then.
+
+Usage:
+    python examples/bench_speculative.py --device cuda:0 --model NeoQuasar/Kronos-base --draft NeoQuasar/Kronos-small
+    python examples/bench_speculative.py --random --device cpu --draft-lens 2 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from model.kronos import Kronos, KronosTokenizer, auto_regressive_inference, calc_time_stamps
+
+FEATURES = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+def build_models(args):
+    if not args.random:
+        tokenizer = KronosTokenizer.from_pretrained(args.tokenizer)
+        model = Kronos.from_pretrained(args.model)
+        draft = Kronos.from_pretrained(args.draft)
+    else:
+        torch.manual_seed(0)
+        tokenizer = KronosTokenizer(d_in=6, d_model=256, n_heads=4, ff_dim=512, n_enc_layers=4, n_dec_layers=4,
+                                    ffn_dropout_p=0.0, attn_dropout_p=0.0, resid_dropout_p=0.0, s1_bits=10, s2_bits=10,
+                                    beta=0.05, gamma0=1.0, gamma=1.1, zeta=0.05, group_size=10)
+
+        def kronos(n_layers, d_model):
+            return Kronos(s1_bits=10, s2_bits=10, n_layers=n_layers, d_model=d_model, n_heads=8, ff_dim=d_model * 2,
+                          ffn_dropout_p=0.0, attn_dropout_p=0.0, resid_dropout_p=0.0, token_dropout_p=0.0, learn_te=True)
+
+        model, draft = kronos(12, 832), kronos(2, 256)
+    return [m.to(args.device).eval() for m in (tokenizer, model, draft)]
+
+
+def load_data(args):
+    if os.path.exists(args.csv):
+        df = pd.read_csv(args.csv)
+        df['timestamps'] = pd.to_datetime(df['timestamps'])
+        return df
+    print(f"{args.csv} not found, using a random walk")
+    rng = np.random.default_rng(args.seed)
+    n = args.lookback + args.pred_len + 500
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    volume = rng.lognormal(10, 0.5, n)
+    return pd.DataFrame({'timestamps': pd.date_range("2024-01-02 09:35", periods=n, freq="5min"),
+                         'open': close * (1 + rng.normal(0, 0.001, n)), 'high': close * 1.002, 'low': close * 0.998,
+                         'close': close, 'volume': volume, 'amount': volume * close})
+
+
+def make_windows(df, args):
+    last = len(df) - args.lookback - args.pred_len
+    windows = []
+    for start in np.linspace(max(0, last - args.windows * args.pred_len), last, args.windows).astype(int):
+        values = df[FEATURES].values[start:start + args.lookback + args.pred_len].astype(np.float32)
+        mean, std = values[:args.lookback].mean(axis=0), values[:args.lookback].std(axis=0)
+        values = (values - mean) / (std + 1e-5)
+        stamps = calc_time_stamps(df['timestamps'].iloc[start:start + args.lookback + args.pred_len]).values.astype(np.float32)
+        x = torch.from_numpy(values[np.newaxis, :args.lookback]).to(args.device)
+        x_stamp = torch.from_numpy(stamps[np.newaxis, :args.lookback]).to(args.device)
+        y_stamp = torch.from_numpy(stamps[np.newaxis, args.lookback:]).to(args.device)
+        windows.append((x, x_stamp, y_stamp, values[args.lookback:, 3]))
+    return windows
+
+
+def synchronize(device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+
+def forecast(tokenizer, model, window, args, seed, **kwargs):
+    x, x_stamp, y_stamp, _ = window
+    torch.manual_seed(seed)
+    synchronize(args.device)
+    t0 = time.perf_counter()
+    preds = auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, args.max_context, args.pred_len,
+                                      T=args.T, top_k=0, top_p=args.top_p, sample_count=args.sample_count, **kwargs)
+    synchronize(args.device)
+    return preds[0, -args.pred_len:, 3], time.perf_counter() - t0
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="NeoQuasar/Kronos-base")
+    parser.add_argument("--draft", default="NeoQuasar/Kronos-small")
+    parser.add_argument("--tokenizer", default="NeoQuasar/Kronos-Tokenizer-base")
+    parser.add_argument("--random", action="store_true", help="randomly initialised models instead of the Hub models")
+    parser.add_argument("--csv", default=os.path.join(current_dir, "data/XSHG_5min_600977.csv"))
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--draft-lens", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--max-context", type=int, default=512)
+    parser.add_argument("--lookback", type=int, default=400)
+    parser.add_argument("--pred-len", type=int, default=120)
+    parser.add_argument("--windows", type=int, default=4)
+    parser.add_argument("--sample-count", type=int, default=5)
+    parser.add_argument("--T", type=float, default=1.0)
+    parser.add_argument("--top-p", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tokenizer, model, draft = build_models(args)
+    windows = make_windows(load_data(args), args)
+    print(f"torch {torch.__version__} | device {args.device} | {len(windows)} windows | lookback {args.lookback} | "
+          f"pred_len {args.pred_len} | samples {args.sample_count} | T {args.T} top_p {args.top_p}")
+
+    # Warm-up (allocator, kernels) outside the timings
+    forecast(tokenizer, model, windows[0], args, args.seed, draft_model=draft, draft_len=args.draft_lens[0])
+
+    base, base_times, noise = [], [], []
+    for w, window in enumerate(windows):
+        pred, elapsed = forecast(tokenizer, model, window, args, args.seed + w)
+        other, _ = forecast(tokenizer, model, window, args, args.seed + w + 1000)
+        base.append(pred)
+        base_times.append(elapsed)
+        noise.append(np.abs(pred - other).mean())
+    base_time = float(np.median(base_times))
+    base_mae = float(np.mean([np.abs(p - w[3]).mean() for p, w in zip(base, windows)]))
+
+    header = (f"{'variant':<16}{'s/forecast':>11}{'speedup':>9}{'bars/round':>11}{'accept':>8}{'row acc':>9}"
+              f"{'close MAE':>11}{'|d plain|':>11}")
+    print(header)
+    print("-" * len(header))
+    print(f"{'plain':<16}{base_time:>11.3f}{1.0:>9.2f}{1.0:>11.2f}{'-':>8}{'-':>9}{base_mae:>11.4f}{np.mean(noise):>11.4f}"
+          f"  (|d plain| here: two seeds of the plain loop)")
+
+    for draft_len in args.draft_lens:
+        preds, times, stats = [], [], {}
+        for w, window in enumerate(windows):
+            pred, elapsed = forecast(tokenizer, model, window, args, args.seed + w, draft_model=draft,
+                                     draft_len=draft_len, stats=stats)
+            preds.append(pred)
+            times.append(elapsed)
+        elapsed = float(np.median(times))
+        mae = float(np.mean([np.abs(p - w[3]).mean() for p, w in zip(preds, windows)]))
+        diff = float(np.mean([np.abs(p - b).mean() for p, b in zip(preds, base)]))
+        rounds = max(stats.get("rounds", 0), 1)
+        drafted = max(stats.get("drafted", 0), 1)
+        print(f"{f'draft_len={draft_len}':<16}{elapsed:>11.3f}{base_time / elapsed:>9.2f}{stats.get('bars', 0) / rounds:>11.2f}"
+              f"{stats.get('accepted', 0) / drafted:>8.2f}{stats.get('row_accepted', 0) / drafted:>9.2f}{mae:>11.4f}{diff:>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
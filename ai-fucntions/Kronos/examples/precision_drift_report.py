@@ -0,0 +1,149 @@
+"""
+Accuracy drift of KronosPredictor precision modes (fp32 / bf16 / fp16 / int8) on a held-out set.
+
+The held-out windows are taken from the tail of a K-line CSV (columns timestamps, open, high, low, close, volume, amount,
+like examples/data/XSHG_5min_600977.csv). For every precision the report shows, relative to fp32:
+
+- token agreement: share of identical tokenizer s1/s2 tokens on the history windows
+- logit drift: mean KL(fp32 || precision) and top-1 agreement of the next-s1 distribution (teacher forced, fp32 tokens)
+- forecast: close MAE / MAPE against the actual bars, and the mean absolute difference to the fp32 forecast
+  (sampling uses the same seed per window; with T/top_p sampling some spread is expected even without drift)
+- latency per predict() call
+
+Usage:
+    python examples/precision_drift_report.py --device cpu --precisions fp32 bf16 int8
+    python examples/precision_drift_report.py --device cuda:0 --precisions fp32 bf16 fp16 --output drift.json
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from model.kronos import Kronos, KronosTokenizer, KronosPredictor, calc_time_stamps, PRECISIONS
+
+FEATURES = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+
+def holdout_windows(df, lookback, pred_len, windows, holdout_frac):
+    """Start offsets of `windows` evenly spaced windows whose forecast part lies in the last holdout_frac of df."""
+    first = max(0, int(len(df) * (1 - holdout_frac)) - lookback)
+    last = len(df) - lookback - pred_len
+    if last < first:
+        raise ValueError(f"CSV too short for lookback={lookback} + pred_len={pred_len} in the held-out part")
+    return sorted(set(np.linspace(first, last, windows).astype(int).tolist()))
+
+
+def normalized(df_window, clip):
+    x = df_window[FEATURES].values.astype(np.float32)
+    x = (x - x.mean(axis=0)) / (x.std(axis=0) + 1e-5)
+    return np.clip(x, -clip, clip)
+
+
+@torch.no_grad()
+def token_and_logit_drift(base, other, df, starts, lookback):
+    token_agree, kl, top1 = [], [], []
+    for start in starts:
+        window = df.iloc[start:start + lookback]
+        x = torch.from_numpy(normalized(window, base.clip)[np.newaxis]).to(base.device)
+        stamp = torch.from_numpy(calc_time_stamps(window['timestamps']).values.astype(np.float32)[np.newaxis]).to(base.device)
+
+        ref_tokens = base.tokenizer.encode(x, half=True)
+        tokens = other.tokenizer.encode(x.to(other.device), half=True)
+        token_agree.append(np.mean([(a.cpu() == b.cpu()).float().mean().item() for a, b in zip(ref_tokens, tokens)]))
+
+        ref_logits, _ = base.model.decode_s1(ref_tokens[0], ref_tokens[1], stamp)
+        logits, _ = other.model.decode_s1(ref_tokens[0].to(other.device), ref_tokens[1].to(other.device), stamp.to(other.device))
+        ref_logp = F.log_softmax(ref_logits.float().cpu(), dim=-1)
+        logp = F.log_softmax(logits.float().cpu(), dim=-1)
+        kl.append((ref_logp.exp() * (ref_logp - logp)).sum(-1).mean().item())
+        top1.append((ref_logp.argmax(-1) == logp.argmax(-1)).float().mean().item())
+    return float(np.mean(token_agree)), float(np.mean(kl)), float(np.mean(top1))
+
+
+def forecasts(predictor, df, starts, lookback, pred_len, args):
+    preds, elapsed = [], []
+    for start in starts:
+        x_df = df.iloc[start:start + lookback]
+        y_ts = df['timestamps'].iloc[start + lookback:start + lookback + pred_len]
+        torch.manual_seed(args.seed + start)
+        t0 = time.perf_counter()
+        pred_df = predictor.predict(x_df[FEATURES], x_df['timestamps'], y_ts, pred_len, T=args.T, top_p=args.top_p,
+                                    sample_count=args.sample_count, verbose=False)
+        elapsed.append(time.perf_counter() - t0)
+        preds.append(pred_df['close'].values)
+    return preds, float(np.median(elapsed))
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=os.path.join(current_dir, "data/XSHG_5min_600977.csv"))
+    parser.add_argument("--model", default="NeoQuasar/Kronos-small")
+    parser.add_argument("--tokenizer", default="NeoQuasar/Kronos-Tokenizer-base")
+    parser.add_argument("--device", default="cuda:0" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--precisions", nargs="+", default=list(PRECISIONS), choices=PRECISIONS)
+    parser.add_argument("--max-context", type=int, default=512)
+    parser.add_argument("--lookback", type=int, default=400)
+    parser.add_argument("--pred-len", type=int, default=120)
+    parser.add_argument("--windows", type=int, default=8)
+    parser.add_argument("--holdout-frac", type=float, default=0.2)
+    parser.add_argument("--sample-count", type=int, default=5)
+    parser.add_argument("--T", type=float, default=1.0)
+    parser.add_argument("--top-p", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    df['timestamps'] = pd.to_datetime(df['timestamps'])
+    starts = holdout_windows(df, args.lookback, args.pred_len, args.windows, args.holdout_frac)
+    actual = [df['close'].values[s + args.lookback:s + args.lookback + args.pred_len] for s in starts]
+
+    base_model = Kronos.from_pretrained(args.model).eval()
+    base_tokenizer = KronosTokenizer.from_pretrained(args.tokenizer).eval()
+    base = KronosPredictor(copy.deepcopy(base_model), copy.deepcopy(base_tokenizer), device=args.device,
+                           max_context=args.max_context, precision="fp32")
+    base_preds, _ = forecasts(base, df, starts, args.lookback, args.pred_len, args)
+
+    print(f"torch {torch.__version__} | device {args.device} | {len(starts)} held-out windows | "
+          f"lookback {args.lookback} | pred_len {args.pred_len} | samples {args.sample_count}")
+    header = f"{'precision':<10}{'tok agree':>10}{'KL':>11}{'top1':>8}{'MAE':>11}{'MAPE %':>9}{'|d fp32|':>11}{'s/call':>9}"
+    print(header)
+    print("-" * len(header))
+
+    report = []
+    for precision in args.precisions:
+        device = "cpu" if precision == "int8" else args.device
+        try:
+            predictor = KronosPredictor(copy.deepcopy(base_model), copy.deepcopy(base_tokenizer), device=device,
+                                        max_context=args.max_context, precision=precision)
+            tok_agree, kl, top1 = token_and_logit_drift(base, predictor, df, starts, args.lookback)
+            preds, latency = forecasts(predictor, df, starts, args.lookback, args.pred_len, args)
+        except Exception as e:
+            print(f"{precision:<10} failed: {e}")
+            report.append({"precision": precision, "error": str(e)})
+            continue
+        mae = float(np.mean([np.abs(p - a).mean() for p, a in zip(preds, actual)]))
+        mape = float(np.mean([(np.abs(p - a) / np.abs(a)).mean() * 100 for p, a in zip(preds, actual)]))
+        diff = float(np.mean([np.abs(p - b).mean() for p, b in zip(preds, base_preds)]))
+        row = {"precision": precision, "device": device, "token_agreement": tok_agree, "kl": kl, "top1_agreement": top1,
+               "close_mae": mae, "close_mape_pct": mape, "mean_abs_diff_vs_fp32": diff, "latency_s": latency}
+        report.append(row)
+        print(f"{precision:<10}{tok_agree:>10.4f}{kl:>11.2e}{top1:>8.3f}{mae:>11.4f}{mape:>9.2f}{diff:>11.4f}{latency:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "windows": starts, "report": report}, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
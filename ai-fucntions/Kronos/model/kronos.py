@@ -1,3 +1,6 @@
+import os
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 import torch
@@ -112,6 +115,11 @@ class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
 
         return (z_pre, z), bsq_loss, quantized, z_indices
 
+    def _compute_dtype(self):
+        """dtype the Linear layers expect: that of the weights, float32 for dynamically quantized (int8) layers."""
+        weight = getattr(self.post_quant_embed, "weight", None)
+        return weight.dtype if isinstance(weight, torch.Tensor) else torch.float32
+
     def indices_to_bits(self, x, half=False):
         """
         Converts indices to bit representations and scales them.
@@ -139,40 +147,42 @@ class KronosTokenizer(nn.Module, PyTorchModelHubMixin):
         x = x * q_scale
         return x
 
-    def encode(self, x, half=False):
+    def encode(self, x, half=False, padding_mask=None):
         """
         Encodes the input data into quantized indices.
 
         Args:
             x (torch.Tensor): Input tensor of shape (batch_size, seq_len, d_in).
             half (bool, optional): Whether to use half quantization in BSQuantizer. Defaults to False.
+            padding_mask (torch.Tensor, optional): Bool mask (batch_size, seq_len), True for padded positions. Defaults to None.
 
         Returns:
             torch.Tensor: Quantized indices from BSQuantizer.
         """
-        z = self.embed(x)
+        z = self.embed(x.to(self._compute_dtype()))
         for layer in self.encoder:
-            z = layer(z)
+            z = layer(z, key_padding_mask=padding_mask)
         z = self.quant_embed(z)
 
         bsq_loss, quantized, z_indices = self.tokenizer(z, half)
         return z_indices
 
-    def decode(self, x, half=False):
+    def decode(self, x, half=False, padding_mask=None):
         """
         Decodes quantized indices back to the input data space.
 
         Args:
             x (torch.Tensor): Quantized indices tensor.
             half (bool, optional): Whether the indices were generated with half quantization. Defaults to False.
+            padding_mask (torch.Tensor, optional): Bool mask (batch_size, seq_len), True for padded positions. Defaults to None.
 
         Returns:
             torch.Tensor: Reconstructed output tensor of shape (batch_size, seq_len, d_in).
         """
-        quantized = self.indices_to_bits(x, half)
+        quantized = self.indices_to_bits(x, half).to(self._compute_dtype())
         z = self.post_quant_embed(quantized)
         for layer in self.decoder:
-            z = layer(z)
+            z = layer(z, key_padding_mask=padding_mask)
         z = self.head(z)
         return z
 
@@ -275,23 +285,31 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
         s2_logits = self.head.cond_forward(x2)
         return s1_logits, s2_logits
 
-    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None):
+    def decode_s1(self, s1_ids, s2_ids, stamp=None, padding_mask=None, past_key_values=None, use_cache=False):
         """
         Decodes only the s1 tokens.
 
         This method performs a forward pass to predict only s1 tokens. It returns the s1 logits
         and the context representation from the Transformer, which can be used for subsequent s2 decoding.
 
+        With `use_cache=True` the per-layer key/value cache is returned as well. Passing it back as
+        `past_key_values` together with only the new tokens (and their stamps) continues the sequence
+        without recomputing earlier positions; RoPE is applied at the absolute offsets of the new tokens.
+
         Args:
             s1_ids (torch.Tensor): Input tensor of s1 token IDs. Shape: [batch_size, seq_len]
             s2_ids (torch.Tensor): Input tensor of s2 token IDs. Shape: [batch_size, seq_len]
             stamp (torch.Tensor, optional): Temporal stamp tensor. Shape: [batch_size, seq_len]. Defaults to None.
-            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, seq_len]. Defaults to None.
+            padding_mask (torch.Tensor, optional): Mask for padding tokens. Shape: [batch_size, past_len + seq_len]. Defaults to None.
+            past_key_values (List[Tuple[torch.Tensor, torch.Tensor]] or KVCache, optional): Cache returned by a previous call,
+                or a preallocated KVCache (see `init_kv_cache`) which is filled in place. Defaults to None.
+            use_cache (bool, optional): Whether to return the updated cache. Defaults to False.
 
         Returns:
             Tuple[torch.Tensor, torch.Tensor]:
                 - s1 logits: Logits for s1 token predictions. Shape: [batch_size, seq_len, s1_vocab_size]
                 - context: Context representation from the Transformer. Shape: [batch_size, seq_len, d_model]
+                - present_key_values (only when use_cache=True): one (k, v) pair per Transformer block, or the KVCache passed in.
         """
         x = self.embedding([s1_ids, s2_ids])
         if stamp is not None:
@@ -299,14 +317,61 @@ class Kronos(nn.Module, PyTorchModelHubMixin):
             x = x + time_embedding
         x = self.token_drop(x)
 
-        for layer in self.transformer:
-            x = layer(x, key_padding_mask=padding_mask)
+        static_cache = isinstance(past_key_values, KVCache)
+        present_key_values = [] if use_cache and not static_cache else None
+        for i, layer in enumerate(self.transformer):
+            if static_cache:
+                past = past_key_values.layer(i)
+            else:
+                past = past_key_values[i] if past_key_values is not None else None
+            if use_cache and not static_cache:
+                x, present = layer(x, key_padding_mask=padding_mask, past_key_value=past, use_cache=True)
+                present_key_values.append(present)
+            else:
+                x = layer(x, key_padding_mask=padding_mask, past_key_value=past)
+        if static_cache:
+            past_key_values.advance(s1_ids.size(1))
+            present_key_values = past_key_values
 
         x = self.norm(x)
 
         s1_logits = self.head(x)
+        if use_cache:
+            return s1_logits, x, present_key_values
         return s1_logits, x
 
+    def decode_step(self, s1_ids, s2_ids, stamp, kv_cache, cache_position, key_padding_mask):
+        """
+        Static-shape single-token variant of decode_s1 for compiled / CUDA-graph decoding (see StaticDecoder).
+
+        The new token is written into `kv_cache` at `cache_position` (LongTensor [1]) and attends over the whole
+        buffer; `key_padding_mask` [batch_size, max_len] must mask padded and not yet written positions. Shapes do
+        not depend on the current length, so one compiled graph serves every step.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: s1 logits of the new token [batch_size, s1_vocab_size] and its context
+            [batch_size, 1, d_model].
+        """
+        x = self.embedding([s1_ids, s2_ids])
+        x = x + self.time_emb(stamp)
+        x = self.token_drop(x)
+
+        for i, layer in enumerate(self.transformer):
+            x = layer(x, key_padding_mask=key_padding_mask, past_key_value=kv_cache.layer(i), cache_position=cache_position)
+
+        x = self.norm(x)
+        return self.head(x)[:, -1, :], x
+
+    def init_kv_cache(self, batch_size, max_len, device=None, dtype=None):
+        """
+        Allocates a KVCache for `max_len` positions of all Transformer blocks, to be passed as
+        `past_key_values` to decode_s1.
+        """
+        attn = self.transformer[0].self_attn
+        param = next(self.parameters())
+        return KVCache(self.n_layers, batch_size, attn.n_heads, max_len, attn.head_dim,
+                       dtype=dtype or param.dtype, device=device or param.device)
+
     def decode_s2(self, context, s1_ids, padding_mask=None):
         """
         Decodes the s2 tokens, conditioned on the context and s1 tokens.
@@ -370,13 +435,18 @@ def top_k_top_p_filtering(
         return logits
 
 
-def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_logits=True):
-    logits = logits / temperature
+def filtered_probs(logits, temperature=1.0, top_k=None, top_p=None):
+    """Sampling distribution of sample_from_logits: temperature, then top-k / top-p filtering, softmax in float32."""
+    # Sample in float32 also when the model runs in fp16/bf16
+    logits = logits.float() / temperature
     if top_k is not None or top_p is not None:
         if top_k > 0 or top_p < 1.0:
             logits = top_k_top_p_filtering(logits, top_k=top_k, top_p=top_p)
+    return F.softmax(logits, dim=-1)
 
-    probs = F.softmax(logits, dim=-1)
+
+def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_logits=True):
+    probs = filtered_probs(logits, temperature, top_k, top_p)
 
     if not sample_logits:
         _, x = top_k(probs, k=1, dim=-1)
@@ -386,65 +456,463 @@ def sample_from_logits(logits, temperature=1.0, top_k=None, top_p=None, sample_l
     return x
 
 
-def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False):
-    with torch.no_grad():
-        batch_size = x.size(0)
-        initial_seq_len = x.size(1)
-        x = torch.clip(x, -clip, clip)
+class StaticDecoder:
+    """
+    Fixed-shape decode step of auto_regressive_inference for one (rows, max_len) shape, rows = batch * sample_count.
 
-        device = x.device
-        x = x.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x.size(1), x.size(2)).to(device)
-        x_stamp = x_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, x_stamp.size(1), x_stamp.size(2)).to(device)
-        y_stamp = y_stamp.unsqueeze(1).repeat(1, sample_count, 1, 1).reshape(-1, y_stamp.size(1), y_stamp.size(2)).to(device)
+    Owns the KV cache, the decoder context buffer, the key mask and the step inputs, so every step runs with the same
+    shapes and tensor addresses: the step (Kronos.decode_step) can be compiled with torch.compile and, on CUDA,
+    captured once into a CUDA graph and replayed. Prefill stays eager; load_prefix copies its cache into the buffers.
+    Call warmup() once (compilation and graph capture happen there) before the first generation.
+    """
+
+    def __init__(self, model, rows, max_len, device, compile=True, cuda_graph=None):
+        self.model = model
+        self.rows = rows
+        self.max_len = max_len
+        self.device = torch.device(device)
+        self.kv_cache = model.init_kv_cache(rows, max_len, device=self.device)
+        dtype = self.kv_cache.k.dtype
+        self.context = torch.zeros(rows, max_len, model.d_model, dtype=dtype, device=self.device)
+        self.key_mask = torch.ones(rows, max_len, dtype=torch.bool, device=self.device)
+        self.s1 = torch.zeros(rows, 1, dtype=torch.long, device=self.device)
+        self.s2 = torch.zeros(rows, 1, dtype=torch.long, device=self.device)
+        self.stamp = torch.zeros(rows, 1, 5, dtype=torch.float32, device=self.device)
+        self.position = torch.zeros(1, dtype=torch.long, device=self.device)
+        # decode_step indexes the RoPE tables by position tensor; build them for max_len up front
+        for block in model.transformer:
+            block.self_attn.rotary._update_cos_sin_cache(self.context, max_len)
+
+        self.fn = torch.compile(self._step, dynamic=False) if compile and hasattr(torch, "compile") else self._step
+        self.use_cuda_graph = self.device.type == "cuda" and (cuda_graph is None or cuda_graph)
+        self.graph = None
+        self.logits = None
+
+    def release(self):
+        """Drops the CUDA graph (and its memory pool) and the buffers; the decoder can not be used afterwards."""
+        if self.graph is not None:
+            self.graph.reset()
+        self.graph = self.logits = self.fn = None
+        self.kv_cache = self.context = self.key_mask = None
+
+    def _step(self):
+        s1_logits, x = self.model.decode_step(self.s1, self.s2, self.stamp, self.kv_cache, self.position, self.key_mask)
+        self.context.index_copy_(1, self.position, x)
+        return s1_logits
+
+    def warmup(self, iters=3):
+        """Triggers compilation and, on CUDA, captures the step into a CUDA graph."""
+        with torch.no_grad():
+            self.key_mask[:, 0] = False
+            if self.use_cuda_graph:
+                stream = torch.cuda.Stream(self.device)
+                stream.wait_stream(torch.cuda.current_stream(self.device))
+                with torch.cuda.stream(stream):
+                    for _ in range(iters):
+                        self.fn()
+                torch.cuda.current_stream(self.device).wait_stream(stream)
+                self.graph = torch.cuda.CUDAGraph()
+                with torch.cuda.graph(self.graph):
+                    self.logits = self.fn()
+            else:
+                for _ in range(iters):
+                    self.fn()
+            self.key_mask.fill_(True)
+            self.kv_cache.reset()
+
+    def load_prefix(self, prefix_cache, repeats, prefix_context, padding_mask=None):
+        """Copies a prefilled (not yet fanned out) prefix into the buffers; padding_mask is [rows, length]."""
+        length = prefix_cache.length
+        prefix_cache.expand(repeats, out=self.kv_cache)
+        self.context[:, :length] = prefix_context.repeat_interleave(repeats, dim=0)
+        self.key_mask.fill_(True)
+        if padding_mask is not None:
+            self.key_mask[:, :length] = padding_mask
+        else:
+            self.key_mask[:, :length] = False
 
-        x_token = tokenizer.encode(x, half=True)
+    def step(self, s1_ids, s2_ids, stamp, position):
+        """Runs the token at `position`; returns its s1 logits [rows, vocab] (a reused buffer when replaying a graph)."""
+        self.s1.copy_(s1_ids)
+        self.s2.copy_(s2_ids)
+        self.stamp.copy_(stamp)
+        self.position.fill_(position)
+        self.key_mask[:, position] = False
+        if self.graph is not None:
+            self.graph.replay()
+            return self.logits
+        return self.fn()
 
-        def get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, pred_step):
 
-            if current_seq_len <= max_context - pred_step:
-                return torch.cat([x_stamp, y_stamp[:, :pred_step, :]], dim=1)
-            else:
-                start_idx = max_context - pred_step
-                return torch.cat([x_stamp[:, -start_idx:, :], y_stamp[:, :pred_step, :]], dim=1)
+PRECISIONS = ("fp32", "bf16", "fp16", "int8")
+
+
+def apply_precision(module, precision, device="cpu"):
+    """
+    Converts a Kronos model or tokenizer for inference:
+    fp32 / bf16 / fp16 cast all floating point weights; int8 applies dynamic int8 quantization to every nn.Linear
+    (weights int8, activations quantized on the fly; CPU only). Inputs are cast inside the models, and sampling and
+    the returned predictions stay float32. Returns the converted module (a copy for int8).
+    """
+    precision = (precision or "fp32").strip().lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+    if precision == "fp32":
+        return module.float()
+    if precision == "bf16":
+        return module.to(torch.bfloat16)
+    if precision == "fp16":
+        return module.to(torch.float16)
+    if torch.device(device).type != "cpu":
+        raise ValueError(f"int8 (dynamic quantization) only runs on cpu, got device {device}")
+    return torch.ao.quantization.quantize_dynamic(module.float().eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def release_device_memory(device):
+    """Returns cached allocator blocks of `device` to the driver (cuda / mps; no-op on cpu)."""
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+    elif device.type == "mps":
+        torch.mps.empty_cache()
+
+
+def residual_probs(p, q):
+    """Speculative-sampling correction distribution norm(max(0, p - q)); falls back to p where p == q."""
+    r = (p - q).clamp_min(0)
+    return torch.where(r.sum(dim=-1, keepdim=True) > 0, r, p)
+
+
+def speculative_decode(model, draft_model, token_buf, stamp_buf, mask_buf, kv_cache, context_buf, draft_cache,
+                       draft_context_buf, length, end, draft_len=4, T=1.0, top_k=0, top_p=0.99, stats=None):
+    """
+    Speculative sampling of the bars at positions length .. < end (Leviathan et al. 2023, Chen et al. 2023).
+
+    Each round the draft model samples draft_len bars one by one; the target model then scores all of them in one
+    chunked pass over its KV cache (plus one cross-attention call per bar for the s2 distributions). A bar is a pair
+    of sub-tokens and is verified like two consecutive tokens: s1 is accepted with probability min(1, p1 / q1), then s2
+    with min(1, p2 / q2) given s1; the first rejected sub-token is resampled from norm(max(0, p - q)) (after a rejected
+    s1, s2 is sampled from the target given the new s1). If every draft is accepted, a bonus bar is sampled from the
+    target's last logits. The emitted bars follow exactly the target's sampling distribution (temperature, top_k,
+    top_p as in sample_from_logits), whatever the draft model; a better draft only means more bars per round.
+
+    Rows are kept in lockstep: a round emits the shortest accepted prefix over all rows (1 .. draft_len + 1 bars),
+    which is still an exact sample for the longer rows. Both caches are truncated to the emitted bars.
+
+    token_buf / stamp_buf / mask_buf are the buffers of auto_regressive_inference; kv_cache / context_buf and
+    draft_cache / draft_context_buf hold the prefilled prefix of length `length` for the target and the draft
+    model. `end` bounds the positions held by the caches (min(total_len, max_context)). Returns the new length; the
+    target cache then holds length - 1 positions, like after a step of the single-token loop.
+    """
+    total_len = token_buf[0].size(1)
+
+    def until(t, n):
+        return t[:, :n] if t is not None else None
+
+    def probs(logits):
+        return filtered_probs(logits.reshape(-1, logits.size(-1)), T, top_k, top_p).reshape(logits.shape[:-1] + (-1,))
+
+    def feed(m, cache, context, stop):
+        # Runs positions cache.length .. stop - 1; returns the s1 logits predicting positions cache.length + 1 .. stop
+        start = cache.length
+        logits, new_context, _ = m.decode_s1(token_buf[0][:, start:stop], token_buf[1][:, start:stop], stamp_buf[:, start:stop],
+                                             padding_mask=until(mask_buf, stop), past_key_values=cache, use_cache=True)
+        context[:, start:stop] = new_context
+        return logits
+
+    def s2_probs(m, context, position, s1):
+        return probs(m.decode_s2(context[:, :position], s1, padding_mask=until(mask_buf, position))[:, -1])
+
+    start_length = length
+    while True:
+        k = min(draft_len, total_len - length - 1, end - length)
+        if k < 1:
+            if length > start_length:
+                kv_cache.truncate(length - 1)
+            return length
+        # The last emitted bar is re-run in both models, its logits predict the first new position
+        kv_cache.truncate(length - 1)
+        draft_cache.truncate(length - 1)
+
+        # ---- Draft: k bars autoregressively ----
+        q1, q2 = [], []
+        for j in range(k):
+            position = length + j
+            q1.append(probs(feed(draft_model, draft_cache, draft_context_buf, position)[:, -1]))
+            s1 = torch.multinomial(q1[-1], num_samples=1)
+            q2.append(s2_probs(draft_model, draft_context_buf, position, s1))
+            token_buf[0][:, position:position + 1] = s1
+            token_buf[1][:, position:position + 1] = torch.multinomial(q2[-1], num_samples=1)
+        q1, q2 = torch.stack(q1, dim=1), torch.stack(q2, dim=1)
+
+        # ---- Verify: one target pass over the k drafts ----
+        p1 = probs(feed(model, kv_cache, context_buf, length + k))  # [rows, k + 1, vocab], predicting length .. length + k
+        s1_draft = token_buf[0][:, length:length + k]
+        s2_draft = token_buf[1][:, length:length + k]
+        p2 = torch.stack([s2_probs(model, context_buf, length + j, s1_draft[:, j:j + 1]) for j in range(k)], dim=1)
+
+        def accept(p, q, tokens):
+            p, q = p.gather(-1, tokens[..., None])[..., 0], q.gather(-1, tokens[..., None])[..., 0]
+            return torch.rand_like(p) * q < p
+
+        accept1 = accept(p1[:, :k], q1, s1_draft)
+        accept2 = accept(p2, q2, s2_draft)
+        accepted = (accept1 & accept2).long().cumprod(dim=1).sum(dim=1)
+        n = int(accepted.min())
+        position = length + n
+
+        # ---- Bar n: accepted draft, correction, or bonus bar from the target ----
+        if n == k:
+            s1 = torch.multinomial(p1[:, k], num_samples=1)
+            s2 = torch.multinomial(s2_probs(model, context_buf, position, s1), num_samples=1)
+        else:
+            rejected = accepted == n
+            resample_s1 = (rejected & ~accept1[:, n])[:, None]
+            s1 = torch.where(resample_s1, torch.multinomial(residual_probs(p1[:, n], q1[:, n]), num_samples=1), s1_draft[:, n:n + 1])
+            s2 = torch.where(rejected[:, None], torch.multinomial(residual_probs(p2[:, n], q2[:, n]), num_samples=1), s2_draft[:, n:n + 1])
+            if resample_s1.any():
+                s2_new = torch.multinomial(s2_probs(model, context_buf, position, s1), num_samples=1)
+                s2 = torch.where(resample_s1, s2_new, s2)
+        token_buf[0][:, position:position + 1] = s1
+        token_buf[1][:, position:position + 1] = s2
+
+        if stats is not None:
+            # accepted: drafts kept in lockstep; row_accepted: drafts each row would have kept on its own (mean)
+            for key, value in (("rounds", 1), ("bars", n + 1), ("drafted", k), ("accepted", n),
+                               ("row_accepted", accepted.float().mean().item())):
+                stats[key] = stats.get(key, 0) + value
+        length = position + 1
+
+
+def auto_regressive_inference(tokenizer, model, x, x_stamp, y_stamp, max_context, pred_len, clip=5, T=1.0, top_k=0, top_p=0.99, sample_count=5, verbose=False, use_kv_cache=True, padding_mask=None, release_memory=None, quantiles=None, return_samples=False, static_decoder=None, draft_model=None, draft_len=4, stats=None):
+    """
+    Autoregressively samples pred_len steps and returns the sample mean, shape [batch, seq_len, d_in].
+
+    With quantiles (e.g. [0.1, ..., 0.9]) and/or return_samples=True the sample distribution is kept and a dict is
+    returned instead: {"mean": [batch, seq_len, d_in], "quantiles": {q: [batch, seq_len, d_in]},
+    "samples": [batch, sample_count, seq_len, d_in]}. Mean and quantiles are computed on the device, so a single
+    generation pass yields the mean plus uncertainty bands.
+
+    The history of each series is tokenized and run through the Transformer once; only then is the batch
+    fanned out into sample_count branches (rows b * sample_count .. b * sample_count + sample_count - 1),
+    which share the prefix logits, context and key/value cache. Sampling starts from identical rows, so the
+    result is the same as repeating the inputs sample_count times up front.
+
+    With use_kv_cache=True (default) every following step only runs the newly sampled token through the
+    Transformer, reusing the per-layer key/value cache. Once the sequence exceeds max_context the window
+    slides and all positions change, so those steps recompute the whole window exactly as before. The
+    sampled distribution is the same in both modes.
+
+    padding_mask (bool, [batch, seq_len], True = padding) allows series of different history lengths in
+    one batch: shorter series are left-padded so that every series ends at the last column, and padded
+    positions are masked in the tokenizer and the model. RoPE only depends on relative positions, so a
+    left-padded series samples from the same distribution as when it is predicted on its own.
+
+    Generation state is allocated once per call and written in place: tokens, stamps and the padding mask
+    in buffers of length seq_len + pred_len, the decoder context and the key/value cache (KVCache) in
+    buffers of length min(seq_len + pred_len, max_context). The model only sees views, so no per-step
+    copy grows with the sequence length.
+    release_memory controls when cached allocator blocks are returned to the driver:
+    "none" (default, keep the pool for the next call), "end" (once per call) or "step" (after every step,
+    the old behaviour; synchronises the device and forces re-allocation). Defaults to KRONOS_RELEASE_MEMORY.
+
+    static_decoder (StaticDecoder for batch * sample_count rows) runs the cached single-token steps through its
+    compiled / CUDA-graph step instead of eager decode_s1; it is ignored when the shape does not match.
+
+    draft_model (experimental) switches to speculative decoding (see speculative_decode): a smaller Kronos that
+    shares the tokenizer drafts draft_len bars per round and the model verifies them in one pass. The sampled
+    distribution is unchanged. It needs the KV cache and applies while the sequence fits into max_context; the
+    remaining steps run one by one as usual. A dict passed as `stats` is filled with the round / acceptance counters.
+    """
+    if release_memory is None:
+        release_memory = os.environ.get("KRONOS_RELEASE_MEMORY", "none").strip().lower()
+    if release_memory not in ("none", "end", "step"):
+        raise ValueError(f"release_memory must be one of 'none', 'end', 'step', got {release_memory!r}")
+    quantiles = [float(q) for q in quantiles] if quantiles is not None else []
+    if any(not 0.0 <= q <= 1.0 for q in quantiles):
+        raise ValueError(f"quantiles must be within [0, 1], got {quantiles}")
+    if draft_model is not None:
+        if (draft_model.s1_bits, draft_model.s2_bits) != (model.s1_bits, model.s2_bits):
+            raise ValueError("draft_model must use the same tokenizer (s1_bits / s2_bits) as model")
+        if draft_len < 1:
+            raise ValueError(f"draft_len must be >= 1, got {draft_len}")
+
+    with torch.no_grad():
+        batch_size = x.size(0)
+        initial_seq_len = x.size(1)
+        total_len = initial_seq_len + pred_len
+        device = x.device
+        x = torch.clip(x, -clip, clip)
+        x_stamp = x_stamp.to(device)
+        y_stamp = y_stamp.to(device)
+        if padding_mask is not None:
+            padding_mask = padding_mask.to(device=device, dtype=torch.bool)
+
+        def fan_out(t):
+            return t.repeat_interleave(sample_count, dim=0)
+
+        # ---- Shared prefix: tokenizer + first Transformer pass once per series ----
+        x_token = tokenizer.encode(x, half=True, padding_mask=padding_mask)
+
+        use_kv_cache = use_kv_cache and initial_seq_len <= max_context
+        cache_len = min(total_len, max_context)
+        window_start = max(0, initial_seq_len - max_context)
+        prefix_mask = padding_mask[:, window_start:] if padding_mask is not None else None
+        prefix_cache = model.init_kv_cache(batch_size, cache_len, device=device) if use_kv_cache else None
+        s1_logits, prefix_context = model.decode_s1(
+            x_token[0][:, window_start:], x_token[1][:, window_start:], x_stamp[:, window_start:],
+            padding_mask=prefix_mask, past_key_values=prefix_cache, use_cache=use_kv_cache
+        )[:2]
+        prefix_logits = s1_logits[:, -1, :]
+
+        # ---- Fan out into sample_count branches ----
+        token_buf = []
+        for t in x_token:
+            buf = torch.empty(t.size(0) * sample_count, total_len, dtype=t.dtype, device=device)
+            buf[:, :initial_seq_len] = fan_out(t)
+            token_buf.append(buf)
+        # Stamps of every position; the stamp window of a step is stamp_buf[:, window_start:current_seq_len]
+        stamp_buf = fan_out(torch.cat([x_stamp, y_stamp[:, :pred_len, :]], dim=1))
+
+        mask_buf = None
+        if padding_mask is not None:
+            # Generated positions are never padding
+            mask_buf = torch.zeros(batch_size * sample_count, total_len, dtype=torch.bool, device=device)
+            mask_buf[:, :initial_seq_len] = fan_out(padding_mask)
+
+        # KV cache state: per-layer keys/values and the normalized hidden states of every cached position,
+        # which decode_s2 attends over. Only used while the sequence fits into max_context.
+        kv_cache = None
+        context_buf = None
+        use_static = (static_decoder is not None and use_kv_cache and draft_model is None
+                      and static_decoder.rows == batch_size * sample_count and static_decoder.max_len >= cache_len)
+        if use_static:
+            static_decoder.load_prefix(prefix_cache, sample_count, prefix_context,
+                                       mask_buf[:, :initial_seq_len] if mask_buf is not None else None)
+            kv_cache = static_decoder.kv_cache
+            context_buf = static_decoder.context
+        elif use_kv_cache:
+            kv_cache = prefix_cache.expand(sample_count)
+            context_buf = prefix_context.new_empty(batch_size * sample_count, cache_len, prefix_context.size(2))
+            context_buf[:, :initial_seq_len] = fan_out(prefix_context)
+        del prefix_cache
+
+        # ---- Speculative decoding with a draft model (prefilled and fanned out like the model) ----
+        start_step = 0
+        if draft_model is not None and use_kv_cache:
+            draft_prefix = draft_model.init_kv_cache(batch_size, cache_len, device=device)
+            draft_context = draft_model.decode_s1(x_token[0], x_token[1], x_stamp, padding_mask=prefix_mask,
+                                                  past_key_values=draft_prefix, use_cache=True)[1]
+            draft_context_buf = draft_context.new_empty(batch_size * sample_count, cache_len, draft_context.size(2))
+            draft_context_buf[:, :initial_seq_len] = fan_out(draft_context)
+            spec_stats = stats if stats is not None else {}
+            start_step = speculative_decode(model, draft_model, token_buf, stamp_buf, mask_buf, kv_cache, context_buf,
+                                            draft_prefix.expand(sample_count), draft_context_buf, initial_seq_len, cache_len,
+                                            draft_len, T, top_k, top_p, spec_stats) - initial_seq_len
+            del draft_prefix, draft_context, draft_context_buf
+            if verbose and spec_stats.get("rounds"):
+                print(f"Speculative decoding: {spec_stats['bars']} bars in {spec_stats['rounds']} rounds, "
+                      f"{spec_stats['accepted']}/{spec_stats['drafted']} drafts accepted")
 
         if verbose:
             ran = trange
         else:
             ran = range
-        for i in ran(pred_len):
+        for i in ran(start_step, pred_len):
             current_seq_len = initial_seq_len + i
-
-            if current_seq_len <= max_context:
-                input_tokens = x_token
+            mask = mask_buf[:, :current_seq_len] if mask_buf is not None else None
+
+            if i == 0:
+                s1_logits = fan_out(prefix_logits)
+                if use_kv_cache:
+                    context = context_buf[:, :current_seq_len]
+                else:
+                    context = fan_out(prefix_context)
+                context_mask = mask[:, window_start:] if mask is not None else None
+            elif use_kv_cache and current_seq_len <= max_context:
+                # Only the token sampled in the previous step
+                start = current_seq_len - 1
+                if use_static:
+                    s1_logits = static_decoder.step(token_buf[0][:, start:current_seq_len], token_buf[1][:, start:current_seq_len],
+                                                    stamp_buf[:, start:current_seq_len], start)
+                else:
+                    s1_logits, new_context, _ = model.decode_s1(
+                        token_buf[0][:, start:current_seq_len], token_buf[1][:, start:current_seq_len], stamp_buf[:, start:current_seq_len],
+                        padding_mask=mask, past_key_values=kv_cache, use_cache=True
+                    )
+                    context_buf[:, start:current_seq_len] = new_context
+                    s1_logits = s1_logits[:, -1, :]
+                context = context_buf[:, :current_seq_len]
+                context_mask = mask
             else:
-                input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
+                # The window slides: every position changes, recompute the whole window
+                kv_cache = None
+                context_buf = None
+
+                step_start = max(0, current_seq_len - max_context)
+                input_tokens = [t[:, step_start:current_seq_len] for t in token_buf]
+                context_mask = mask[:, step_start:] if mask is not None else None
+                current_stamp = stamp_buf[:, step_start:current_seq_len]
 
-            current_stamp = get_dynamic_stamp(x_stamp, y_stamp, current_seq_len, i)
+                s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp, padding_mask=context_mask)
+                s1_logits = s1_logits[:, -1, :]
 
-            s1_logits, context = model.decode_s1(input_tokens[0], input_tokens[1], current_stamp)
-            s1_logits = s1_logits[:, -1, :]
             sample_pre = sample_from_logits(s1_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
 
-            s2_logits = model.decode_s2(context, sample_pre)
+            s2_logits = model.decode_s2(context, sample_pre, padding_mask=context_mask)
             s2_logits = s2_logits[:, -1, :]
             sample_post = sample_from_logits(s2_logits, temperature=T, top_k=top_k, top_p=top_p, sample_logits=True)
 
-            x_token[0] = torch.cat([x_token[0], sample_pre], dim=1)
-            x_token[1] = torch.cat([x_token[1], sample_post], dim=1)
-            if torch.device("mps") == device:
-                torch.mps.empty_cache()
-            else:
-                torch.cuda.empty_cache()
-
-        input_tokens = [t[:, -max_context:].contiguous() for t in x_token]
-        z = tokenizer.decode(input_tokens, half=True)
-        z = z.reshape(batch_size, sample_count, z.size(1), z.size(2))
-        preds = z.cpu().numpy()
-        preds = np.mean(preds, axis=1)
+            token_buf[0][:, current_seq_len:current_seq_len + 1] = sample_pre
+            token_buf[1][:, current_seq_len:current_seq_len + 1] = sample_post
+            if release_memory == "step":
+                release_device_memory(device)
+
+        input_tokens = [t[:, -max_context:] for t in token_buf]
+        decode_mask = mask_buf[:, -max_context:] if mask_buf is not None else None
+        z = tokenizer.decode(input_tokens, half=True, padding_mask=decode_mask)
+        z = z.reshape(batch_size, sample_count, z.size(1), z.size(2)).float()
+        if quantiles or return_samples:
+            preds = {"mean": z.mean(dim=1).cpu().numpy()}
+            if quantiles:
+                preds["quantiles"] = sample_quantiles(z, quantiles)
+            if return_samples:
+                preds["samples"] = z.cpu().numpy()
+        else:
+            preds = z.cpu().numpy()
+            preds = np.mean(preds, axis=1)
 
+        if release_memory == "end":
+            release_device_memory(device)
         return preds
 
 
+def sample_quantiles(z, quantiles):
+    """
+    Quantiles over the sample axis (dim 1) of z [batch, sample_count, seq_len, d_in], linear interpolation
+    like np.quantile. Computed on z's device; falls back to NumPy where torch.quantile is unsupported (e.g. mps).
+    Returns {q: ndarray [batch, seq_len, d_in]}.
+    """
+    try:
+        q = torch.tensor(quantiles, dtype=torch.float32, device=z.device)
+        values = torch.quantile(z.float(), q, dim=1).cpu().numpy()
+    except (RuntimeError, NotImplementedError):
+        values = np.quantile(z.float().cpu().numpy(), quantiles, axis=1)
+    return {q: values[i] for i, q in enumerate(quantiles)}
+
+
+def quantile_predictions(pred_df, target="close", prefix="mtf"):
+    """
+    Maps a KronosPredictor.predict(..., quantiles=...) result to the prediction dict used by the TimesFM
+    best-quantile selection: {prefix: mean, f"{prefix}-{q}": quantile q} (lists), e.g. "mtf", "mtf-0.1" .. "mtf-0.9".
+    """
+    predictions = {prefix: pred_df[target].tolist()}
+    for col in pred_df.columns:
+        if col.startswith(f"{target}-"):
+            predictions[f"{prefix}-{col[len(target) + 1:]}"] = pred_df[col].tolist()
+    return predictions
+
+
 def calc_time_stamps(x_timestamp):
     time_df = pd.DataFrame()
     time_df['minute'] = x_timestamp.dt.minute
@@ -460,7 +928,25 @@ class KronosPredictor():
     KronosPredictor class for making predictions using a trained Kronos model.
     """
     # 添加device参数到类定义
-    def __init__(self, model, tokenizer, device="cuda:0", max_context=512, clip=5):
+    def __init__(self, model, tokenizer, device="cuda:0", max_context=512, clip=5, compile=None, cuda_graph=None,
+                 warmup_batch_size=1, warmup_sample_count=1, precision=None, draft_model=None, draft_len=None,
+                 static_decoder_cache_size=None):
+        """
+        precision (default: KRONOS_PRECISION or "fp32"): "fp32", "bf16", "fp16" or "int8" (dynamic quantization,
+        cpu only); the tokenizer and the model are converted together, see `apply_precision`.
+
+        compile (default: KRONOS_COMPILE, off) enables the compiled decode step (torch.compile, plus CUDA-graph capture
+        on CUDA unless cuda_graph=False). Step graphs are built per batch * sample_count shape; the shape
+        warmup_batch_size * warmup_sample_count is compiled and warmed up here, others on first use.
+        Each shape holds its own KV cache and context buffers, so only the static_decoder_cache_size (default:
+        KRONOS_COMPILE_CACHE_SIZE or 2) most recently used shapes are kept; the least recently used one is released
+        when another shape is built. Falls back to eager decoding if compilation fails.
+
+        draft_model (experimental) enables speculative decoding: a smaller Kronos trained with the same tokenizer
+        (e.g. Kronos-small drafting for Kronos-base; Kronos-mini uses its own 2k tokenizer and does not qualify)
+        proposes draft_len (default: KRONOS_DRAFT_LEN or 4) bars per round, which the model verifies in one pass.
+        Forecasts keep the model's sampling distribution; see speculative_decode. The compiled step is not used then.
+        """
         self.tokenizer = tokenizer
         self.model = model
         self.max_context = max_context
@@ -474,18 +960,104 @@ class KronosPredictor():
         self.tokenizer = self.tokenizer.to(self.device)
         self.model = self.model.to(self.device)
 
-    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose):
+        if precision is None:
+            precision = os.environ.get("KRONOS_PRECISION", "fp32")
+        self.precision = precision.strip().lower()
+        self.tokenizer = apply_precision(self.tokenizer, self.precision, self.device)
+        self.model = apply_precision(self.model, self.precision, self.device)
+
+        self.draft_model = None
+        if draft_model is not None:
+            self.draft_model = apply_precision(draft_model.to(self.device).eval(), self.precision, self.device)
+        if draft_len is None:
+            draft_len = int(os.environ.get("KRONOS_DRAFT_LEN", "4"))
+        self.draft_len = draft_len
+
+        if compile is None:
+            compile = os.environ.get("KRONOS_COMPILE", "0").strip().lower() in ("1", "true", "yes", "y")
+        self.compile = compile
+        self.cuda_graph = cuda_graph
+        if static_decoder_cache_size is None:
+            static_decoder_cache_size = int(os.environ.get("KRONOS_COMPILE_CACHE_SIZE", "2"))
+        self.static_decoder_cache_size = max(1, static_decoder_cache_size)
+        self._static_decoders = OrderedDict()
+        if self.compile:
+            self.get_static_decoder(warmup_batch_size * warmup_sample_count)
+
+    def get_static_decoder(self, rows):
+        """
+        Compiled decode step for `rows` = batch * sample_count (built and warmed up on first use), or None.
+        Decoders are kept in an LRU of static_decoder_cache_size shapes.
+        """
+        if not self.compile:
+            return None
+        decoder = self._static_decoders.get(rows)
+        if decoder is not None:
+            self._static_decoders.move_to_end(rows)
+            return decoder
+        if len(self._static_decoders) >= self.static_decoder_cache_size:
+            # Free the least recently used shape's buffers and graph pool before allocating the new one
+            while len(self._static_decoders) >= self.static_decoder_cache_size:
+                self._static_decoders.popitem(last=False)[1].release()
+            release_device_memory(self.device)
+        try:
+            decoder = StaticDecoder(self.model, rows, self.max_context, self.device, compile=True, cuda_graph=self.cuda_graph)
+            decoder.warmup()
+        except Exception as e:
+            print(f"Warning: compiled Kronos decode step unavailable, falling back to eager decoding: {e}")
+            self.compile = False
+            return None
+        self._static_decoders[rows] = decoder
+        return decoder
+
+    def generate(self, x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose, padding_mask=None, quantiles=None, return_samples=False):
 
         x_tensor = torch.from_numpy(np.array(x).astype(np.float32)).to(self.device)
         x_stamp_tensor = torch.from_numpy(np.array(x_stamp).astype(np.float32)).to(self.device)
         y_stamp_tensor = torch.from_numpy(np.array(y_stamp).astype(np.float32)).to(self.device)
+        padding_mask_tensor = torch.from_numpy(np.asarray(padding_mask, dtype=bool)).to(self.device) if padding_mask is not None else None
 
         preds = auto_regressive_inference(self.tokenizer, self.model, x_tensor, x_stamp_tensor, y_stamp_tensor, self.max_context, pred_len,
-                                          self.clip, T, top_k, top_p, sample_count, verbose)
+                                          self.clip, T, top_k, top_p, sample_count, verbose, padding_mask=padding_mask_tensor,
+                                          quantiles=quantiles, return_samples=return_samples,
+                                          static_decoder=self.get_static_decoder(x_tensor.size(0) * sample_count) if self.draft_model is None else None,
+                                          draft_model=self.draft_model, draft_len=self.draft_len)
+        if isinstance(preds, dict):
+            out = {"mean": preds["mean"][:, -pred_len:, :]}
+            if "quantiles" in preds:
+                out["quantiles"] = {q: v[:, -pred_len:, :] for q, v in preds["quantiles"].items()}
+            if "samples" in preds:
+                out["samples"] = preds["samples"][:, :, -pred_len:, :]
+            return out
         preds = preds[:, -pred_len:, :]
         return preds
 
-    def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
+    def _build_outputs(self, preds, i, x_mean, x_std, index):
+        """
+        Denormalizes series i of a generate() result. Returns the prediction DataFrame; with quantiles it also
+        holds f"{col}-{q}" columns (the scaling is monotonic, so quantiles commute with it), and with samples
+        it returns (DataFrame, samples[sample_count, pred_len, n_features]).
+        """
+        cols = self.price_cols + [self.vol_col, self.amt_vol]
+        if not isinstance(preds, dict):
+            return pd.DataFrame(preds[i] * (x_std + 1e-5) + x_mean, columns=cols, index=index)
+
+        pred_df = pd.DataFrame(preds["mean"][i] * (x_std + 1e-5) + x_mean, columns=cols, index=index)
+        for q, values in preds.get("quantiles", {}).items():
+            q_df = pd.DataFrame(values[i] * (x_std + 1e-5) + x_mean, columns=[f"{c}-{q}" for c in cols], index=index)
+            pred_df = pd.concat([pred_df, q_df], axis=1)
+        if "samples" in preds:
+            return pred_df, preds["samples"][i] * (x_std + 1e-5) + x_mean
+        return pred_df
+
+    def predict(self, df, x_timestamp, y_timestamp, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True, quantiles=None, return_samples=False):
+        """
+        Predicts pred_len steps after df. Returns a DataFrame of the sample mean (open, high, low, close, volume, amount).
+
+        quantiles (e.g. [0.1, ..., 0.9]) adds f"{col}-{q}" columns computed over the sample_count paths of the same
+        generation pass (see `quantile_predictions` for the TimesFM-style "mtf-0.x" dict); return_samples=True returns
+        (DataFrame, samples[sample_count, pred_len, n_features]) instead.
+        """
 
         if not isinstance(df, pd.DataFrame):
             raise ValueError("Input must be a pandas DataFrame.")
@@ -519,18 +1091,16 @@ class KronosPredictor():
         x_stamp = x_stamp[np.newaxis, :]
         y_stamp = y_stamp[np.newaxis, :]
 
-        preds = self.generate(x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose)
+        preds = self.generate(x, x_stamp, y_stamp, pred_len, T, top_k, top_p, sample_count, verbose,
+                              quantiles=quantiles, return_samples=return_samples)
 
-        preds = preds.squeeze(0)
-        preds = preds * (x_std + 1e-5) + x_mean
-
-        pred_df = pd.DataFrame(preds, columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp)
-        return pred_df
+        return self._build_outputs(preds, 0, x_mean, x_std, y_timestamp)
 
 
-    def predict_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True):
+    def predict_batch(self, df_list, x_timestamp_list, y_timestamp_list, pred_len, T=1.0, top_k=0, top_p=0.9, sample_count=1, verbose=True, quantiles=None, return_samples=False):
         """
-        Perform parallel (batch) prediction on multiple time series. All series must have the same historical length and prediction length (pred_len).
+        Perform parallel (batch) prediction on multiple time series. All series must share the prediction length (pred_len);
+        historical lengths may differ: shorter series are left-padded and masked, so each series is predicted as if on its own.
 
         Args:
             df_list (List[pd.DataFrame]): List of input DataFrames, each containing price columns and optional volume/amount columns.
@@ -542,6 +1112,8 @@ class KronosPredictor():
             top_p (float): Top-p (nucleus sampling) threshold.
             sample_count (int): Number of parallel samples per series, automatically averaged internally.
             verbose (bool): Whether to display autoregressive progress.
+            quantiles (List[float], optional): Sample quantiles to add as f"{col}-{q}" columns.
+            return_samples (bool): Return (DataFrame, samples) pairs with the individual sample paths.
 
         Returns:
             List[pd.DataFrame]: List of prediction results in the same order as input, each DataFrame contains
@@ -608,24 +1180,33 @@ class KronosPredictor():
             seq_lens.append(x_norm.shape[0])
             y_lens.append(y_stamp.shape[0])
 
-        # Require all series to have consistent historical and prediction lengths for batch processing
-        if len(set(seq_lens)) != 1:
-            raise ValueError(f"Parallel prediction requires all series to have consistent historical lengths, got: {seq_lens}")
+        # Prediction lengths must match for a shared generation loop; historical lengths may differ
         if len(set(y_lens)) != 1:
             raise ValueError(f"Parallel prediction requires all series to have consistent prediction lengths, got: {y_lens}")
 
+        max_len = max(seq_lens)
+        padding_mask = None
+        if len(set(seq_lens)) != 1:
+            # Left-pad shorter series (values and stamps zero) so that all series end at the same column
+            padding_mask = np.zeros((num_series, max_len), dtype=bool)
+            for i in range(num_series):
+                pad = max_len - seq_lens[i]
+                if pad:
+                    padding_mask[i, :pad] = True
+                    x_list[i] = np.concatenate([np.zeros((pad, x_list[i].shape[1]), dtype=np.float32), x_list[i]], axis=0)
+                    x_stamp_list[i] = np.concatenate([np.zeros((pad, x_stamp_list[i].shape[1]), dtype=np.float32), x_stamp_list[i]], axis=0)
+
         x_batch = np.stack(x_list, axis=0).astype(np.float32)           # (B, seq_len, feat)
         x_stamp_batch = np.stack(x_stamp_list, axis=0).astype(np.float32) # (B, seq_len, time_feat)
         y_stamp_batch = np.stack(y_stamp_list, axis=0).astype(np.float32) # (B, pred_len, time_feat)
 
-        preds = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, T, top_k, top_p, sample_count, verbose)
-        # preds: (B, pred_len, feat)
+        preds = self.generate(x_batch, x_stamp_batch, y_stamp_batch, pred_len, T, top_k, top_p, sample_count, verbose,
+                              padding_mask=padding_mask, quantiles=quantiles, return_samples=return_samples)
+        # preds: (B, pred_len, feat), or a dict of mean / quantiles / samples
 
         pred_dfs = []
         for i in range(num_series):
-            preds_i = preds[i] * (stds[i] + 1e-5) + means[i]
-            pred_df = pd.DataFrame(preds_i, columns=self.price_cols + [self.vol_col, self.amt_vol], index=y_timestamp_list[i])
-            pred_dfs.append(pred_df)
+            pred_dfs.append(self._build_outputs(preds, i, means[i], stds[i], y_timestamp_list[i]))
 
         return pred_dfs
 
@@ -1,4 +1,5 @@
 import math
+import os
 
 from einops import rearrange, reduce
 import torch
@@ -281,6 +282,7 @@ class FeedForward(nn.Module):
 class RotaryPositionalEmbedding(nn.Module):
     def __init__(self, dim):
         super().__init__()
+        self.dim = dim
         inv_freq = 1.0 / (10000 ** (torch.arange(0, dim, 2).float() / dim))
         self.register_buffer("inv_freq", inv_freq)
         self.seq_len_cached = None
@@ -288,17 +290,41 @@ class RotaryPositionalEmbedding(nn.Module):
         self.sin_cached = None
 
     def _update_cos_sin_cache(self, x, seq_len):
-        if seq_len != self.seq_len_cached:
+        # The table only grows: rows for positions [0, n) do not depend on the table length,
+        # so a longer table sliced to seq_len is identical to one built for seq_len.
+        # Tables are always built in float32 (and cast to q's dtype when applied): positions and frequencies in
+        # fp16/bf16 would round badly (bf16 represents integers exactly only up to 256)
+        if self.seq_len_cached is None or seq_len > self.seq_len_cached or self.cos_cached.device != x.device:
             self.seq_len_cached = seq_len
-            t = torch.arange(seq_len, device=x.device).type_as(self.inv_freq)
-            freqs = torch.einsum('i,j->ij', t, self.inv_freq)
+            inv_freq = self.inv_freq
+            if inv_freq.dtype != torch.float32:
+                inv_freq = 1.0 / (10000 ** (torch.arange(0, self.dim, 2, device=x.device).float() / self.dim))
+            t = torch.arange(seq_len, device=x.device).type_as(inv_freq)
+            freqs = torch.einsum('i,j->ij', t, inv_freq)
             emb = torch.cat((freqs, freqs), dim=-1).to(x.device)
             self.cos_cached = emb.cos()[None, None, :, :]
             self.sin_cached = emb.sin()[None, None, :, :]
-        return self.cos_cached, self.sin_cached
+        return self.cos_cached[:, :, :seq_len, :], self.sin_cached[:, :, :seq_len, :]
 
-    def forward(self, q, k):
-        cos, sin = self._update_cos_sin_cache(q, q.shape[-2])
+    def forward(self, q, k, offset=0, positions=None):
+        """
+        Rotates q and k by their absolute positions. `offset` is the position of the first
+        row of q/k, used when decoding with a KV cache (past keys are already rotated).
+        `positions` (LongTensor [seq_len]) gives the positions as a tensor instead, for
+        static-shape decoding; the table must already cover them (see `_update_cos_sin_cache`).
+        """
+        if positions is not None:
+            cos = self.cos_cached.index_select(2, positions).to(q.dtype)
+            sin = self.sin_cached.index_select(2, positions).to(q.dtype)
+            return (
+                (q * cos) + (self._rotate_half(q) * sin),
+                (k * cos) + (self._rotate_half(k) * sin),
+            )
+        seq_len = q.shape[-2]
+        cos, sin = self._update_cos_sin_cache(q, offset + seq_len)
+        if offset:
+            cos, sin = cos[:, :, offset:, :], sin[:, :, offset:, :]
+        cos, sin = cos.to(q.dtype), sin.to(q.dtype)
         return (
             (q * cos) + (self._rotate_half(q) * sin),
             (k * cos) + (self._rotate_half(k) * sin),
@@ -336,6 +362,133 @@ def scaled_dot_product_attention(query, key, value, attn_mask=None, dropout_p=0.
     return attn_weight @ value
 
 
+# torch>=2.0 fused attention (flash / memory-efficient / math kernels). KRONOS_FUSED_ATTENTION=0 forces the
+# hand-written implementation above. If the fused call rejects its inputs once, attention() switches to the
+# hand-written path for the rest of the process (out-of-memory errors are raised, not retried).
+USE_FUSED_ATTENTION = hasattr(F, "scaled_dot_product_attention") and \
+    os.environ.get("KRONOS_FUSED_ATTENTION", "1").strip().lower() not in ("0", "false", "no", "n")
+
+
+def attention(query, key, value, attn_mask=None, dropout_p=0.0, is_causal=False, training=False):
+    """
+    Attention entry point used by the Kronos attention modules.
+
+    attn_mask follows the convention of `scaled_dot_product_attention` above: a bool mask is True where
+    attention is NOT allowed, a float mask is added to the scores. Unlike the hand-written version, dropout
+    is only applied while training.
+    """
+    global USE_FUSED_ATTENTION
+    dropout_p = dropout_p if training else 0.0
+    if USE_FUSED_ATTENTION:
+        try:
+            fused_mask = attn_mask
+            if attn_mask is not None and attn_mask.dtype == torch.bool:
+                fused_mask = attn_mask.logical_not()  # F.scaled_dot_product_attention: True = attend
+                if is_causal:
+                    # The fused kernel does not take a mask together with is_causal; fold the causal part in
+                    L, S = query.size(-2), key.size(-2)
+                    fused_mask = fused_mask & torch.ones(L, S, dtype=torch.bool, device=query.device).tril(diagonal=0)
+                    is_causal = False
+            elif attn_mask is not None and is_causal:
+                L, S = query.size(-2), key.size(-2)
+                causal_bias = torch.zeros(L, S, dtype=query.dtype, device=query.device).masked_fill_(
+                    torch.ones(L, S, dtype=torch.bool, device=query.device).triu(diagonal=1), float("-inf"))
+                fused_mask = attn_mask.to(query.dtype) + causal_bias
+                is_causal = False
+            return F.scaled_dot_product_attention(
+                query, key, value, attn_mask=fused_mask, dropout_p=dropout_p, is_causal=is_causal
+            )
+        except RuntimeError as e:
+            # The hand-written path needs more memory, so an OOM here would only get worse there
+            if isinstance(e, getattr(torch.cuda, "OutOfMemoryError", ())) or "out of memory" in str(e):
+                raise
+            print(f"Warning: fused scaled_dot_product_attention failed, using the hand-written attention from now on: {e}")
+            USE_FUSED_ATTENTION = False
+    if attn_mask is not None and is_causal:
+        # The hand-written version asserts attn_mask is None with is_causal; merge the masks instead
+        L, S = query.size(-2), key.size(-2)
+        causal_mask = torch.ones(L, S, dtype=torch.bool, device=query.device).triu(diagonal=1)
+        if attn_mask.dtype == torch.bool:
+            attn_mask = attn_mask | causal_mask
+        else:
+            attn_mask = attn_mask.masked_fill(causal_mask, float("-inf"))
+        is_causal = False
+    return scaled_dot_product_attention(query, key, value, attn_mask=attn_mask, dropout_p=dropout_p, is_causal=is_causal)
+
+
+class KVCache:
+    """
+    Preallocated key/value buffers for all self-attention layers of a model, [n_layers, batch, n_heads, max_len, head_dim].
+
+    Unlike the (k, v) tuples returned with use_cache=True, nothing is concatenated per step: each layer writes the new
+    positions in place and attends over a view of the filled prefix. `length` is advanced by the caller (Kronos.decode_s1)
+    once every layer has been updated.
+    """
+
+    def __init__(self, n_layers, batch_size, n_heads, max_len, head_dim, dtype=torch.float32, device=None):
+        # Zero-initialised: static-shape decoding attends over the whole buffer with unfilled positions masked,
+        # and uninitialised memory could hold NaN/inf (0 * NaN = NaN)
+        self.k = torch.zeros(n_layers, batch_size, n_heads, max_len, head_dim, dtype=dtype, device=device)
+        self.v = torch.zeros_like(self.k)
+        self.max_len = max_len
+        self.length = 0
+
+    def layer(self, index):
+        return LayerKVCache(self, index)
+
+    def advance(self, n):
+        self.length += n
+
+    def expand(self, repeats, out=None):
+        """
+        New cache with every batch row repeated `repeats` times (row b -> rows b * repeats .. b * repeats + repeats - 1,
+        like repeat_interleave), holding a copy of the filled prefix. Used to fan a prefilled prefix out to samples.
+        `out` reuses an existing cache of matching batch size (and max_len >= length) instead of allocating one.
+        """
+        n_layers, batch_size, n_heads, max_len, head_dim = self.k.shape
+        if out is None:
+            out = KVCache(n_layers, batch_size * repeats, n_heads, max_len, head_dim, dtype=self.k.dtype, device=self.k.device)
+        out_len = out.k.size(3)
+        for src, dst in ((self.k, out.k), (self.v, out.v)):
+            dst.view(n_layers, batch_size, repeats, n_heads, out_len, head_dim)[..., :self.length, :] = \
+                src[:, :, None, :, :self.length, :]
+        out.length = self.length
+        return out
+
+    def reset(self):
+        self.length = 0
+
+    def truncate(self, length):
+        """Drops the positions from `length` on (e.g. rejected speculative tokens); later updates overwrite them."""
+        self.length = min(self.length, length)
+
+
+class LayerKVCache:
+    """View of one layer of a KVCache."""
+
+    def __init__(self, cache, index):
+        self.cache = cache
+        self.index = index
+
+    @property
+    def length(self):
+        return self.cache.length
+
+    def update(self, k, v):
+        start, end = self.cache.length, self.cache.length + k.size(2)
+        if end > self.cache.max_len:
+            raise ValueError(f"KVCache overflow: {end} > max_len {self.cache.max_len}")
+        self.cache.k[self.index, :, :, start:end] = k
+        self.cache.v[self.index, :, :, start:end] = v
+        return self.cache.k[self.index, :, :, :end], self.cache.v[self.index, :, :, :end]
+
+    def update_static(self, k, v, positions):
+        """Writes k/v at `positions` (LongTensor) and returns the whole buffers; shapes never change."""
+        self.cache.k[self.index].index_copy_(2, positions, k)
+        self.cache.v[self.index].index_copy_(2, positions, v)
+        return self.cache.k[self.index], self.cache.v[self.index]
+
+
 class MultiHeadAttentionWithRoPE(nn.Module):
     def __init__(self, d_model, n_heads, attn_dropout_p=0.0, resid_dropout_p=0.0):
         super().__init__()
@@ -351,30 +504,84 @@ class MultiHeadAttentionWithRoPE(nn.Module):
         self.attn_dropout_p = attn_dropout_p
         self.resid_dropout = nn.Dropout(resid_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    def forward(self, x, key_padding_mask=None, past_key_value=None, use_cache=False, cache_position=None):
+        """
+        Args:
+            x (torch.Tensor): [batch, seq_len, d_model]
+            key_padding_mask (torch.Tensor, optional): [batch, past_len + seq_len], True for padded keys.
+            past_key_value (Tuple[torch.Tensor, torch.Tensor] or LayerKVCache, optional): cached (k, v) of the
+                previous positions, each [batch, n_heads, past_len, head_dim], keys already rotated. A LayerKVCache
+                is updated in place.
+            use_cache (bool): also return the updated (k, v) cache (the LayerKVCache itself when one was given).
+            cache_position (torch.LongTensor, optional): static-shape decoding with a LayerKVCache: the new rows are
+                written at these positions and the query attends over the whole buffer; key_padding_mask
+                [batch, max_len] (required) masks padded and not yet written positions.
+
+        Returns:
+            torch.Tensor, or (torch.Tensor, (k, v)) when use_cache is True.
+        """
         batch_size, seq_len, _ = x.shape
+        static_cache = isinstance(past_key_value, LayerKVCache)
+        if static_cache:
+            past_len = past_key_value.length
+        else:
+            past_len = past_key_value[0].size(2) if past_key_value is not None else 0
 
         q = self.q_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
         k = self.k_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
         v = self.v_proj(x).view(batch_size, seq_len, self.n_heads, self.head_dim).transpose(1, 2)
 
-        q, k = self.rotary(q, k)
+        if cache_position is not None:
+            q, k = self.rotary(q, k, positions=cache_position)
+            k, v = past_key_value.update_static(k, v, cache_position)
+            attn_mask = key_padding_mask[:, None, None, :]  # [batch, 1, 1, max_len]
+            attn_output = attention(q, k, v, attn_mask=attn_mask, dropout_p=self.attn_dropout_p, is_causal=False,
+                                    training=self.training)
+            attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, seq_len, self.d_model)
+            return self.resid_dropout(self.out_proj(attn_output))
+
+        q, k = self.rotary(q, k, offset=past_len)
+
+        if static_cache:
+            k, v = past_key_value.update(k, v)
+        elif past_key_value is not None:
+            k = torch.cat([past_key_value[0], k], dim=2)
+            v = torch.cat([past_key_value[1], v], dim=2)
+        kv_len = k.size(2)
 
         if key_padding_mask is not None:
-            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)  # [batch, 1, 1, seq_len]
-            attn_mask = attn_mask.expand(-1, self.n_heads, seq_len, -1)  # [batch, n_heads, q_len, k_len]
+            attn_mask = key_padding_mask.unsqueeze(1).unsqueeze(2)  # [batch, 1, 1, kv_len]
+            # Padded queries keep every key visible: with left padding their rows would otherwise be fully
+            # masked, softmax gives NaN and the NaN values leak into real positions through v (0 * NaN).
+            # Their outputs are never read.
+            query_padding = key_padding_mask[:, -seq_len:].unsqueeze(1).unsqueeze(-1)  # [batch, 1, q_len, 1]
+            attn_mask = attn_mask & query_padding.logical_not()
+            attn_mask = attn_mask.expand(-1, self.n_heads, -1, -1)  # [batch, n_heads, q_len, kv_len]
         else:
             attn_mask = None
 
-        attn_output = scaled_dot_product_attention(
+        is_causal = True
+        if past_len > 0:
+            # New queries sit at positions past_len.. and may see every cached key, so the causal
+            # mask is aligned to the bottom-right corner; a single new query needs no mask at all.
+            is_causal = False
+            if seq_len > 1:
+                causal_mask = torch.ones(seq_len, kv_len, dtype=torch.bool, device=x.device).triu(diagonal=past_len + 1)
+                attn_mask = causal_mask if attn_mask is None else (attn_mask | causal_mask)
+
+        attn_output = attention(
             q, k, v,
             attn_mask=attn_mask,
             dropout_p=self.attn_dropout_p,
-            is_causal=True
+            is_causal=is_causal,
+            training=self.training
         )
 
         attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, seq_len, self.d_model)
-        return self.resid_dropout(self.out_proj(attn_output))
+        output = self.resid_dropout(self.out_proj(attn_output))
+        if use_cache:
+            return output, (past_key_value if static_cache else (k, v))
+        return output
 
 
 class MultiHeadCrossAttentionWithRoPE(nn.Module):
@@ -410,11 +617,12 @@ class MultiHeadCrossAttentionWithRoPE(nn.Module):
 
         is_causal_flag = self.training
 
-        attn_output = scaled_dot_product_attention(
+        attn_output = attention(
             q, k, v,
             attn_mask=attn_mask,
             dropout_p=self.attn_dropout_p,
-            is_causal=is_causal_flag
+            is_causal=is_causal_flag,
+            training=self.training
         )
 
         attn_output = attn_output.transpose(1, 2).contiguous().view(batch_size, q_len, self.d_model)
@@ -479,16 +687,22 @@ class TransformerBlock(nn.Module):
         self.norm2 = RMSNorm(d_model)
         self.ffn = FeedForward(d_model, ff_dim, ffn_dropout_p)
 
-    def forward(self, x, key_padding_mask=None):
+    def forward(self, x, key_padding_mask=None, past_key_value=None, use_cache=False, cache_position=None):
         residual = x
         x = self.norm1(x)
-        attn_out = self.self_attn(x, key_padding_mask=key_padding_mask)
+        if use_cache:
+            attn_out, present = self.self_attn(x, key_padding_mask=key_padding_mask, past_key_value=past_key_value, use_cache=True)
+        else:
+            attn_out = self.self_attn(x, key_padding_mask=key_padding_mask, past_key_value=past_key_value,
+                                      cache_position=cache_position)
         x = residual + attn_out
 
         residual = x
         x = self.norm2(x)
         ffn_out = self.ffn(x)
         x = residual + ffn_out
+        if use_cache:
+            return x, present
         return x
 
 
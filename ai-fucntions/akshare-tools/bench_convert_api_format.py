@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+convert_dataframe_to_api_format 基准：按列实现 vs 逐行 iterrows 旧实现
+
+用法：python bench_convert_api_format.py [行数 ...]   默认 10000 与 100000 行
+构造与 get_stock_data_from_local 输出相同结构的 DataFrame（含缺失值），分别计时，
+并校验两者 json.dumps 后的载荷逐字节一致。
+"""
+
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from get_finanial_data import convert_dataframe_to_api_format, _convert_dataframe_to_api_format_legacy
+
+
+def make_df(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, rows))
+    df = pd.DataFrame({
+        "datetime": pd.date_range("1990-01-01", periods=rows, freq="D"),
+        "open": close * 0.99,
+        "high": close * 1.01,
+        "low": close * 0.98,
+        "close": close,
+        "volume": rng.integers(1e5, 1e7, rows).astype(float),
+        "amount": rng.uniform(1e6, 1e9, rows),
+        "amplitude": rng.normal(0, 1, rows),
+        "percentage_change": rng.normal(0, 1, rows),
+        "amount_change": rng.normal(0, 0.1, rows),
+    })
+    # 随机缺失值，覆盖 NaN -> 0 的分支
+    for col in ("open", "volume", "amount"):
+        df.loc[rng.random(rows) < 0.01, col] = np.nan
+    return df
+
+
+def bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(rows: int, repeat: int = 3) -> None:
+    df = make_df(rows)
+    legacy = lambda: _convert_dataframe_to_api_format_legacy(df, "sh600000", 1)
+    fast = lambda: convert_dataframe_to_api_format(df, "sh600000", 1)
+
+    assert json.dumps(legacy()).encode() == json.dumps(fast()).encode(), "输出不一致"
+
+    t_old = bench(legacy, 1 if rows > 50000 else repeat)
+    t_new = bench(fast, repeat)
+    print(f"{rows:>7} 行 | legacy {t_old * 1000:9.1f} ms | fast {t_new * 1000:8.1f} ms | 加速 {t_old / t_new:6.1f}x")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.INFO)
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    print(f"pandas {pd.__version__} | numpy {np.__version__}")
+    for n in sizes:
+        run(n)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+_records_to_df 解码基准：新旧实现对比（含 JSON 解析）
+
+用法：python bench_records_to_df.py [行数 ...]   默认 4000 与 40000 行
+生成与 /api/v1/stock-data/{symbol}/range 相同结构的 JSON 载荷，分别计时：
+- legacy: json.loads + _records_to_df_legacy（from_records + to_datetime + to_numeric + sort）
+- fast:   orjson.loads（未安装时为 json.loads） + records_to_df
+并校验两者输出的数值列与日期一致。
+"""
+
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from postgres import PostgresHandler
+from records_decoder import records_to_df, loads, orjson
+
+
+def make_payload(rows: int) -> bytes:
+    days = pd.bdate_range("1990-01-01", periods=rows)
+    rng = np.random.default_rng(0)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, rows))
+    records = []
+    for i, d in enumerate(days):
+        ts = d.strftime("%Y-%m-%dT00:00:00Z")
+        records.append({
+            "id": i + 1,
+            "datetime": ts,
+            "date_str": ts[:10],
+            "open": round(float(close[i]) * 0.99, 3),
+            "close": round(float(close[i]), 3),
+            "high": round(float(close[i]) * 1.01, 3),
+            "low": round(float(close[i]) * 0.98, 3),
+            "volume": int(rng.integers(1e5, 1e7)),
+            "amount": round(float(rng.uniform(1e6, 1e9)), 2),
+            "amplitude": 1.23,
+            "percentage_change": 0.45,
+            "amount_change": 0.01,
+            "turnover_rate": 0.67,
+            "type": 1,
+            "symbol": "sh600000",
+            "created_at": "2025-01-01T00:00:00Z",
+            "updated_at": "2025-01-01T00:00:00Z",
+        })
+    return json.dumps({"code": 200, "data": records}).encode("utf-8")
+
+
+def bench(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(rows: int, repeat: int = 5) -> None:
+    payload = make_payload(rows)
+    legacy = lambda: PostgresHandler._records_to_df_legacy(json.loads(payload)["data"])
+    fast = lambda: records_to_df(loads(payload)["data"])
+
+    df_old, df_new = legacy(), fast()
+    for col in ("open", "close", "high", "low", "amount", "volume"):
+        assert np.allclose(df_old[col].astype(float).to_numpy(), df_new[col].astype(float).to_numpy()), col
+    assert (df_old["datetime"].to_numpy().astype("datetime64[s]") == df_new["datetime"].to_numpy()).all()
+    assert (df_old["datetime"].to_numpy().astype("datetime64[s]").astype(np.int64) == df_new["datetime_int"].to_numpy()).all()
+
+    t_old = bench(legacy, repeat)
+    t_new = bench(fast, repeat)
+    print(f"{rows:>7} 行 | 载荷 {len(payload) / 1024:8.1f} KB | legacy {t_old * 1000:8.2f} ms | fast {t_new * 1000:8.2f} ms | 加速 {t_old / t_new:5.2f}x")
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [4000, 40000]
+    print(f"JSON 解析: {'orjson' if orjson is not None else 'json'} | pandas {pd.__version__} | numpy {np.__version__}")
+    for n in sizes:
+        run(n)
@@ -3,7 +3,8 @@ from datetime import date
 
 import akshare as ak
 import pandas as pd
-import requests
+
+from payload_upload import build_records, float_list, int_list, str_list, upload_batches
 
 
 # Go 服务地址与鉴权配置
@@ -18,89 +19,44 @@ def fetch_etf_df():
     return df
 
 
-def _to_float(val):
-    """将值安全转换为 float。若包含百分号或逗号，做清理；失败则返回 0.0。"""
-    if val is None:
-        return 0.0
-    # NaN 处理
-    try:
-        if isinstance(val, float) and pd.isna(val):
-            return 0.0
-    except Exception:
-        pass
-    try:
-        s = str(val).strip().replace(",", "")
-        if s.endswith("%"):
-            s = s[:-1]
-        return float(s)
-    except Exception:
-        return 0.0
-
-
-def _to_int(val):
-    """将值安全转换为 int。失败则返回 0。"""
-    if val is None:
-        return 0
-    try:
-        if isinstance(val, float) and pd.isna(val):
-            return 0
-    except Exception:
-        pass
-    try:
-        s = str(val).strip().replace(",", "")
-        # 有些成交额可能是小数，取整
-        return int(float(s))
-    except Exception:
-        return 0
-
-
-# 通过 Go 服务的 HTTP 接口批量上送数据
-def _post_batch_to_go(payload, api_url=None, token=None, timeout=30):
-    base = (api_url or GO_API_URL).rstrip("/")
-    tk = token or API_TOKEN
-    url = f"{base}/api/v1/etf/daily/batch"
-    headers = {
-        "Content-Type": "application/json",
-        "X-Token": tk,
-    }
-    resp = requests.post(url, json=payload, headers=headers, timeout=timeout)
-    if resp.status_code != 200:
-        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
-    return resp
-
-
 def upsert_etf_daily(df: pd.DataFrame, api_url=None, token=None, batch_size=500):
-    """改为调用 Golang 服务的批量接口进行 upsert，不再直连数据库。"""
+    """改为调用 Golang 服务的批量接口进行 upsert，不再直连数据库。
+
+    按列构造载荷：数值列去掉千分位逗号/百分号后整列解析，无法解析或缺失为 0；代码为空的行跳过。
+    上传见 payload_upload.upload_batches（连接池并发 + 自适应限速）。
+    """
     tdate = date.today().strftime("%Y-%m-%d")
-    payload = []
-
-    for _, r in df.iterrows():
-        code = str(r.get("代码") or "").strip()
-        if not code:
-            continue
-        payload.append({
-            "code": code,
-            "trading_date": tdate,
-            "name": str(r.get("名称") or "").strip(),
-            "latest_price": _to_float(r.get("最新价")),
-            "change_amount": _to_float(r.get("涨跌额")),
-            "change_percent": _to_float(r.get("涨跌幅")),
-            "buy": _to_float(r.get("买入")),
-            "sell": _to_float(r.get("卖出")),
-            "prev_close": _to_float(r.get("昨收")),
-            "open": _to_float(r.get("今开")),
-            "high": _to_float(r.get("最高")),
-            "low": _to_float(r.get("最低")),
-            "volume": _to_int(r.get("成交量")),
-            "turnover": _to_int(r.get("成交额")),
-        })
-
-    total = 0
-    for i in range(0, len(payload), batch_size):
-        batch = payload[i:i+batch_size]
-        _post_batch_to_go(batch, api_url=api_url, token=token)
-        total += len(batch)
-    return total
+    n = len(df)
+
+    def col(name):
+        return df[name] if name in df.columns else pd.Series([None] * n, index=df.index, dtype=object)
+
+    payload = build_records({
+        "code": str_list(col("代码"), missing=""),
+        "trading_date": [tdate] * n,
+        "name": str_list(col("名称"), missing=""),
+        "latest_price": float_list(col("最新价"), missing=0.0, strip_percent=True),
+        "change_amount": float_list(col("涨跌额"), missing=0.0, strip_percent=True),
+        "change_percent": float_list(col("涨跌幅"), missing=0.0, strip_percent=True),
+        "buy": float_list(col("买入"), missing=0.0, strip_percent=True),
+        "sell": float_list(col("卖出"), missing=0.0, strip_percent=True),
+        "prev_close": float_list(col("昨收"), missing=0.0, strip_percent=True),
+        "open": float_list(col("今开"), missing=0.0, strip_percent=True),
+        "high": float_list(col("最高"), missing=0.0, strip_percent=True),
+        "low": float_list(col("最低"), missing=0.0, strip_percent=True),
+        "volume": int_list(col("成交量"), missing=0),
+        "turnover": int_list(col("成交额"), missing=0),
+    }, required=("code",))
+
+    res = upload_batches(
+        api_url or GO_API_URL,
+        "/api/v1/etf/daily/batch",
+        payload,
+        token or API_TOKEN,
+        batch_size=batch_size,
+        affected=lambda data, batch: len(batch),
+    )
+    return res["affected"]
 
 
 def main():
@@ -654,10 +654,122 @@ class PostgreSQLAPIClient:
             raise
 
 
+API_FLOAT_COLUMNS = ['open', 'close', 'high', 'low']
+API_OPTIONAL_FLOAT_COLUMNS = ['amount', 'amplitude', 'percentage_change', 'amount_change', 'turnover_rate']
+
+
+def _api_datetime_strings(col):
+    """datetime 列 -> RFC3339 字符串列表（与逐行实现一致：NaT 输出 'NaT'，无法解析的值原样转为字符串）"""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        if getattr(col.dt, 'tz', None) is not None:
+            # 与 Timestamp.strftime 一致：带时区时按本地时间格式化
+            col = col.dt.tz_localize(None)
+        values = col.to_numpy().astype('datetime64[s]')
+        valid = ~np.isnat(values)
+        years = values[valid].astype('datetime64[Y]').astype(np.int64) + 1970
+        if len(years) == 0 or (years.min() >= 1000 and years.max() <= 9999):
+            out = np.char.add(np.datetime_as_string(values, unit='s'), 'Z')
+            out[~valid] = 'NaT'
+            return out.tolist()
+        return col.dt.strftime('%Y-%m-%dT%H:%M:%SZ').fillna('NaT').tolist()
+
+    def _one(value):
+        if isinstance(value, pd.Timestamp):
+            return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+        try:
+            return pd.to_datetime(str(value)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        except Exception:
+            return str(value)
+
+    return [_one(v) for v in col.tolist()]
+
+
+def _api_float_list(col):
+    """数值列 -> float 列表，缺失值为 0.0；非数值类型逐个 float()，与逐行实现一致"""
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype('float64').fillna(0.0).tolist()
+    return [float(v) if pd.notna(v) else 0.0 for v in col.tolist()]
+
+
+def _api_int_list(col):
+    """成交量 -> int 列表（向零截断），缺失值为 0"""
+    if pd.api.types.is_integer_dtype(col) and not isinstance(col.dtype, pd.api.extensions.ExtensionDtype):
+        return col.tolist()
+    if pd.api.types.is_numeric_dtype(col):
+        values = col.astype('float64').fillna(0.0).to_numpy()
+        if not np.isfinite(values).all():
+            raise OverflowError("volume 含无穷值")
+        return np.trunc(values).astype(np.int64).tolist()
+    return [int(v) if pd.notna(v) else 0 for v in col.tolist()]
+
+
 def convert_dataframe_to_api_format(df, symbol, stock_type=1):
     """
     将pandas DataFrame转换为API所需的格式
     
+    按列一次性转换（datetime 整列格式化、数值列整列填充缺失值），再按行组装字典；
+    输出与逐行实现（_convert_dataframe_to_api_format_legacy）逐字节一致。按列转换失败时回退到逐行实现。
+    
+    Args:
+        df (pd.DataFrame): 股票数据DataFrame
+        symbol (str): 股票代码
+        stock_type (int): 股票类型 (1=股票, 2=基金, 3=指数, 4+=其他)
+        
+    Returns:
+        list: 转换后的数据列表
+    """
+    if df is None or df.empty:
+        logger.warning("DataFrame为空，无法转换")
+        return []
+    
+    # 确保必要的列存在
+    required_columns = ['datetime', 'open', 'close', 'high', 'low', 'volume']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        logger.error(f"DataFrame缺少必要的列: {missing_columns}")
+        return []
+    
+    try:
+        n = len(df)
+        datetimes = _api_datetime_strings(df['datetime'])
+        floats = {col: _api_float_list(df[col]) for col in API_FLOAT_COLUMNS}
+        volumes = _api_int_list(df['volume'])
+        for col in API_OPTIONAL_FLOAT_COLUMNS:
+            floats[col] = _api_float_list(df[col]) if col in df.columns else [0.0] * n
+        
+        api_data_list = [
+            {
+                "datetime": dt,
+                "open": o,
+                "close": c,
+                "high": h,
+                "low": l,
+                "volume": v,
+                "amount": amt,
+                "amplitude": amp,
+                "percentage_change": pct,
+                "amount_change": chg,
+                "turnover_rate": tr,
+                "type": stock_type,
+                "symbol": symbol,
+                "date_str": dt[:10],
+            }
+            for dt, o, c, h, l, v, amt, amp, pct, chg, tr in zip(
+                datetimes, floats['open'], floats['close'], floats['high'], floats['low'], volumes,
+                floats['amount'], floats['amplitude'], floats['percentage_change'], floats['amount_change'], floats['turnover_rate'],
+            )
+        ]
+        logger.info(f"成功转换 {len(api_data_list)} 条数据为API格式")
+        return api_data_list
+    except Exception as e:
+        logger.warning(f"按列转换失败，回退到逐行转换: {str(e)}")
+        return _convert_dataframe_to_api_format_legacy(df, symbol, stock_type)
+
+
+def _convert_dataframe_to_api_format_legacy(df, symbol, stock_type=1):
+    """
+    将pandas DataFrame转换为API所需的格式（逐行 iterrows 的旧实现，保留用于回退与基准对比）
+    
     Args:
         df (pd.DataFrame): 股票数据DataFrame
         symbol (str): 股票代码
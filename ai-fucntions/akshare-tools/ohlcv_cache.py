@@ -0,0 +1,181 @@
+"""
+行情数据（stock-data）的本地列式缓存，供 PostgresHandler.ensure_date_range_df 优先读取。
+
+目录布局：{OHLCV_CACHE_DIR}/{symbol}_type_{type}[_{variant}]/
+(variant 区分列集合，如按列接口只含 OHLCV 列的 "ohlcv"，与完整记录的缓存分开存放)
+- header.json      元信息（列名与类型、行数、首末日期、已确认覆盖到的日期、创建时间）
+- {列名}.npy       每列一个 .npy（datetime64 / float64 / int64 / 定长字符串），读取时使用 mmap
+
+与 forecast-results 下分块响应的列式存储保持同一思路：不引入 pyarrow，按列独立存放，
+读取时只对请求区间做切片拷贝。
+
+一致性：
+- 追加尾部数据时会重叠读取缓存的最后一个交易日，收盘价不一致（如复权价格因除权变化）则整表重建
+- 超过 OHLCV_CACHE_MAX_AGE_DAYS（默认 7 天）的缓存整表重建
+"""
+
+import os
+import json
+import shutil
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ai_functions_dir = os.path.dirname(current_dir)
+
+FORMAT_NAME = "ohlcv-columnar"
+FORMAT_VERSION = 1
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "y")
+
+
+class OhlcvDiskCache:
+    """按 (symbol, type) 存放的列式行情缓存"""
+
+    def __init__(self, root: Optional[str] = None, enabled: Optional[bool] = None, max_age_days: Optional[float] = None):
+        self.root = root or os.environ.get("OHLCV_CACHE_DIR", os.path.join(ai_functions_dir, "stock-data-cache"))
+        self.enabled = _env_flag("OHLCV_CACHE_ENABLED") if enabled is None else enabled
+        self.max_age_days = float(os.environ.get("OHLCV_CACHE_MAX_AGE_DAYS", "7")) if max_age_days is None else max_age_days
+
+    def path(self, symbol: str, stock_type: int, variant: str = "") -> str:
+        suffix = f"_{variant}" if variant else ""
+        return os.path.join(self.root, f"{symbol}_type_{int(stock_type)}{suffix}")
+
+    # --------------------------- 读取 ---------------------------
+    def read_header(self, symbol: str, stock_type: int, variant: str = "") -> Optional[Dict[str, Any]]:
+        header_path = os.path.join(self.path(symbol, stock_type, variant), "header.json")
+        if not self.enabled or not os.path.exists(header_path):
+            return None
+        try:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取行情缓存头失败，忽略: {e}")
+            return None
+        if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+            return None
+        if header.get("symbol") != symbol or int(header.get("type", -1)) != int(stock_type):
+            return None
+        if (header.get("variant") or "") != variant:
+            return None
+        return header
+
+    def is_expired(self, header: Dict[str, Any]) -> bool:
+        if self.max_age_days <= 0:
+            return False
+        try:
+            created = datetime.fromisoformat(header["created_at"])
+        except Exception:
+            return True
+        return (datetime.now() - created).total_seconds() > self.max_age_days * 86400
+
+    def load(
+        self,
+        symbol: str,
+        stock_type: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        mmap: bool = True,
+        variant: str = "",
+    ) -> Optional[pd.DataFrame]:
+        """
+        读取缓存并按 [start_date, end_date]（含端点，按日期比较）切片。
+        各列以 mmap 打开，仅拷贝切片部分；缓存不存在或格式不符时返回 None。
+        """
+        header = self.read_header(symbol, stock_type, variant)
+        if header is None:
+            return None
+        path = self.path(symbol, stock_type, variant)
+        try:
+            dt = np.load(os.path.join(path, "datetime.npy"), mmap_mode="r" if mmap else None)
+            lo, hi = 0, len(dt)
+            if start_date:
+                lo = int(np.searchsorted(dt, np.datetime64(pd.Timestamp(start_date).normalize()), side="left"))
+            if end_date:
+                end_excl = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+                hi = int(np.searchsorted(dt, np.datetime64(end_excl), side="left"))
+            data: Dict[str, Any] = {}
+            for col in header["columns"]:
+                arr = np.load(os.path.join(path, f"{col['file']}.npy"), mmap_mode="r" if mmap else None)
+                data[col["name"]] = _restore_column(np.array(arr[lo:hi]), col.get("restore"))
+            return pd.DataFrame(data, columns=[c["name"] for c in header["columns"]])
+        except Exception as e:
+            logger.warning(f"读取行情缓存失败，忽略: {symbol} type={stock_type}: {e}")
+            return None
+
+    # --------------------------- 写入 ---------------------------
+    def save(self, symbol: str, stock_type: int, df: pd.DataFrame, requested_start: Optional[str], checked_through: Optional[str], created_at: Optional[str] = None, variant: str = "") -> Optional[str]:
+        """整表写入（先写临时目录再替换），df 需包含 datetime 列"""
+        if not self.enabled or df is None or df.empty or "datetime" not in df.columns:
+            return None
+        df = df.sort_values("datetime").drop_duplicates(subset=["datetime"], keep="last").reset_index(drop=True)
+        path = self.path(symbol, stock_type, variant)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path, exist_ok=True)
+        columns: List[Dict[str, Any]] = []
+        for i, name in enumerate(df.columns):
+            arr, restore = _encode_column(df[name])
+            file_name = "datetime" if name == "datetime" else f"c{i:02d}"
+            np.save(os.path.join(tmp_path, f"{file_name}.npy"), arr)
+            columns.append({"name": name, "file": file_name, "restore": restore})
+        header = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "symbol": symbol,
+            "type": int(stock_type),
+            "variant": variant,
+            "rows": int(len(df)),
+            "columns": columns,
+            "first_date": pd.Timestamp(df["datetime"].iloc[0]).strftime("%Y-%m-%d"),
+            "last_date": pd.Timestamp(df["datetime"].iloc[-1]).strftime("%Y-%m-%d"),
+            "requested_start": requested_start,
+            "checked_through": checked_through,
+            "created_at": created_at or datetime.now().isoformat(timespec="seconds"),
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(tmp_path, "header.json"), "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+        if os.path.exists(path):
+            old_path = f"{path}.old-{os.getpid()}"
+            os.replace(path, old_path)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            os.replace(tmp_path, path)
+        return path
+
+    def invalidate(self, symbol: str, stock_type: int, variant: str = "") -> None:
+        shutil.rmtree(self.path(symbol, stock_type, variant), ignore_errors=True)
+
+
+def _encode_column(s: pd.Series) -> Tuple[np.ndarray, Optional[str]]:
+    """pandas 列 -> 可 mmap 的 numpy 数组 + 还原标记"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        if getattr(s.dt, "tz", None) is not None:
+            s = s.dt.tz_localize(None)
+        return s.to_numpy(), None
+    if isinstance(s.dtype, pd.Int64Dtype):
+        # 可空整数以 float64 存放（NaN 表示缺失），读取时还原为 Int64
+        return s.astype("float64").to_numpy(), "Int64"
+    if pd.api.types.is_bool_dtype(s) or pd.api.types.is_numeric_dtype(s):
+        return s.to_numpy(), None
+    # 其余（字符串/对象）统一存为定长 unicode，None/NaN 存为空串
+    return s.where(s.notna(), "").astype(str).to_numpy(dtype=str), "str"
+
+
+def _restore_column(arr: np.ndarray, restore: Optional[str]):
+    if restore == "Int64":
+        return pd.array(np.where(np.isnan(arr), None, arr), dtype="Int64") if np.isnan(arr).any() else pd.array(arr.astype("int64"), dtype="Int64")
+    if restore == "str":
+        return pd.Series(arr.astype(object)).replace("", None).to_numpy()
+    return arr
@@ -0,0 +1,210 @@
+"""
+批量 upsert 的公共工具：按列构造载荷 + 异步批量上传
+
+sync_index.py（指数信息/指数日线/A股评论）与 get_etf_list.py（ETF 日行情）原先逐行 iterrows
+调用转换函数构造载荷，再用 requests.post 逐批同步上传、批间固定 sleep(0.2)。这里：
+
+- 列转换：整列转换为 Python 值列表（float/int/None），与原逐行函数语义一致
+- build_records：按列组装字典列表，可跳过值为 None 的字段（评论数据只上送有效字段）
+- upload_batches：httpx.AsyncClient 连接池上并发上传（UPLOAD_CONCURRENCY，默认 4），
+  自适应限速代替固定 sleep：遇到 429/503/超时按 Retry-After 或指数退避重试并加大批间间隔，
+  成功后间隔减半，服务端无压力时不等待
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+# --------------------------- 列转换 ---------------------------
+def _numeric(col: pd.Series, strip_percent: bool = False) -> np.ndarray:
+    """任意列 -> float64 数组，无法解析为 NaN；字符串去空白与千分位逗号（可选去掉末尾 %）"""
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype("float64").to_numpy()
+    s = col.astype(object).where(col.notna(), None)
+    s = s.map(lambda v: v if v is None or isinstance(v, (int, float, np.number)) else str(v).strip().replace(",", ""))
+    if strip_percent:
+        s = s.map(lambda v: v[:-1] if isinstance(v, str) and v.endswith("%") else v)
+    return pd.to_numeric(s, errors="coerce").astype("float64").to_numpy()
+
+
+def float_list(col: pd.Series, missing=None, strip_percent: bool = False) -> List[Any]:
+    """float 列表；缺失、无法解析或非有限值为 missing"""
+    values = _numeric(col, strip_percent=strip_percent)
+    out = values.astype(object)
+    out[~np.isfinite(values)] = missing
+    return out.tolist()
+
+
+def int_list(col: pd.Series, missing=None) -> List[Any]:
+    """int 列表（先转 float 再向零截断，同 int(float(x))）；缺失、无法解析或非有限值为 missing"""
+    values = _numeric(col)
+    finite = np.isfinite(values)
+    out = np.full(len(values), missing, dtype=object)
+    out[finite] = np.trunc(values[finite]).astype(np.int64).tolist()
+    return out.tolist()
+
+
+def str_list(col: pd.Series, missing: Optional[str] = None, strip: bool = True) -> List[Optional[str]]:
+    """字符串列表；缺失值为 missing"""
+    s = col.astype(object)
+    mask = s.isna().to_numpy()
+    values = s.astype(str)
+    if strip:
+        values = values.str.strip()
+    out = values.to_numpy(dtype=object)
+    out[mask] = missing
+    return out.tolist()
+
+
+def build_records(columns: Dict[str, Sequence[Any]], drop_none: bool = False, required: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """
+    列 -> 记录列表。columns 各列等长；常量字段请用 [value] * n。
+    drop_none=True 时省略值为 None 的字段；required 中任一字段为空（None/空串）时跳过整行。
+    """
+    keys = list(columns.keys())
+    rows = zip(*(columns[k] for k in keys))
+    req_idx = [keys.index(k) for k in required]
+    records = []
+    for row in rows:
+        if req_idx and any(row[i] is None or row[i] == "" for i in req_idx):
+            continue
+        if drop_none:
+            records.append({k: v for k, v in zip(keys, row) if v is not None})
+        else:
+            records.append(dict(zip(keys, row)))
+    return records
+
+
+# --------------------------- 异步批量上传 ---------------------------
+class AdaptiveRate:
+    """批间等待时间：失败（限流/过载）时翻倍，成功时减半，最低为 0"""
+
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 10.0, start_delay: float = 0.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = start_delay
+
+    def on_success(self) -> None:
+        self.delay = max(self.min_delay, self.delay / 2 if self.delay > 0.01 else 0.0)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        if retry_after is not None:
+            self.delay = min(self.max_delay, max(self.delay, retry_after))
+        else:
+            self.delay = min(self.max_delay, max(0.2, self.delay * 2))
+
+    async def wait(self) -> None:
+        if self.delay > 0:
+            await asyncio.sleep(self.delay * random.uniform(0.8, 1.2))
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _affected_from_response(data: Any) -> int:
+    if isinstance(data, dict):
+        inner = data.get("data")
+        if isinstance(inner, dict):
+            try:
+                return int(inner.get("affected", 0))
+            except (TypeError, ValueError):
+                return 0
+    return 0
+
+
+async def upload_batches_async(
+    base_url: str,
+    path: str,
+    records: List[Dict[str, Any]],
+    token: str,
+    batch_size: int = 500,
+    concurrency: Optional[int] = None,
+    max_retries: int = 3,
+    timeout: float = 30.0,
+    affected: Callable[[Any, List[Dict[str, Any]]], int] = lambda data, batch: _affected_from_response(data),
+    raise_on_error: bool = True,
+) -> Dict[str, Any]:
+    """
+    将 records 按 batch_size 分批 POST 到 base_url + path。
+    返回 {"rows", "batches", "affected", "failed", "retries", "elapsed"}；
+    raise_on_error=True 时在全部批次结束后若有失败批次则抛出 RuntimeError。
+    """
+    t0 = time.perf_counter()
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    result = {"rows": len(records), "batches": len(batches), "affected": 0, "failed": 0, "retries": 0, "elapsed": 0.0}
+    if not batches:
+        return result
+
+    concurrency = max(1, concurrency or int(os.environ.get("UPLOAD_CONCURRENCY", "4")))
+    rate = AdaptiveRate(max_delay=float(os.environ.get("UPLOAD_MAX_DELAY", "10")))
+    sem = asyncio.Semaphore(concurrency)
+    headers = {"Content-Type": "application/json", "X-Token": token}
+    errors: List[str] = []
+
+    async with httpx.AsyncClient(
+        base_url=base_url.rstrip("/"),
+        timeout=timeout,
+        headers=headers,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+
+        async def _send(index: int, batch: List[Dict[str, Any]]) -> None:
+            body = json.dumps(batch, allow_nan=False, ensure_ascii=False).encode("utf-8")
+            async with sem:
+                for attempt in range(max_retries + 1):
+                    await rate.wait()
+                    try:
+                        resp = await client.post(path, content=body)
+                    except (httpx.TimeoutException, httpx.TransportError) as e:
+                        if attempt >= max_retries:
+                            errors.append(f"第 {index + 1} 批: {e}")
+                            return
+                        rate.on_throttle()
+                        result["retries"] += 1
+                        continue
+                    if resp.status_code in RETRY_STATUS and attempt < max_retries:
+                        rate.on_throttle(_retry_after(resp))
+                        result["retries"] += 1
+                        continue
+                    if resp.status_code >= 400:
+                        print(f"HTTP {resp.status_code} {path} => {resp.text[:500]}")
+                        errors.append(f"第 {index + 1} 批: HTTP {resp.status_code}")
+                        return
+                    rate.on_success()
+                    try:
+                        data = resp.json()
+                    except Exception:
+                        data = None
+                    result["affected"] += affected(data, batch)
+                    return
+
+        await asyncio.gather(*(_send(i, b) for i, b in enumerate(batches)))
+
+    result["failed"] = len(errors)
+    result["elapsed"] = round(time.perf_counter() - t0, 3)
+    logger.info(f"批量上传 {path}: {result}")
+    if errors and raise_on_error:
+        raise RuntimeError(f"{path} 上传失败 {len(errors)}/{len(batches)} 批: {errors[:3]}")
+    return result
+
+
+def upload_batches(*args, **kwargs) -> Dict[str, Any]:
+    """upload_batches_async 的同步入口（供命令行脚本调用）"""
+    return asyncio.run(upload_batches_async(*args, **kwargs))
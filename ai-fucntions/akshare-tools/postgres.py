@@ -7,6 +7,7 @@ PostgresHandler: 使用后端Go API读取PG历史数据、通过SCF拉取最新
 - POST /api/v1/stock-data/batch          -> 批量插入
 - POST /api/v1/stock-data/{symbol}       -> 最近数据（JSON: {type, limit, offset}）
 - POST /api/v1/stock-data/{symbol}/range -> 按日期范围查询（JSON: {type, start_date, end_date}, 日期格式 YYYY-MM-DD）
+- POST /api/v1/stock-data/{symbol}/range/columns -> 同上，按列返回 datetime/open/high/low/close/volume/amount
 - GET  /health                           -> 服务健康检查
 
 本类职责：
@@ -20,7 +21,8 @@ import asyncio, os, sys
 import httpx, time, random
 import logging
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Union, Iterable
+import numpy as np
 import pandas as pd
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -39,6 +41,8 @@ from trading_date_processor import *
 from get_finanial_data import (
     convert_dataframe_to_api_format,
 )
+from ohlcv_cache import OhlcvDiskCache
+from records_decoder import records_to_df, columns_to_df, PROJECTED_COLUMNS, loads as json_loads
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -53,6 +57,28 @@ class PostgresHandler:
         self.api_token = api_token or "fintrack-dev-token"
         self.allow_get_fallback = allow_get_fallback
         self._client: Optional[httpx.AsyncClient] = None
+        # 本地列式行情缓存（OHLCV_CACHE_ENABLED=0 关闭）
+        self.disk_cache = OhlcvDiskCache()
+        # 投影读取（projected=True）时优先使用按列接口（PG_COLUMNAR_RANGE=0 关闭）；
+        # 服务端不支持（如旧版本返回 404）时记住并回退到按行接口
+        self.columnar_range = os.environ.get("PG_COLUMNAR_RANGE", "1").strip().lower() in ("1", "true", "yes", "y")
+        self._columnar_supported: Optional[bool] = None
+        # 多股票查询（get_by_date_range_multi_df）的并发上限，同时作为连接池保活连接数
+        self.range_concurrency = max(1, int(os.environ.get("PG_RANGE_CONCURRENCY", "8")))
+        # 服务可用性（熔断）状态：任一请求收到响应即视为可用，PG_HEALTH_TTL 秒内不再单独探测 /health；
+        # 连续 PG_BREAKER_THRESHOLD 次连接失败后熔断 PG_BREAKER_COOLDOWN 秒，期间直接判定不可用
+        self.health_ttl = float(os.environ.get("PG_HEALTH_TTL", "60"))
+        self.breaker_threshold = max(1, int(os.environ.get("PG_BREAKER_THRESHOLD", "3")))
+        self.breaker_cooldown = float(os.environ.get("PG_BREAKER_COOLDOWN", "30"))
+        self._last_ok_at: Optional[float] = None
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0
+        # 同步后仍未覆盖目标日期（停牌、数据源未更新）时，PG_SYNC_RETRY_SECONDS 秒内不重复同步同一目标
+        self.sync_retry_seconds = float(os.environ.get("PG_SYNC_RETRY_SECONDS", "600"))
+        self._sync_attempts: Dict[tuple, float] = {}
+        # 行情数据变化（同步写入新数据、缓存因复权价变化整表重建）后的回调 fn(symbol, stock_type)，
+        # 如 processor.py 注册的 df_preprocess 缓存失效
+        self._sync_listeners: List[Callable[[str, int], None]] = []
         logger.info(f"PostgresHandler 初始化完成，服务地址: {self.base_url}")
 
     async def __aenter__(self):
@@ -75,6 +101,10 @@ class PostgresHandler:
                 base_url=self.base_url,
                 timeout=self.timeout,
                 headers=headers,
+                limits=httpx.Limits(
+                    max_connections=max(self.range_concurrency * 2, 10),
+                    max_keepalive_connections=max(self.range_concurrency, 5),
+                ),
             )
             logger.debug("AsyncClient 已创建")
 
@@ -85,20 +115,57 @@ class PostgresHandler:
             self._client = None
             logger.debug("AsyncClient 已关闭")
 
+    # --------------------------- 服务可用性（熔断） ---------------------------
+    def _mark_ok(self) -> None:
+        self._last_ok_at = time.monotonic()
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0
+
+    def _mark_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.breaker_threshold:
+            self._breaker_open_until = time.monotonic() + self.breaker_cooldown
+
+    def _record_status(self, status_code: int) -> None:
+        """收到响应即说明服务可达；5xx 计为失败"""
+        if status_code >= 500:
+            self._mark_failure()
+        else:
+            self._mark_ok()
+
+    async def _api_available(self) -> bool:
+        """熔断期间直接返回 False；最近 health_ttl 秒内有成功响应时直接返回 True；否则探测 /health"""
+        now = time.monotonic()
+        if self._breaker_open_until > now:
+            return False
+        if self._last_ok_at is not None and now - self._last_ok_at < self.health_ttl:
+            return True
+        return await self.health_check()
+
     # --------------------------- 基础HTTP方法 ---------------------------
     async def _get(self, path: str, params: Optional[Dict] = None):
         await self.open()
         assert self._client is not None
-        resp = await self._client.get(path, params=params)
+        try:
+            resp = await self._client.get(path, params=params)
+        except httpx.TransportError:
+            self._mark_failure()
+            raise
+        self._record_status(resp.status_code)
         resp.raise_for_status()
-        return resp.json()
+        return json_loads(resp.content)
 
     async def _post_json(self, path: str, payload):
         await self.open()
         assert self._client is not None
-        resp = await self._client.post(path, json=payload)
+        try:
+            resp = await self._client.post(path, json=payload)
+        except httpx.TransportError:
+            self._mark_failure()
+            raise
+        self._record_status(resp.status_code)
         resp.raise_for_status()
-        return resp.json()
+        return json_loads(resp.content)
 
     async def save_best_prediction(self, payload: Dict) -> tuple:
         await self.open()
@@ -187,8 +254,11 @@ class PostgresHandler:
             data = await self._get("/health")
             ok = data.get("status") == "ok"
             # logger.info(f"API服务健康检查: {'正常' if ok else '异常'}")
+            if not ok:
+                self._mark_failure()
             return ok
         except Exception as e:
+            # 连接失败与 5xx 已在 _get 中计入熔断状态
             logger.error(f"API健康检查失败: {e}")
             return False
 
@@ -290,6 +360,20 @@ class PostgresHandler:
         """
         将从PG服务返回的记录列表转换为DataFrame，列对齐 ak_stock_data 输出格式。
 
+        按列解码（见 records_decoder.py）：datetime 为 datetime64[s]，datetime_int 为秒级 int64，
+        数值列 float64/int64；服务端已升序时不再排序。解码失败时回退到逐列转换的旧实现。
+        """
+        try:
+            return records_to_df(records)
+        except Exception as e:
+            logger.warning(f"快速解码失败，回退到逐列转换: {e}")
+            return PostgresHandler._records_to_df_legacy(records)
+
+    @staticmethod
+    def _records_to_df_legacy(records: List[Dict]) -> pd.DataFrame:
+        """
+        将从PG服务返回的记录列表转换为DataFrame，列对齐 ak_stock_data 输出格式（逐列转换的旧实现）。
+
         输出列包含（若服务有返回）：
         - datetime（pandas.Timestamp），datetime_int（秒级int）
         - open, close, high, low, volume, amount
@@ -401,10 +485,45 @@ class PostgresHandler:
             logger.error(f"获取最新记录DF失败: {e}")
             return self._records_to_df([])
 
-    async def get_by_date_range_df(self, symbol: str, start_date: str, end_date: str, stock_type: int = 1) -> pd.DataFrame:
+    async def get_by_date_range_columns_df(self, symbol: str, start_date: str, end_date: str, stock_type: int = 1) -> Optional[pd.DataFrame]:
+        """
+        通过按列接口读取日期范围内的 OHLCV 数据（只传输 datetime/open/high/low/close/volume/amount）。
+        symbol/type 在本地补齐。接口不可用或解码失败时返回 None，由调用方回退到按行接口。
+        """
+        if not self.columnar_range or self._columnar_supported is False:
+            return None
+        payload = {"type": stock_type, "start_date": start_date, "end_date": end_date}
+        try:
+            resp = await self._post_json(f"/api/v1/stock-data/{symbol}/range/columns", payload)
+            data = resp.get("data") if isinstance(resp, dict) else None
+            if not isinstance(data, dict):
+                return None
+            df = columns_to_df(data, symbol, stock_type)
+            self._columnar_supported = True
+            return df
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (404, 405):
+                logger.info("服务端不支持按列接口，改用按行接口")
+                self._columnar_supported = False
+            else:
+                logger.warning(f"按列接口查询失败，回退到按行接口: {e}")
+            return None
+        except Exception as e:
+            logger.warning(f"按列接口查询失败，回退到按行接口: {e}")
+            return None
+
+    async def get_by_date_range_df(self, symbol: str, start_date: str, end_date: str, stock_type: int = 1, projected: bool = False) -> pd.DataFrame:
         """
         按日期范围读取PG数据并返回DataFrame。日期格式：YYYY-MM-DD。
+        projected=True 时只返回 datetime/datetime_int/OHLCV/amount/type/symbol 列，优先走按列接口。
         """
+        if projected:
+            df_cols = await self.get_by_date_range_columns_df(symbol, start_date, end_date, stock_type=stock_type)
+            if df_cols is not None:
+                return df_cols
+            df = await self.get_by_date_range_df(symbol, start_date, end_date, stock_type=stock_type)
+            keep = [c for c in ("datetime", "datetime_int", *PROJECTED_COLUMNS[1:], "type", "symbol") if c in df.columns]
+            return df[keep]
         try:
             payload = {"type": stock_type, "start_date": start_date, "end_date": end_date}
             try:
@@ -430,6 +549,60 @@ class PostgresHandler:
             logger.error(f"按日期范围查询DF失败: {e}")
             return self._records_to_df([])
 
+    async def get_by_date_range_multi_df(
+        self,
+        symbols: Iterable[str],
+        start_date: str,
+        end_date: str,
+        stock_type: Union[int, Dict[str, int]] = 1,
+        projected: bool = False,
+        max_concurrency: Optional[int] = None,
+        long_format: bool = False,
+    ) -> Union[Dict[str, pd.DataFrame], pd.DataFrame]:
+        """
+        多股票按日期范围读取。服务端没有多股票批量接口，这里在同一个连接池上以有限并发
+        （max_concurrency，默认 PG_RANGE_CONCURRENCY=8）并行调用 get_by_date_range_df。
+
+        - stock_type 可为统一类型，或 {symbol: type} 映射（未列出的按 1）
+        - 单只股票失败时返回空表，不影响其他股票
+        - long_format=False 返回 {symbol: DataFrame}（顺序同输入，去重）；
+          True 返回按 (symbol, datetime) 排序的长表，含 symbol 列
+        """
+        symbol_list = list(dict.fromkeys(symbols))
+        await self.open()
+        sem = asyncio.Semaphore(max(1, max_concurrency or self.range_concurrency))
+
+        def _type_of(sym: str) -> int:
+            if isinstance(stock_type, dict):
+                return int(stock_type.get(sym, 1))
+            return int(stock_type)
+
+        async def _fetch(sym: str) -> pd.DataFrame:
+            async with sem:
+                try:
+                    return await self.get_by_date_range_df(sym, start_date, end_date, stock_type=_type_of(sym), projected=projected)
+                except Exception as e:
+                    logger.error(f"多股票查询失败: {sym}: {e}")
+                    return self._records_to_df([])
+
+        t0 = time.perf_counter()
+        frames = await asyncio.gather(*(_fetch(sym) for sym in symbol_list))
+        result = dict(zip(symbol_list, frames))
+        logger.info(f"多股票区间查询完成: {len(symbol_list)} 只, {sum(len(f) for f in frames)} 条, 耗时 {time.perf_counter() - t0:.2f}s")
+        if not long_format:
+            return result
+
+        parts = []
+        for sym, df in result.items():
+            if df is None or df.empty:
+                continue
+            if "symbol" not in df.columns:
+                df = df.assign(symbol=sym)
+            parts.append(df)
+        if not parts:
+            return self._records_to_df([])
+        return pd.concat(parts, ignore_index=True).sort_values(["symbol", "datetime"], kind="stable").reset_index(drop=True)
+
     async def get_all_df(self, symbol: str, stock_type: int = 1) -> pd.DataFrame:
         """
         获取PG中该股票所有记录并返回DataFrame（按datetime升序）。
@@ -485,7 +658,7 @@ class PostgresHandler:
             if time_step is not None and not df.empty and "datetime" in df.columns:
                 try:
                     df["datetime"] = df["datetime"] + pd.Timedelta(days=time_step)
-                    df["datetime_int"] = (df["datetime"].astype("int64") // 10**9).astype("Int64")
+                    df["datetime_int"] = ((df["datetime"] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).astype("Int64")
                 except Exception:
                     pass
 
@@ -502,13 +675,131 @@ class PostgresHandler:
         stock_type: int = 1,
         batch_size: int = 1000,
         requery: bool = True,
+        projected: bool = False,
     ) -> pd.DataFrame:
         """
         检查返回数据的最新日期是否覆盖指定区间，如果不覆盖则调用增量同步到PG，并可选重试读取。
 
         入参日期可为 "YYYY-MM-DD" 或 "YYYYMMDD"，内部自动规范。
+        启用本地行情缓存时优先读缓存，只向服务端请求缺失的头部/尾部区间。
+        projected=True 时只读取预测所需的 datetime/OHLCV/amount 列（按列接口，见 get_by_date_range_df），
+        本地缓存与完整记录分开存放。
         返回：指定区间的 DataFrame。
         """
+        if self.disk_cache.enabled:
+            try:
+                df_cached = await self._ensure_date_range_cached(symbol, start_date, end_date, stock_type, batch_size, requery, projected)
+                if df_cached is not None:
+                    return df_cached
+            except Exception as e:
+                logger.warning(f"本地行情缓存处理失败，回退到服务端查询: {e}")
+        return await self._ensure_date_range_remote(symbol, start_date, end_date, stock_type, batch_size, requery, projected)
+
+    async def _ensure_date_range_cached(
+        self,
+        symbol: str,
+        start_date: str,
+        end_date: str,
+        stock_type: int,
+        batch_size: int,
+        requery: bool,
+        projected: bool = False,
+    ) -> Optional[pd.DataFrame]:
+        """
+        基于本地列式缓存的 ensure_date_range_df：
+        - 缓存已确认覆盖 [start, end]：直接 mmap 读取切片，不发请求
+        - 尾部缺失：从缓存最后一个交易日开始请求（重叠一天用于校验），追加后回写
+        - 头部缺失：仅请求缺失的头部区间
+        - 重叠日收盘价不一致或缓存过期：整表重建
+        返回 None 表示无法使用缓存（调用方回退到服务端查询）。
+        """
+        cache = self.disk_cache
+        variant = "ohlcv" if projected else ""
+        start_dash = pd.Timestamp(start_date).strftime("%Y-%m-%d")
+        end_dash = pd.Timestamp(end_date).strftime("%Y-%m-%d")
+
+        header = cache.read_header(symbol, stock_type, variant)
+        if header is not None and cache.is_expired(header):
+            logger.info(f"本地行情缓存已过期，整表重建: {symbol} type={stock_type}")
+            header = None
+
+        if header is not None:
+            covers_start = start_dash >= min(header["first_date"], header.get("requested_start") or header["first_date"])
+            covers_end = end_dash <= (header.get("checked_through") or header["last_date"])
+            if covers_start and covers_end:
+                df = cache.load(symbol, stock_type, start_dash, end_dash, variant=variant)
+                if df is not None:
+                    logger.info(f"本地行情缓存命中: {symbol} {start_dash}~{end_dash} ({len(df)} 条)")
+                    return df
+
+        base = cache.load(symbol, stock_type, variant=variant) if header is not None else None
+        if base is None or base.empty:
+            df = await self._ensure_date_range_remote(symbol, start_dash, end_dash, stock_type, batch_size, requery, projected)
+            if df is None or df.empty or "datetime" not in df.columns:
+                return df
+            cache.save(symbol, stock_type, df, requested_start=start_dash, checked_through=self._checked_through(df, start_dash, end_dash), variant=variant)
+            return cache.load(symbol, stock_type, start_dash, end_dash, variant=variant)
+
+        parts = [base]
+        requested_start = min(start_dash, header.get("requested_start") or header["first_date"])
+        checked_through = header.get("checked_through") or header["last_date"]
+        last_date = header["last_date"]
+
+        # 头部缺失：只读取缺失部分（不触发同步，早于上市日的区间本就没有数据）
+        if start_dash < header["first_date"] and start_dash < (header.get("requested_start") or header["first_date"]):
+            head_end = (pd.Timestamp(header["first_date"]) - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+            df_head = await self.get_by_date_range_df(symbol, start_dash, head_end, stock_type=stock_type, projected=projected)
+            if df_head is not None and not df_head.empty:
+                parts.insert(0, df_head)
+
+        # 尾部缺失：从缓存最后一天开始请求，重叠的一天用于校验复权价格是否变化
+        if end_dash > checked_through:
+            df_tail = await self._ensure_date_range_remote(symbol, last_date, end_dash, stock_type, batch_size, requery, projected)
+            if df_tail is not None and not df_tail.empty and "datetime" in df_tail.columns:
+                tail_days = pd.to_datetime(df_tail["datetime"]).dt.normalize()
+                overlap = df_tail.loc[tail_days == pd.Timestamp(last_date), "close"]
+                cached_close = float(base["close"].iloc[-1])
+                if len(overlap) > 0 and not np.isclose(float(overlap.iloc[0]), cached_close, rtol=1e-6, atol=1e-9):
+                    logger.info(f"缓存最后交易日收盘价已变化（{cached_close} -> {float(overlap.iloc[0])}），整表重建: {symbol}")
+                    cache.invalidate(symbol, stock_type, variant)
+                    self._notify_data_changed(symbol, stock_type)
+                    df = await self._ensure_date_range_remote(symbol, start_dash, end_dash, stock_type, batch_size, requery, projected)
+                    if df is None or df.empty or "datetime" not in df.columns:
+                        return df
+                    cache.save(symbol, stock_type, df, requested_start=start_dash, checked_through=self._checked_through(df, start_dash, end_dash), variant=variant)
+                    return cache.load(symbol, stock_type, start_dash, end_dash, variant=variant)
+                parts.append(df_tail[tail_days > pd.Timestamp(last_date)])
+            merged = pd.concat(parts, ignore_index=True)
+            checked_through = max(checked_through, self._checked_through(merged, start_dash, end_dash))
+        else:
+            merged = pd.concat(parts, ignore_index=True) if len(parts) > 1 else base
+
+        cache.save(symbol, stock_type, merged, requested_start=requested_start, checked_through=checked_through, created_at=header.get("created_at"), variant=variant)
+        return cache.load(symbol, stock_type, start_dash, end_dash, variant=variant)
+
+    @staticmethod
+    def _checked_through(df: pd.DataFrame, start_dash: str, end_dash: str) -> str:
+        """数据最新日期已覆盖区间内最后一个交易日时，认为已确认到 end；否则只确认到数据最新日期"""
+        last_date = pd.Timestamp(df["datetime"].max()).strftime("%Y-%m-%d")
+        try:
+            trading_days = get_trading_days(start_dash.replace("-", ""), end_dash.replace("-", ""), need_=False)
+        except Exception:
+            trading_days = None
+        if trading_days and last_date >= pd.Timestamp(trading_days[-1]).strftime("%Y-%m-%d"):
+            return end_dash
+        return last_date
+
+    async def _ensure_date_range_remote(
+        self,
+        symbol: str,
+        start_date: str,
+        end_date: str,
+        stock_type: int = 1,
+        batch_size: int = 1000,
+        requery: bool = True,
+        projected: bool = False,
+    ) -> pd.DataFrame:
+        """ensure_date_range_df 的服务端实现（不经过本地缓存）"""
         try:
             # 规范化日期格式
             start_dash = pd.Timestamp(start_date).strftime("%Y-%m-%d")
@@ -517,13 +808,13 @@ class PostgresHandler:
             end_compact = pd.Timestamp(end_date).strftime("%Y%m%d")
 
             # 第一次尝试读取区间数据
-            df = await self.get_by_date_range_df(symbol, start_dash, end_dash, stock_type=stock_type)
+            df = await self.get_by_date_range_df(symbol, start_dash, end_dash, stock_type=stock_type, projected=projected)
             # 若为空或无 datetime 列，则直接同步并重读
             if df is None or df.empty or ("datetime" not in df.columns):
                 logger.info(f"区间数据为空或缺少datetime列，触发增量同步: {symbol} {start_compact}~{end_compact}")
                 await self.sync_stock(symbol, stock_type=stock_type, batch_size=batch_size)
                 if requery:
-                    return await self.get_by_date_range_df(symbol, start_dash, end_dash, stock_type=stock_type)
+                    return await self.get_by_date_range_df(symbol, start_dash, end_dash, stock_type=stock_type, projected=projected)
                 return self._records_to_df([])
 
             print(f"df shape: {df.shape}")
@@ -550,6 +841,9 @@ class PostgresHandler:
                     latest_date = latest_dt_ts.date()
 
             if latest_date is None or latest_date < target_end_date:
+                if self._sync_recently_attempted(symbol, stock_type, target_end_date):
+                    logger.info(f"最近已同步过 {symbol} 至 {target_end_date} 仍未覆盖（停牌或数据源未更新），跳过本次同步")
+                    return df
                 if latest_date is None:
                     incr_start_compact = start_compact
                 else:
@@ -560,9 +854,13 @@ class PostgresHandler:
                     incr_start_compact = given_start_compact
 
                 logger.info(f"最新日期 {latest_date if latest_date is not None else 'NaT'} 未覆盖到 {target_end_date}，增量同步: {symbol} {incr_start_compact}~{end_compact}")
-                await self.sync_stock(symbol, stock_type=stock_type, batch_size=batch_size)
+                # 区间覆盖到 sync_stock 的结束日期（昨天）时，区间内的最新日期就是PG最新日期，无需再查 get_latest；
+                # 否则PG可能有区间之后的数据（批量接口不去重），仍由 sync_stock 自行查询
+                yesterday_date = (datetime.now(timezone.utc) - timedelta(days=1)).date()
+                known_latest = latest_date if pd.Timestamp(end_dash).date() >= yesterday_date else None
+                await self.sync_stock(symbol, stock_type=stock_type, batch_size=batch_size, latest_date=known_latest)
                 if requery:
-                    return await self.get_by_date_range_df(symbol, start_dash, end_dash, stock_type=stock_type)
+                    return await self.get_by_date_range_df(symbol, start_dash, end_dash, stock_type=stock_type, projected=projected)
 
             return df
         except Exception as e:
@@ -598,10 +896,13 @@ class PostgresHandler:
             except Exception:
                 return None
 
-    async def sync_stock(self, symbol: str, stock_type: int = 1, batch_size: int = 1000) -> Dict:
+    async def sync_stock(self, symbol: str, stock_type: int = 1, batch_size: int = 1000, latest_date=None) -> Dict:
         """
         增量同步该股票：读取PG最新日期 -> 使用SCF获取从下一交易日到end_date的数据 -> 转换 -> 批量写入PG
         返回执行统计信息
+
+        latest_date: 调用方已知的PG最新日期（如 ensure_date_range_df 刚读到的区间数据），传入时不再请求 get_latest；
+        服务可用性按熔断状态判断，最近有成功请求时不再单独探测 /health。
         """
         result = {
             "symbol": symbol,
@@ -613,19 +914,21 @@ class PostgresHandler:
             "error": None,
         }
 
-        if not await self.health_check():
+        if not await self._api_available():
             result["error"] = "API服务不可用"
             return result
 
         # 计算增量开始日期
         start_date = "20100101"
-        latest = await self.get_latest(symbol, stock_type=stock_type, limit=1)
-        if latest and latest.get("datetime"):
-            latest_dt = self._parse_iso_datetime(latest["datetime"])  # 已存储的最新日期
-            if latest_dt:
-                start_dt = latest_dt + timedelta(days=1)
-                start_date = self._to_yyyymmdd(start_dt)
-                logger.info(f"最新PG日期: {latest_dt}, 增量开始: {start_date}")
+        if latest_date is not None:
+            latest_dt = pd.Timestamp(latest_date).to_pydatetime()
+        else:
+            latest = await self.get_latest(symbol, stock_type=stock_type, limit=1)
+            latest_dt = self._parse_iso_datetime(latest["datetime"]) if latest and latest.get("datetime") else None  # 已存储的最新日期
+        if latest_dt:
+            start_dt = latest_dt + timedelta(days=1)
+            start_date = self._to_yyyymmdd(start_dt)
+            logger.info(f"最新PG日期: {latest_dt}, 增量开始: {start_date}")
 
 
         # 结束日期默认取昨天（统一使用UTC，避免时区比较问题）
@@ -677,12 +980,40 @@ class PostgresHandler:
                     "batches": batches,
                     "success": stored > 0,
                 })
+                if stored > 0:
+                    self._notify_data_changed(symbol, stock_type)
                 return result
             except Exception as e:
                 logger.error(f"同步失败: {e}")
                 result["error"] = str(e)
                 return result
 
+        # 已是最新，无需同步
+        result["success"] = True
+        return result
+
+    def add_sync_listener(self, listener: Callable[[str, int], None]) -> None:
+        """注册行情数据变化回调 listener(symbol, stock_type)"""
+        if listener not in self._sync_listeners:
+            self._sync_listeners.append(listener)
+
+    def _notify_data_changed(self, symbol: str, stock_type: int) -> None:
+        for listener in self._sync_listeners:
+            try:
+                listener(symbol, stock_type)
+            except Exception as e:
+                logger.warning(f"数据变化回调失败: {symbol} type={stock_type}: {e}")
+
+    def _sync_recently_attempted(self, symbol: str, stock_type: int, target_end) -> bool:
+        """同一 (symbol, type, 目标日期) 在 sync_retry_seconds 内已同步过则返回 True，否则记录本次尝试"""
+        key = (symbol, int(stock_type), str(target_end))
+        now = time.monotonic()
+        last = self._sync_attempts.get(key)
+        if last is not None and now - last < self.sync_retry_seconds:
+            return True
+        self._sync_attempts[key] = now
+        return False
+
 class SyncDataHanlder:
     def __init__(self, base_url: str = "http://8.163.5.7:8000", api_token: str = "fintrack-dev-token"):
        pass
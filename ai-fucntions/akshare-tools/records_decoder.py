@@ -0,0 +1,176 @@
+"""
+stock-data 接口返回记录的快速解码
+
+PostgresHandler._records_to_df 原实现：DataFrame.from_records -> pd.to_datetime(utc=True) -> tz_localize
+-> 逐列 pd.to_numeric -> sort_values，多年日线数据时是数据通路上的主要 CPU 开销。这里：
+
+- JSON 解析优先使用 orjson（未安装时回退标准库 json）
+- 按列一次性转换为 NumPy 数组：日期解析为 datetime64[s]（RFC3339 的 'Z' 结尾直接截断解析，
+  其他时区格式回退到 pandas），数值列 float64/int64（PG_RECORDS_FLOAT_DTYPE=float32 时浮点列使用 float32）
+- 服务端已按日期升序返回时跳过排序
+
+输出列与原实现一致：datetime、datetime_int（秒级）、open/close/high/low/volume/amount 等；
+返回空列表时输出相同的空表结构。
+
+columns_to_df 解码 /stock-data/{symbol}/range/columns 的按列响应（datetime 为 Unix 秒），
+只包含 PROJECTED_COLUMNS，symbol/type 由调用方补齐。
+"""
+
+import os
+import json
+from operator import itemgetter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+    def loads(data):
+        return json.loads(data)
+
+
+EMPTY_COLUMNS = [
+    "datetime",
+    "datetime_int",
+    "open",
+    "close",
+    "high",
+    "low",
+    "volume",
+    "amount",
+    "amplitude",
+    "percentage_change",
+    "amount_change",
+    "turnover_rate",
+    "type",
+    "symbol",
+    "created_at",
+    "updated_at",
+]
+
+FLOAT_COLUMNS = (
+    "open",
+    "close",
+    "high",
+    "low",
+    "amount",
+    "amplitude",
+    "percentage_change",
+    "amount_change",
+    "turnover_rate",
+)
+INT_COLUMNS = ("volume",)
+# 按列接口返回的列（预测只需要这些）
+PROJECTED_COLUMNS = ("datetime", "open", "high", "low", "close", "volume", "amount")
+
+
+def _float_dtype():
+    return np.float32 if os.environ.get("PG_RECORDS_FLOAT_DTYPE", "float64").strip().lower() == "float32" else np.float64
+
+
+def parse_datetimes(values: List[Any]) -> np.ndarray:
+    """
+    日期字符串列表 -> datetime64[s]（UTC，无时区）。
+    常见格式 'YYYY-MM-DDTHH:MM:SSZ' 走 NumPy 快速路径（截断为定长 U19 后整体解析）；
+    其余（含 +08:00 等偏移、缺失值）回退到 pandas。
+    """
+    try:
+        arr = np.array(values, dtype="U25")
+        lengths = np.char.str_len(arr)
+        if ((lengths == 20) & np.char.endswith(arr, "Z")).all():
+            return arr.astype("U19").astype("datetime64[s]")
+        if ((lengths == 10) | (lengths == 19)).all():
+            return arr.astype("datetime64[s]")
+    except (TypeError, ValueError):
+        pass
+    dt = pd.to_datetime(pd.Series(values), errors="coerce", utc=True).dt.tz_localize(None)
+    return dt.to_numpy().astype("datetime64[s]")
+
+
+def _to_float(values: List[Any], dtype) -> np.ndarray:
+    try:
+        return np.array(values, dtype=dtype)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=dtype)
+
+
+def _to_int(values: List[Any]):
+    try:
+        return np.array(values, dtype=np.int64)
+    except (TypeError, ValueError, OverflowError):
+        # 含缺失值或非数字时退回可空整数
+        return pd.to_numeric(pd.Series(values), errors="coerce").astype("Int64").array
+
+
+def records_to_df(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """将 stock-data 接口返回的记录列表按列解码为 DataFrame（按 datetime 升序）"""
+    if not records:
+        return pd.DataFrame(columns=EMPTY_COLUMNS)
+
+    keys = list(records[0].keys())
+    float_dtype = _float_dtype()
+    columns: Dict[str, Any] = {}
+    for k in keys:
+        try:
+            values = list(map(itemgetter(k), records))
+        except KeyError:
+            values = [r.get(k) for r in records]
+        if k == "datetime":
+            columns[k] = parse_datetimes(values)
+        elif k in FLOAT_COLUMNS:
+            columns[k] = _to_float(values, float_dtype)
+        elif k in INT_COLUMNS:
+            columns[k] = _to_int(values)
+        else:
+            columns[k] = values
+
+    order: Optional[np.ndarray] = None
+    if "datetime" in columns:
+        dt = columns["datetime"]
+        secs = dt.astype(np.int64)
+        valid = ~np.isnat(dt)
+        if valid.all():
+            columns["datetime_int"] = secs.copy()
+        else:
+            columns["datetime_int"] = pd.array(np.where(valid, secs, 0), dtype="Int64")
+            columns["datetime_int"][~valid] = pd.NA
+        # 服务端一般已按日期升序返回，此时跳过排序
+        if len(secs) > 1 and not (np.diff(secs) >= 0).all():
+            order = np.argsort(dt, kind="stable")
+
+    df = pd.DataFrame(columns)
+    if order is not None:
+        df = df.iloc[order]
+    return df
+
+
+def columns_to_df(data: Dict[str, Any], symbol: str, stock_type: int) -> pd.DataFrame:
+    """
+    按列响应 {"datetime": [秒], "open": [...], ...} -> DataFrame，列与 records_to_df 的投影子集一致：
+    datetime(datetime64[s])、datetime_int、open/high/low/close/volume/amount、type、symbol。
+    """
+    secs = np.asarray(data.get("datetime") or [], dtype=np.int64)
+    n = len(secs)
+    float_dtype = _float_dtype()
+    columns: Dict[str, Any] = {
+        "datetime": secs.astype("datetime64[s]"),
+        "datetime_int": secs,
+    }
+    for k in PROJECTED_COLUMNS[1:]:
+        values = data.get(k)
+        if values is None or len(values) != n:
+            raise ValueError(f"按列响应缺少列或长度不一致: {k}")
+        columns[k] = _to_int(values) if k in INT_COLUMNS else _to_float(values, float_dtype)
+    columns["type"] = np.full(n, int(stock_type), dtype=np.int64)
+    columns["symbol"] = np.full(n, symbol, dtype=object)
+    df = pd.DataFrame(columns)
+    if n > 1 and not (np.diff(secs) >= 0).all():
+        df = df.iloc[np.argsort(secs, kind="stable")].reset_index(drop=True)
+    return df
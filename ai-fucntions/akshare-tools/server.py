@@ -3,16 +3,20 @@ FastAPI服务器 - 提供股票数据同步接口
 
 接口:
 - POST /api/sync-stock - 同步股票数据到PostgreSQL
+- POST /api/sync-stocks - 多股票/全市场并发同步（后台任务，返回 job_id）
+- GET  /api/sync-stocks/{job_id} - 查询多股票同步进度
 """
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 import asyncio
 import logging
+import uuid
 
 from postgres import PostgresHandler
+from sync_orchestrator import SyncOrchestrator
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -50,6 +54,20 @@ class SyncStockResponse(BaseModel):
     error: Optional[str] = None
 
 
+class SyncStocksRequest(BaseModel):
+    symbols: List[str] = []
+    stock_type: int = 1
+    all_market: bool = False  # True 时忽略 symbols，同步该类型全市场
+    end_date: Optional[str] = None  # YYYYMMDD，默认昨天
+    batch_size: int = 1000
+    fetch_workers: Optional[int] = None
+    insert_workers: Optional[int] = None
+
+
+# 多股票同步任务：job_id -> {"orchestrator", "task"}
+sync_jobs: Dict[str, Dict] = {}
+
+
 @app.get("/health")
 async def health_check():
     """健康检查"""
@@ -98,6 +116,56 @@ async def sync_stock(request: SyncStockRequest):
         raise HTTPException(status_code=500, detail=f"同步失败: {str(e)}")
 
 
+async def _run_sync_job(orchestrator: SyncOrchestrator, request: SyncStocksRequest):
+    async with PostgresHandler(base_url=PG_BASE_URL, api_token=PG_API_TOKEN) as handler:
+        orchestrator.handler = handler
+        return await orchestrator.run(
+            symbols=request.symbols,
+            stock_type=request.stock_type,
+            all_market=request.all_market,
+            end_date=request.end_date,
+        )
+
+
+@app.post("/api/sync-stocks")
+async def sync_stocks(request: SyncStocksRequest):
+    """
+    多股票（或全市场）并发同步，后台执行；通过 GET /api/sync-stocks/{job_id} 查询进度
+    """
+    if not request.all_market and not request.symbols:
+        raise HTTPException(status_code=400, detail="symbols 为空且未指定 all_market")
+    orchestrator = SyncOrchestrator(
+        handler=None,
+        fetch_workers=request.fetch_workers,
+        insert_workers=request.insert_workers,
+        batch_size=request.batch_size,
+    )
+    job_id = uuid.uuid4().hex[:12]
+    task = asyncio.create_task(_run_sync_job(orchestrator, request))
+    sync_jobs[job_id] = {"orchestrator": orchestrator, "task": task}
+    logger.info(f"多股票同步任务已启动: job_id={job_id}, symbols={len(request.symbols)}, all_market={request.all_market}")
+    return {"job_id": job_id, "status": "running"}
+
+
+@app.get("/api/sync-stocks/{job_id}")
+async def sync_stocks_status(job_id: str, details: bool = False):
+    job = sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    orchestrator: SyncOrchestrator = job["orchestrator"]
+    task: asyncio.Task = job["task"]
+    status = "running"
+    error = None
+    if task.done():
+        exc = task.exception()
+        status = "failed" if exc else "finished"
+        error = str(exc) if exc else None
+    resp = {"job_id": job_id, "status": status, "error": error, "summary": orchestrator.summary()}
+    if details:
+        resp["symbols"] = [p.to_dict() for p in orchestrator.progress.values()]
+    return resp
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001, log_level="info")
@@ -7,6 +7,7 @@
 依赖：
 - akshare
 - requests
+- httpx（批量上传，见 payload_upload.py）
 
 环境变量：
 - GO_API_URL (默认 http://localhost:8080)
@@ -20,12 +21,13 @@ python sync_index.py --sync-daily --codes 000001 --start-date 2025-11-01 --end-d
 import os
 import sys
 import json
-import time
 from typing import List, Optional
 
 import requests
 import akshare as ak
 
+from payload_upload import build_records, float_list, int_list, str_list, upload_batches
+
 
 GO_API_URL = os.environ.get("GO_API_URL", "http://go-api.meetlife.com.cn:8000")
 API_TOKEN = os.environ.get("API_TOKEN", "fintrack-dev-token")
@@ -79,10 +81,10 @@ def normalize_date_str(s: str) -> Optional[str]:
 def upsert_index_info_by_codes(codes: List[str] = None) -> int:
     """将指定 codes 的指数基础信息写入 Go API"""
     df = ak.index_stock_info()
-    print(df.shape(0))
     if df is None or df.empty:
         print("index_stock_info: empty")
         return 0
+    print(f"index_stock_info: {df.shape[0]}")
     # 兼容列名
     cols = set(df.columns)
     # 常见列名：index_code / code, display_name, publish_date
@@ -102,13 +104,11 @@ def upsert_index_info_by_codes(codes: List[str] = None) -> int:
         print("Filtered index info empty for given codes")
         return 0
 
-    payload = []
-    for _, row in df.iterrows():
-        payload.append({
-            "code": str(row[code_col]),
-            "display_name": str(row[name_col]),
-            "publish_date": row[date_col],
-        })
+    payload = build_records({
+        "code": df[code_col].astype(str).tolist(),
+        "display_name": df[name_col].astype(str).tolist(),
+        "publish_date": _date_list(df[date_col]),
+    })
     # 批量写入
     res = _post("/api/v1/index/info/batch", payload)
     affected = int(res.get("data", {}).get("affected", 0)) if isinstance(res, dict) else 0
@@ -116,6 +116,12 @@ def upsert_index_info_by_codes(codes: List[str] = None) -> int:
     return affected
 
 
+def _date_list(col) -> List[Optional[str]]:
+    """已规范化的日期列 -> 列表，缺失为 None"""
+    col = col.astype(object)
+    return col.where(col.notna(), None).tolist()
+
+
 def _to_exchange_prefixed(code: str) -> Optional[str]:
     """将 000001 -> sh000001, 399001 -> sz399001 等"""
     code = str(code)
@@ -173,29 +179,23 @@ def upsert_index_daily(code: str, start_date: Optional[str] = None, end_date: Op
     if not all([date_col, open_col, close_col, high_col, low_col, vol_col, amt_col]):
         raise RuntimeError(f"Unexpected columns in index daily: {df.columns.tolist()}")
 
-    rows = []
-    for _, row in df.iterrows():
-        payload = {
-            "code": str(code),
-            "trading_date": row[date_col],
-            "open": float(row[open_col]) if row[open_col] is not None else None,
-            "close": float(row[close_col]) if row[close_col] is not None else None,
-            "high": float(row[high_col]) if row[high_col] is not None else None,
-            "low": float(row[low_col]) if row[low_col] is not None else None,
-            "volume": int(float(row[vol_col])) if row[vol_col] is not None else None,
-            "amount": float(row[amt_col]) if row[amt_col] is not None else None,
-            "change_percent": float(row[pct_col]) if pct_col and row[pct_col] is not None else None,
-        }
-        rows.append(payload)
-
-    affected = 0
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i:i+batch_size]
-        res = _post("/api/v1/index/daily/batch", batch)
-        n = int(res.get("data", {}).get("affected", 0)) if isinstance(res, dict) else 0
-        affected += n
-        time.sleep(0.2)
-    print(f"Index daily upsert for code={code} affected={affected}")
+    # 按列转换；缺失/非有限值为 None（null）
+    n = len(df)
+    rows = build_records({
+        "code": [str(code)] * n,
+        "trading_date": _date_list(df[date_col]),
+        "open": float_list(df[open_col]),
+        "close": float_list(df[close_col]),
+        "high": float_list(df[high_col]),
+        "low": float_list(df[low_col]),
+        "volume": int_list(df[vol_col]),
+        "amount": float_list(df[amt_col]),
+        "change_percent": float_list(df[pct_col]) if pct_col else [None] * n,
+    })
+
+    res = upload_batches(GO_API_URL, "/api/v1/index/daily/batch", rows, API_TOKEN, batch_size=batch_size)
+    affected = res["affected"]
+    print(f"Index daily upsert for code={code} affected={affected} ({res['batches']} batches, {res['elapsed']}s)")
     return affected
 
 
@@ -241,76 +241,26 @@ def upsert_a_stock_comment_daily(codes: List[str] = None, batch_size: int = 500)
         print("Filtered A股评论数据为空")
         return 0
 
-    rows = []
-    for _, row in df.iterrows():
-        code_val = row[code_col]
-        date_val = row[date_col]
-        code_str = str(code_val) if code_val is not None else ""
-        date_str = normalize_date_str(date_val) if date_val is not None else ""
-        if not code_str or not date_str:
-            continue
-        item = {"code": code_str, "trading_date": date_str}
-        name_val = row[name_col]
-        if name_val is not None:
-            nv = str(name_val).strip()
-            if nv:
-                item["name"] = nv
-        import math
-        def _f(x):
-            try:
-                v = float(x)
-                if not math.isfinite(v):
-                    return None
-                return v
-            except Exception:
-                return None
-        def _i(x):
-            try:
-                v = float(x)
-                if not math.isfinite(v):
-                    return None
-                return int(v)
-            except Exception:
-                return None
-        lp = _f(row[lp_col])
-        if lp is not None:
-            item["latest_price"] = lp
-        cp = _f(row[cp_col])
-        if cp is not None:
-            item["change_percent"] = cp
-        tr = _f(row[tr_col])
-        if tr is not None:
-            item["turnover_rate"] = tr
-        pe = _f(row[pe_col])
-        if pe is not None:
-            item["pe_ratio"] = pe
-        mc = _f(row[mc_col])
-        if mc is not None:
-            item["main_cost"] = mc
-        ip = _f(row[ip_col])
-        if ip is not None:
-            item["institution_participation"] = ip
-        cs = _f(row[cs_col])
-        if cs is not None:
-            item["composite_score"] = cs
-        rise = _i(row[rise_col])
-        if rise is not None:
-            item["rise"] = rise
-        rank = _i(row[rank_col])
-        if rank is not None:
-            item["current_rank"] = rank
-        ai = _f(row[ai_col])
-        if ai is not None:
-            item["attention_index"] = ai
-        rows.append(item)
-
-    affected = 0
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i:i+batch_size]
-        res = _post("/api/v1/stock/comment/daily/batch", batch)
-        n = int(res.get("data", {}).get("affected", 0)) if isinstance(res, dict) else 0
-        affected += n
-        time.sleep(0.2)
+    # 按列转换；无效数值（缺失、无法解析、非有限）不上送该字段，代码或日期为空的行跳过
+    names = [v or None for v in str_list(df[name_col])]
+    rows = build_records({
+        "code": str_list(df[code_col], missing="", strip=False),
+        "trading_date": [d or "" for d in _date_list(df[date_col])],
+        "name": names,
+        "latest_price": float_list(df[lp_col]),
+        "change_percent": float_list(df[cp_col]),
+        "turnover_rate": float_list(df[tr_col]),
+        "pe_ratio": float_list(df[pe_col]),
+        "main_cost": float_list(df[mc_col]),
+        "institution_participation": float_list(df[ip_col]),
+        "composite_score": float_list(df[cs_col]),
+        "rise": int_list(df[rise_col]),
+        "current_rank": int_list(df[rank_col]),
+        "attention_index": float_list(df[ai_col]),
+    }, drop_none=True, required=("code", "trading_date"))
+
+    res = upload_batches(GO_API_URL, "/api/v1/stock/comment/daily/batch", rows, API_TOKEN, batch_size=batch_size)
+    affected = res["affected"]
     print(f"A股每日评论数据批量写入 affected={affected}")
     return affected
 
@@ -0,0 +1,339 @@
+"""
+多股票并发同步：在 PostgresHandler.sync_stock（单股票、逐批写入）之上做跨股票流水线。
+
+流程（每只股票）：
+1) 读取PG最新日期（get_latest），计算增量区间 [最新日期+1, 目标交易日]；已覆盖则跳过
+2) 拉取上游数据（SyncDataHanlder.get_stock_data_from_local，阻塞调用放入 asyncio.to_thread）
+3) 转换为PG列结构（convert_dataframe_to_api_format，同样放入线程）
+4) 按批次写入PG
+
+并发：
+- 拉取+转换由 fetch_workers 个协程并行（SYNC_FETCH_WORKERS，默认 8），上游限流时调小
+- 写入由 insert_workers 个协程并行（SYNC_INSERT_WORKERS，默认 4），与拉取通过有界队列衔接；
+  同一股票的批次按日期顺序写入，因此中断后PG最新日期即是续传起点
+- 目标交易日只计算一次（进程内交易日历）
+
+进度：每只股票的状态、区间、写入条数保存在 progress_path（SYNC_PROGRESS_PATH，
+默认 ai-fucntions/stock-data-cache/sync_progress.json）。重跑同一目标日期时跳过已完成的股票，
+未完成的股票从PG最新日期继续。
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+
+from postgres import PostgresHandler, SyncDataHanlder
+from get_finanial_data import convert_dataframe_to_api_format
+from trading_calendar import get_calendar
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ai_functions_dir = os.path.dirname(current_dir)
+
+_QUEUE_DONE = object()
+
+
+@dataclass
+class SymbolProgress:
+    symbol: str
+    stock_type: int
+    status: str = "pending"  # pending / fetching / storing / done / up_to_date / failed
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    fetched_records: int = 0
+    stored_records: int = 0
+    batches: int = 0
+    stored_through: Optional[str] = None
+    error: Optional[str] = None
+    updated_at: Optional[str] = None
+    elapsed: float = 0.0
+    _t0: float = field(default=0.0, repr=False)
+
+    def to_dict(self) -> Dict:
+        d = asdict(self)
+        d.pop("_t0", None)
+        return d
+
+
+def _market_symbol(code: str) -> str:
+    """A股代码 -> 带交易所前缀的代码（与 stock_zh_a_daily 一致）"""
+    s = str(code).strip().lower()
+    if s[:2] in ("sh", "sz", "bj"):
+        return s
+    if s.startswith(("6", "9", "5")):
+        return f"sh{s}"
+    if s.startswith(("4", "8")):
+        return f"bj{s}"
+    return f"sz{s}"
+
+
+def list_market_symbols(stock_type: int = 1) -> List[str]:
+    """全市场代码列表：1=A股（stock_zh_a_spot_em），2=ETF（fund_etf_category_sina）"""
+    if stock_type == 1:
+        from get_finanial_data import get_stock_list
+
+        df = get_stock_list()
+        if df is None or df.empty:
+            return []
+        return [_market_symbol(c) for c in df["代码"].astype(str)]
+    if stock_type == 2:
+        from get_etf_list import fetch_etf_df
+
+        df = fetch_etf_df()
+        if df is None or df.empty:
+            return []
+        return [str(c).strip().lower() for c in df["代码"]]
+    raise ValueError(f"不支持全市场同步的股票类型: {stock_type}")
+
+
+class SyncOrchestrator:
+    def __init__(
+        self,
+        handler: PostgresHandler,
+        fetch_workers: Optional[int] = None,
+        insert_workers: Optional[int] = None,
+        batch_size: int = 1000,
+        progress_path: Optional[str] = None,
+    ):
+        self.handler = handler
+        self.fetch_workers = max(1, fetch_workers or int(os.environ.get("SYNC_FETCH_WORKERS", "8")))
+        self.insert_workers = max(1, insert_workers or int(os.environ.get("SYNC_INSERT_WORKERS", "4")))
+        self.batch_size = max(1, int(batch_size))
+        self.progress_path = progress_path or os.environ.get(
+            "SYNC_PROGRESS_PATH", os.path.join(ai_functions_dir, "stock-data-cache", "sync_progress.json")
+        )
+        self.progress: Dict[str, SymbolProgress] = {}
+        self.target_end: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._upstream = SyncDataHanlder()
+        self._save_lock = asyncio.Lock()
+        self._last_save = 0.0
+        self.save_interval = float(os.environ.get("SYNC_PROGRESS_SAVE_INTERVAL", "2"))
+
+    # --------------------------- 进度 ---------------------------
+    def _load_progress(self) -> Dict[str, Dict]:
+        if not self.progress_path or not os.path.exists(self.progress_path):
+            return {}
+        try:
+            with open(self.progress_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("target_end") != self.target_end:
+                return {}
+            return data.get("symbols", {})
+        except Exception as e:
+            logger.warning(f"读取同步进度失败，忽略: {e}")
+            return {}
+
+    async def _save_progress(self, force: bool = False) -> None:
+        """写入进度文件；非 force 时至多每 save_interval 秒写一次（全市场同步时避免逐股票重写）"""
+        if not self.progress_path:
+            return
+        if not force and time.monotonic() - self._last_save < self.save_interval:
+            return
+        async with self._save_lock:
+            self._last_save = time.monotonic()
+            try:
+                os.makedirs(os.path.dirname(self.progress_path), exist_ok=True)
+                tmp_path = f"{self.progress_path}.tmp-{os.getpid()}"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"target_end": self.target_end, "symbols": {k: p.to_dict() for k, p in self.progress.items()}}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.progress_path)
+            except Exception as e:
+                logger.warning(f"写入同步进度失败: {e}")
+
+    def _update(self, p: SymbolProgress, **kwargs) -> None:
+        for k, v in kwargs.items():
+            setattr(p, k, v)
+        p.updated_at = datetime.now().isoformat(timespec="seconds")
+        if p._t0:
+            p.elapsed = round(time.perf_counter() - p._t0, 3)
+
+    def summary(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for p in self.progress.values():
+            counts[p.status] = counts.get(p.status, 0) + 1
+        end = self.finished_at or time.perf_counter()
+        return {
+            "target_end": self.target_end,
+            "total": len(self.progress),
+            "status_counts": counts,
+            "fetched_records": sum(p.fetched_records for p in self.progress.values()),
+            "stored_records": sum(p.stored_records for p in self.progress.values()),
+            "elapsed": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "finished": self.finished_at is not None,
+        }
+
+    # --------------------------- 流水线 ---------------------------
+    @staticmethod
+    def _resolve_target_end(end_date: Optional[str]) -> Optional[str]:
+        """目标交易日：end_date（默认昨天，UTC）及之前的最后一个交易日，YYYYMMDD"""
+        end = pd.Timestamp(end_date) if end_date else pd.Timestamp((datetime.now(timezone.utc) - timedelta(days=1)).date())
+        try:
+            sessions = get_calendar().previous_sessions(end, 1, include=True)
+            return pd.Timestamp(sessions[-1]).strftime("%Y%m%d")
+        except Exception as e:
+            logger.warning(f"交易日历查询失败，使用自然日作为目标日期: {e}")
+            return end.strftime("%Y%m%d")
+
+    async def _latest_date(self, symbol: str, stock_type: int) -> Optional[pd.Timestamp]:
+        latest = await self.handler.get_latest(symbol, stock_type=stock_type, limit=1)
+        if latest and latest.get("datetime"):
+            dt = self.handler._parse_iso_datetime(latest["datetime"])
+            if dt is not None:
+                ts = pd.Timestamp(dt)
+                return ts.tz_localize(None) if ts.tzinfo else ts
+        return None
+
+    async def _fetch_one(self, p: SymbolProgress, default_start: str, queue: asyncio.Queue) -> None:
+        p._t0 = time.perf_counter()
+        self._update(p, status="fetching", error=None)
+        latest = await self._latest_date(p.symbol, p.stock_type)
+        start = (latest + pd.Timedelta(days=1)).strftime("%Y%m%d") if latest is not None else default_start
+        if latest is not None:
+            p.stored_through = latest.strftime("%Y%m%d")
+        if start > self.target_end:
+            self._update(p, status="up_to_date", start_date=start, end_date=self.target_end)
+            return
+        self._update(p, start_date=start, end_date=self.target_end)
+        df = await asyncio.to_thread(self._upstream.get_stock_data_from_local, p.symbol, p.stock_type, start, self.target_end)
+        if not isinstance(df, pd.DataFrame) or df.empty:
+            self._update(p, status="failed", error="上游未返回数据")
+            return
+        records = await asyncio.to_thread(convert_dataframe_to_api_format, df, p.symbol, p.stock_type)
+        if not records:
+            self._update(p, status="failed", fetched_records=len(df), error="数据转换失败或为空")
+            return
+        self._update(p, status="storing", fetched_records=len(df))
+        await queue.put((p, records))
+
+    async def _insert_one(self, p: SymbolProgress, records: List[Dict]) -> None:
+        for i in range(0, len(records), self.batch_size):
+            batch = records[i:i + self.batch_size]
+            try:
+                await self.handler.batch_insert(batch)
+            except Exception as e:
+                # 同一股票后续批次依赖日期连续，失败即停止该股票，下次从PG最新日期续传
+                self._update(p, status="failed", error=f"第 {p.batches + 1} 批写入失败: {e}")
+                return
+            last_dt = str(batch[-1].get("datetime", ""))[:10].replace("-", "")
+            self._update(p, stored_records=p.stored_records + len(batch), batches=p.batches + 1, stored_through=last_dt or p.stored_through)
+        self._update(p, status="done")
+
+    async def run(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        stock_type: Union[int, Dict[str, int]] = 1,
+        all_market: bool = False,
+        end_date: Optional[str] = None,
+        default_start: str = "20100101",
+    ) -> Dict:
+        """
+        同步 symbols（或 all_market=True 时的全市场列表）。stock_type 可为统一类型或 {symbol: type}。
+        返回 summary()，逐股票明细见 self.progress。
+        """
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        if all_market:
+            if isinstance(stock_type, dict):
+                raise ValueError("全市场同步需要统一的 stock_type")
+            symbol_list = await asyncio.to_thread(list_market_symbols, stock_type)
+        else:
+            symbol_list = list(dict.fromkeys(symbols or []))
+
+        self.target_end = self._resolve_target_end(end_date)
+        previous = self._load_progress()
+        self.progress = {}
+        for sym in symbol_list:
+            t = int(stock_type.get(sym, 1)) if isinstance(stock_type, dict) else int(stock_type)
+            p = SymbolProgress(symbol=sym, stock_type=t)
+            prev = previous.get(sym)
+            if prev and prev.get("status") in ("done", "up_to_date") and int(prev.get("stock_type", t)) == t:
+                p = SymbolProgress(**{k: v for k, v in prev.items() if k in SymbolProgress.__dataclass_fields__ and k != "_t0"})
+            self.progress[sym] = p
+        pending = [p for p in self.progress.values() if p.status not in ("done", "up_to_date")]
+        logger.info(f"开始多股票同步: 共 {len(symbol_list)} 只，待同步 {len(pending)} 只，目标日期 {self.target_end}")
+
+        if not await self.handler._api_available():
+            for p in pending:
+                self._update(p, status="failed", error="API服务不可用")
+            self.finished_at = time.perf_counter()
+            return self.summary()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.insert_workers * 2)
+        todo: asyncio.Queue = asyncio.Queue()
+        for p in pending:
+            todo.put_nowait(p)
+
+        async def fetcher():
+            while True:
+                try:
+                    p = todo.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self._fetch_one(p, default_start, queue)
+                except Exception as e:
+                    logger.error(f"同步 {p.symbol} 失败: {e}")
+                    self._update(p, status="failed", error=str(e))
+                if p.status in ("up_to_date", "failed"):
+                    await self._save_progress()
+
+        async def inserter():
+            while True:
+                item = await queue.get()
+                if item is _QUEUE_DONE:
+                    return
+                p, records = item
+                try:
+                    await self._insert_one(p, records)
+                except Exception as e:
+                    self._update(p, status="failed", error=str(e))
+                await self._save_progress()
+
+        inserters = [asyncio.create_task(inserter()) for _ in range(self.insert_workers)]
+        try:
+            await asyncio.gather(*(fetcher() for _ in range(self.fetch_workers)))
+        finally:
+            for _ in inserters:
+                await queue.put(_QUEUE_DONE)
+            await asyncio.gather(*inserters, return_exceptions=True)
+            self.finished_at = time.perf_counter()
+            await self._save_progress(force=True)
+
+        summary = self.summary()
+        logger.info(f"多股票同步完成: {summary}")
+        return summary
+
+
+async def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="多股票并发同步到PG")
+    parser.add_argument("--symbols", type=str, default="", help="逗号分隔，如 sh600000,sz000001")
+    parser.add_argument("--stock-type", type=int, default=1)
+    parser.add_argument("--all-market", action="store_true")
+    parser.add_argument("--end-date", type=str, default=None)
+    parser.add_argument("--fetch-workers", type=int, default=None)
+    parser.add_argument("--insert-workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    base_url = os.getenv("POSTGRES_URL", "http://localhost:58004")
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    async with PostgresHandler(base_url=base_url) as handler:
+        orchestrator = SyncOrchestrator(handler, args.fetch_workers, args.insert_workers, args.batch_size)
+        summary = await orchestrator.run(symbols, stock_type=args.stock_type, all_market=args.all_market, end_date=args.end_date)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,168 @@
+"""
+df_preprocess 结果的进程内 LRU 缓存
+
+同一服务进程中，predict_chunked_mode_for_best、predict_validation_chunks_only、
+predict_next_chunk_by_unique_key 会对同一股票重复调用 df_preprocess。这里按
+(symbol, stock_type, start_date, end_date, horizon_len, time_step) 缓存 (df, df_train, df_test, df_val)：
+
+- 内存预算：DF_CACHE_MAX_BYTES（默认 256MB）与 DF_CACHE_MAX_ENTRIES（默认 32），超出时淘汰最久未使用项
+- 过期：DF_CACHE_TTL（默认 600 秒），避免服务长时间运行后读到同步前的旧数据；
+  本进程内的同步（PostgresHandler.sync_stock）会立即通过 invalidate_symbol 删除该股票的缓存项
+- 单飞：同一 key 的并发调用只执行一次加载
+- 隔离：返回副本，调用方添加 unique_id 等列不会污染缓存。
+  pandas >= 3 默认写时复制（Copy-on-Write），返回浅拷贝即可；更早版本返回深拷贝
+- DF_CACHE_ENABLED=0 关闭缓存
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _copy_on_write_enabled() -> bool:
+    try:
+        if int(pd.__version__.split(".")[0]) >= 3:
+            return True
+        return bool(pd.options.mode.copy_on_write)
+    except Exception:
+        return False
+
+
+def _frame_bytes(frames: Tuple[Any, ...]) -> int:
+    total = 0
+    for f in frames:
+        if isinstance(f, pd.DataFrame):
+            total += int(f.memory_usage(index=True, deep=True).sum())
+    return total
+
+
+class DataFrameLRUCache:
+    """按字节预算与条目数淘汰的 LRU 缓存，值为 DataFrame 元组"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 32, ttl: float = 600.0):
+        self.max_bytes = int(max_bytes)
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Tuple[Any, ...]]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, ...]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._pop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[2]
+
+    def set(self, key: Hashable, frames: Tuple[Any, ...]) -> None:
+        size = _frame_bytes(frames)
+        self._pop(key)
+        if size > self.max_bytes:
+            # 单项超过预算时不缓存
+            return
+        while self._data and (self.bytes + size > self.max_bytes or len(self._data) >= self.max_entries):
+            old_key = next(iter(self._data))
+            self._pop(old_key)
+            self.evictions += 1
+        self._data[key] = (time.monotonic() + self.ttl, size, frames)
+        self.bytes += size
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """predicate 为空时清空全部，否则删除满足条件的 key；返回删除数量"""
+        keys = list(self._data) if predicate is None else [k for k in self._data if predicate(k)]
+        for k in keys:
+            self._pop(k)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+    @staticmethod
+    def _isolate(frames: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        deep = not _copy_on_write_enabled()
+        return tuple(f.copy(deep=deep) if isinstance(f, pd.DataFrame) else f for f in frames)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Tuple[Any, ...]]]) -> Tuple[Any, ...]:
+        """
+        命中时返回缓存副本；未命中时调用 loader。结果中任一项为 None（预处理失败）时不写入缓存。
+        """
+        frames = self.get(key)
+        if frames is not None:
+            self.hits += 1
+            return self._isolate(frames)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return self._isolate(await asyncio.shield(pending))
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            frames = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()
+            raise
+        else:
+            if frames and all(f is not None for f in frames):
+                self.set(key, frames)
+            fut.set_result(frames)
+            return self._isolate(frames)
+        finally:
+            self._inflight.pop(key, None)
+
+
+df_preprocess_cache = DataFrameLRUCache(
+    max_bytes=int(os.environ.get("DF_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    max_entries=int(os.environ.get("DF_CACHE_MAX_ENTRIES", "32")),
+    ttl=float(os.environ.get("DF_CACHE_TTL", "600")),
+)
+
+
+def df_cache_enabled() -> bool:
+    return _env_flag("DF_CACHE_ENABLED")
+
+
+def invalidate_symbol(symbol: str, stock_type: Optional[int] = None) -> int:
+    """
+    删除该股票（可选限定类型）的全部缓存项。processor.py 将其注册为 PostgresHandler 的数据变化回调：
+    sync_stock 写入新数据、或本地行情缓存因复权价变化整表重建后调用
+    """
+    return df_preprocess_cache.invalidate(
+        lambda k: k[0] == symbol and (stock_type is None or str(k[1]) == str(stock_type))
+    )
@@ -41,9 +41,12 @@ akshare_dir = os.path.join(finance_dir, 'akshare-tools')
 sys.path.append(akshare_dir)
 
 from postgres import PostgresHandler
+from df_cache import df_preprocess_cache, df_cache_enabled, invalidate_symbol
 base_url = "http://localhost:58004"
 base_url = os.getenv("POSTGRES_URL", base_url)
 pg_client = PostgresHandler(base_url=base_url)
+# 同步写入新数据后删除该股票的 df_preprocess 缓存，不必等 DF_CACHE_TTL 过期
+pg_client.add_sync_listener(invalidate_symbol)
 
 def to_symbol(stock_code: str, stock_type: int = 1) -> str:
     s = str(stock_code).lower()
@@ -56,7 +59,39 @@ def to_symbol(stock_code: str, stock_type: int = 1) -> str:
             return f"sz{stock_code}"
     return stock_code
 
+def _normalize_date_range(start_date=None, end_date=None, years=12):
+    """与 df_preprocess 内部一致的起止日期规范化（YYYYMMDD），用于生成缓存 key"""
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
+    end_norm = _to_yyyymmdd(end_date) if end_date is not None and str(end_date).strip() else None
+    end_date = end_norm or yesterday
+    start_norm = _to_yyyymmdd(start_date) if start_date is not None and str(start_date).strip() else None
+    if start_norm is None:
+        if (start_date is None or str(start_date).strip() == "") and years > 0:
+            start_norm = (datetime.strptime(end_date, "%Y%m%d") - timedelta(days=years*365)).strftime("%Y%m%d")
+        else:
+            start_norm = "20100101"
+    if start_norm > end_date:
+        start_norm = (datetime.strptime(end_date, "%Y%m%d") - timedelta(days=years*365)).strftime("%Y%m%d")
+    return start_norm, end_date
+
+
 async def df_preprocess(stock_code, stock_type, start_date=None, end_date=None, time_step=0, years=12, horizon_len=7):
+    """
+    预处理股票数据（带进程内 LRU 缓存，见 df_cache.py；返回值为缓存的副本，可安全修改）
+
+    参数与返回值同 _df_preprocess_uncached。
+    """
+    if not df_cache_enabled():
+        return await _df_preprocess_uncached(stock_code, stock_type, start_date, end_date, time_step, years=years, horizon_len=horizon_len)
+    start_norm, end_norm = _normalize_date_range(start_date, end_date, years)
+    key = (to_symbol(stock_code, stock_type), str(stock_type), start_norm, end_norm, int(horizon_len), int(time_step or 0))
+    return await df_preprocess_cache.get_or_load(
+        key,
+        lambda: _df_preprocess_uncached(stock_code, stock_type, start_norm, end_norm, time_step, years=years, horizon_len=horizon_len),
+    )
+
+
+async def _df_preprocess_uncached(stock_code, stock_type, start_date=None, end_date=None, time_step=0, years=12, horizon_len=7):
     """
     预处理股票数据
     
@@ -98,32 +133,33 @@ async def df_preprocess(stock_code, stock_type, start_date=None, end_date=None,
         
         symbol = to_symbol(stock_code, stock_type)
         logger.info(f"获取股票{symbol} 数据，时间范围：{start_date} 到 {end_date} ，股票类型：{stock_type}")
-        df = await pg_client.ensure_date_range_df(symbol=symbol, start_date=start_date, end_date=end_date, stock_type=stock_type)
+        # 只需 OHLCV 列：走按列接口，减少传输与解码
+        df = await pg_client.ensure_date_range_df(symbol=symbol, start_date=start_date, end_date=end_date, stock_type=stock_type, projected=True)
         # 检查数据是否成功获取
         if df is None:
             print(f"❌ 无法获取股票 {stock_code} 的数据")
-            return None, None, None
+            return None, None, None, None
         
         if df.empty:
             print(f"❌ 股票 {stock_code} 返回空数据")
-            return None, None, None
+            return None, None, None, None
         
         # 检查数据质量
         if len(df) < horizon_len * 2:
             print(f"❌ 股票 {stock_code} 数据量不足 (仅有 {len(df)} 条记录，需要至少 {horizon_len * 2} 条)")
-            return None, None, None
+            return None, None, None, None
         
         # 检查必要的列是否存在
         required_columns = ['close']
         missing_columns = [col for col in required_columns if col not in df.columns]
         if missing_columns:
             print(f"❌ 股票 {stock_code} 数据缺少必要列: {missing_columns}")
-            return None, None, None
+            return None, None, None, None
         
         df.rename(columns={'symbol': 'stock_code'}, inplace=True)
         # 删除多余列
         del_columns = ["type", "created_at", "updated_at", "id", "percentage_change", "amount_change", "turnover_rate"]
-        df.drop(columns=del_columns, inplace=True)
+        df.drop(columns=del_columns, inplace=True, errors="ignore")
         
         # 确保datetime列是正确的日期格式
         try:
@@ -134,14 +170,14 @@ async def df_preprocess(stock_code, stock_type, start_date=None, end_date=None,
                 df['ds'] = pd.to_datetime(df.index)
         except Exception as e:
             print(f"❌ 股票 {stock_code} 日期格式转换失败: {str(e)}")
-            return None, None, None
+            return None, None, None, None
         
         # 创建专门用于绘图的日期列（字符串格式）
         try:
             df['ds_plot'] = df['ds'].dt.strftime('%Y-%m-%d')
         except Exception as e:
             print(f"❌ 股票 {stock_code} 日期格式化失败: {str(e)}")
-            return None, None, None
+            return None, None, None, None
         
         # 删除不需要的列
         if 'datetime_int' in df.columns:
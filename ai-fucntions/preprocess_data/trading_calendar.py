@@ -0,0 +1,174 @@
+"""
+上交所（XSHG）交易日历的进程内缓存
+
+trading_date_processor 中的 get_trading_days / get_previous_trading_days / get_trading_date_range
+原先每次调用都会经过 xcals.get_calendar + sessions_in_range + 逐个 Timestamp 转换，
+ensure_date_range_df、sync_stock 每次取数都会触发。这里：
+
+- 首次使用时加载一次 XSHG 日历（线程安全的懒加载），交易日保存为升序 datetime64[D] 数组
+- 区间、之后 N 个、之前 N 个交易日查询均用 np.searchsorted 二分查找
+- 可选磁盘快照（TRADING_CALENDAR_SNAPSHOT=1，默认开启）：
+  {TRADING_CALENDAR_CACHE_DIR}/xshg_sessions.npz，超过 TRADING_CALENDAR_MAX_AGE_DAYS（默认 7 天）重建，
+  进程启动时无需构建 exchange_calendars 日历
+
+日期超出日历范围（exchange_calendars 默认约为过去 20 年到明年年底）时抛出 ValueError，
+与 sessions_in_range 的 DateOutOfBounds 行为一致，调用方可回退到工作日近似。
+"""
+
+import os
+import logging
+import threading
+from datetime import date, datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ai_functions_dir = os.path.dirname(current_dir)
+
+EXCHANGE = "XSHG"
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _to_day(value) -> np.datetime64:
+    """str(YYYYMMDD / YYYY-MM-DD) / date / datetime / Timestamp / datetime64 -> datetime64[D]"""
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[D]")
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return np.datetime64(value.strftime("%Y-%m-%d"), "D")
+    if isinstance(value, date):
+        return np.datetime64(value.isoformat(), "D")
+    return np.datetime64(pd.Timestamp(value).strftime("%Y-%m-%d"), "D")
+
+
+class TradingCalendar:
+    """交易日数组 + 二分查找；sessions 为升序 datetime64[D]"""
+
+    def __init__(self, sessions: np.ndarray):
+        self.sessions = np.asarray(sessions, dtype="datetime64[D]")
+        self.first_session = self.sessions[0]
+        self.last_session = self.sessions[-1]
+
+    @classmethod
+    def from_exchange_calendars(cls, exchange: str = EXCHANGE) -> "TradingCalendar":
+        import exchange_calendars as xcals
+
+        cal = xcals.get_calendar(exchange)
+        return cls(cal.sessions.values.astype("datetime64[D]"))
+
+    def _check_bounds(self, name: str, day: np.datetime64) -> None:
+        if day < self.first_session or day > self.last_session:
+            raise ValueError(f"{name}={day} 超出交易日历范围 [{self.first_session}, {self.last_session}]")
+
+    def is_session(self, value) -> bool:
+        day = _to_day(value)
+        i = int(np.searchsorted(self.sessions, day, side="left"))
+        return i < len(self.sessions) and self.sessions[i] == day
+
+    def sessions_in_range(self, start, end) -> np.ndarray:
+        """[start, end] 内的交易日（含端点），语义同 xcals sessions_in_range"""
+        start_day, end_day = _to_day(start), _to_day(end)
+        self._check_bounds("start", start_day)
+        self._check_bounds("end", end_day)
+        lo = int(np.searchsorted(self.sessions, start_day, side="left"))
+        hi = int(np.searchsorted(self.sessions, end_day, side="right"))
+        return self.sessions[lo:hi]
+
+    def next_sessions(self, value, n: int, include: bool = True) -> np.ndarray:
+        """value 起（include=False 时不含 value 当天）之后的 n 个交易日；不足 n 个时抛出 ValueError"""
+        day = _to_day(value)
+        self._check_bounds("date", day)
+        lo = int(np.searchsorted(self.sessions, day, side="left" if include else "right"))
+        if lo + n > len(self.sessions):
+            raise ValueError(f"{day} 之后的交易日不足 {n} 个（日历截止 {self.last_session}）")
+        return self.sessions[lo:lo + n]
+
+    def previous_sessions(self, value, n: int, include: bool = False) -> np.ndarray:
+        """value 之前（include=True 时含 value 当天）的 n 个交易日，按时间正序；不足 n 个时抛出 ValueError"""
+        day = _to_day(value)
+        self._check_bounds("date", day)
+        hi = int(np.searchsorted(self.sessions, day, side="right" if include else "left"))
+        if hi - n < 0:
+            raise ValueError(f"{day} 之前的交易日不足 {n} 个（日历起始 {self.first_session}）")
+        return self.sessions[hi - n:hi]
+
+    # --------------------------- 格式转换 ---------------------------
+    @staticmethod
+    def to_dates(sessions: np.ndarray) -> List[date]:
+        return sessions.astype("datetime64[D]").astype(object).tolist()
+
+    @staticmethod
+    def to_compact(sessions: np.ndarray) -> List[str]:
+        return [s.replace("-", "") for s in np.datetime_as_string(sessions, unit="D").tolist()]
+
+
+# --------------------------- 进程内单例与磁盘快照 ---------------------------
+_calendar: Optional[TradingCalendar] = None
+_lock = threading.Lock()
+
+
+def snapshot_path() -> str:
+    root = os.environ.get("TRADING_CALENDAR_CACHE_DIR", os.path.join(ai_functions_dir, "stock-data-cache"))
+    return os.path.join(root, f"{EXCHANGE.lower()}_sessions.npz")
+
+
+def _load_snapshot(path: str) -> Optional[TradingCalendar]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            created = pd.Timestamp(str(data["created_at"]))
+            sessions = data["sessions"]
+        max_age_days = float(os.environ.get("TRADING_CALENDAR_MAX_AGE_DAYS", "7"))
+        if max_age_days > 0 and (pd.Timestamp.now() - created).total_seconds() > max_age_days * 86400:
+            return None
+        if len(sessions) == 0:
+            return None
+        return TradingCalendar(sessions)
+    except Exception as e:
+        logger.warning(f"读取交易日历快照失败，忽略: {e}")
+        return None
+
+
+def _save_snapshot(path: str, cal: TradingCalendar) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(tmp_path, sessions=cal.sessions, created_at=np.array(datetime.now().isoformat(timespec="seconds")))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"写入交易日历快照失败: {e}")
+
+
+def get_calendar() -> TradingCalendar:
+    """返回进程内共享的 XSHG 交易日历（首次调用时加载）"""
+    global _calendar
+    if _calendar is not None:
+        return _calendar
+    with _lock:
+        if _calendar is not None:
+            return _calendar
+        use_snapshot = _env_flag("TRADING_CALENDAR_SNAPSHOT")
+        path = snapshot_path()
+        cal = _load_snapshot(path) if use_snapshot else None
+        if cal is None:
+            cal = TradingCalendar.from_exchange_calendars()
+            if use_snapshot:
+                _save_snapshot(path, cal)
+        else:
+            logger.info(f"已从快照加载交易日历: {path}")
+        _calendar = cal
+        return _calendar
+
+
+def reset_calendar() -> None:
+    """丢弃进程内日历（下次使用时重新加载），用于长时间运行的服务跨年更新"""
+    global _calendar
+    with _lock:
+        _calendar = None
@@ -1,8 +1,9 @@
-import exchange_calendars as xcals
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
 
+from trading_calendar import TradingCalendar, get_calendar
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -10,7 +11,7 @@ logger = logging.getLogger(__name__)
 
 def get_trading_days(start_date, end_date, need_: bool = True):
     """
-    使用exchange_calendars获取中国股市的交易日
+    使用exchange_calendars获取中国股市的交易日（进程内缓存的交易日数组，见 trading_calendar.py）
     
     Args:
         start_date: 开始日期 (datetime or str)
@@ -21,7 +22,7 @@ def get_trading_days(start_date, end_date, need_: bool = True):
     """
     try:
         # 获取中国股市日历
-        china_calendar = xcals.get_calendar('XSHG')  # 上海证券交易所
+        china_calendar = get_calendar()  # 上海证券交易所
         
         # 确保日期格式正确
         if isinstance(start_date, str):
@@ -35,16 +36,13 @@ def get_trading_days(start_date, end_date, need_: bool = True):
             else:
                 return [start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d')]
         # 获取交易日
-        trading_days = china_calendar.sessions_in_range(
-            start_date.strftime('%Y-%m-%d'),
-            end_date.strftime('%Y-%m-%d')
-        )
+        trading_days = china_calendar.sessions_in_range(start_date, end_date)
 
         # 转换为日期列表
         if need_:
-            trading_dates = [date.date() for date in trading_days]
+            trading_dates = TradingCalendar.to_dates(trading_days)
         else:
-            trading_dates = [date.strftime('%Y%m%d') for date in trading_days]
+            trading_dates = TradingCalendar.to_compact(trading_days)
         
         logger.info(f"交易日历: {start_date.date()} 到 {end_date.date()}")
         logger.info(f"总交易日数量: {len(trading_dates)}")
@@ -115,7 +113,7 @@ def get_previous_trading_days(reference_date=None, days=1):
             reference_date = pd.to_datetime(reference_date)
         
         # 获取中国股市日历
-        china_calendar = xcals.get_calendar('XSHG')  # 上海证券交易所
+        china_calendar = get_calendar()  # 上海证券交易所
         
         # 为了确保能获取到足够的交易日，我们向前推算更多的自然日
         # 通常交易日约占自然日的70%，所以我们推算 days * 2 的自然日应该足够
@@ -123,13 +121,10 @@ def get_previous_trading_days(reference_date=None, days=1):
         start_date = reference_date - timedelta(days=lookback_days)
         
         # 获取这个时间段内的所有交易日
-        trading_days = china_calendar.sessions_in_range(
-            start_date.strftime('%Y-%m-%d'),
-            reference_date.strftime('%Y-%m-%d')
-        )
+        trading_days = china_calendar.sessions_in_range(start_date, reference_date)
         
         # 转换为日期列表并按时间倒序排列
-        trading_dates = [date.date() for date in trading_days]
+        trading_dates = TradingCalendar.to_dates(trading_days)
         # trading_dates.sort(reverse=True)  # 最近的日期在前
         
         # 过滤掉参考日期当天（如果它是交易日）
@@ -190,23 +185,13 @@ def get_trading_date_range(start_date, days):
             start_date = pd.to_datetime(start_date)
         
         # 获取中国股市日历
-        china_calendar = xcals.get_calendar('XSHG')  # 上海证券交易所
-        
-        # 为了确保能获取到足够的交易日，我们向后推算更多的自然日
-        lookforward_days = max(days * 2, 15)  # 至少推算60天
-        end_date = start_date + timedelta(days=lookforward_days)
-        
-        # 获取这个时间段内的所有交易日
-        trading_days = china_calendar.sessions_in_range(
-            start_date.strftime('%Y-%m-%d'),
-            end_date.strftime('%Y-%m-%d')
-        )
+        china_calendar = get_calendar()  # 上海证券交易所
         
-        # 转换为日期列表
-        trading_dates = [date.date() for date in trading_days]
+        # 二分查找开始日期（含）之后的 n 个交易日，不再依赖自然日估算窗口（长假时窗口可能不足 n 个交易日）
+        trading_days = china_calendar.next_sessions(start_date, days)
         
         # 返回前n天的交易日
-        result = trading_dates[:days]
+        result = TradingCalendar.to_dates(trading_days)
         
         logger.info(f"开始日期: {start_date.date()}")
         logger.info(f"请求连续 {days} 个交易日")
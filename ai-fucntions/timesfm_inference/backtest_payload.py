@@ -0,0 +1,136 @@
+"""
+回测结果上传载荷的紧凑编码
+
+save_backtest_result_to_pg 原先把净值曲线、日期等以 Python list 直接序列化为 JSON，
+长验证区间下单次载荷可达数 MB，Go 端解析大量浮点文本也较慢。这里提供：
+- 曲线数组：float32 小端字节序 + base64（字段 packed_curves，curves_encoding = "f32le-b64"）
+- 曲线日期：起始日期 + 逐项天数差（字段 packed_curve_dates）
+- 可选降采样（LTTB），仅用于展示，保留首尾点与曲线形态
+
+Go 端（postgres-handler saveTimesfmBacktestHandler）解码后仍以原 JSONB 结构入库，读取方无需改动。
+"""
+
+import base64
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+CURVES_ENCODING = "f32le-b64"
+# 与 curve_dates 一一对应、参与打包与降采样的曲线字段
+CURVE_FIELDS = ("equity_curve_values", "equity_curve_pct", "equity_curve_pct_gross", "actual_end_prices")
+
+
+def pack_f32(values: Sequence[float]) -> str:
+    """float 序列 -> float32 小端字节 -> base64 字符串"""
+    arr = np.asarray(values, dtype="<f4")
+    return base64.b64encode(arr.tobytes()).decode("ascii")
+
+
+def unpack_f32(text: str) -> np.ndarray:
+    """pack_f32 的逆操作"""
+    return np.frombuffer(base64.b64decode(text), dtype="<f4")
+
+
+def pack_dates(dates: Sequence[Any]) -> Optional[Dict[str, Any]]:
+    """
+    日期列表 -> {"start": "YYYY-MM-DD", "deltas": [相邻日期天数差...]}
+    日期无法解析时返回 None，调用方回退到原始 curve_dates。
+    """
+    if not dates:
+        return {"start": None, "deltas": []}
+    try:
+        days = np.asarray([np.datetime64(str(d)[:10], "D") for d in dates])
+    except Exception:
+        return None
+    deltas = np.diff(days).astype(np.int64)
+    return {"start": str(days[0]), "deltas": deltas.tolist()}
+
+
+def unpack_dates(packed: Dict[str, Any]) -> List[str]:
+    """pack_dates 的逆操作"""
+    start = packed.get("start")
+    if not start:
+        return []
+    cur = date.fromisoformat(start)
+    out = [cur.isoformat()]
+    for d in packed.get("deltas") or []:
+        cur = cur + timedelta(days=int(d))
+        out.append(cur.isoformat())
+    return out
+
+
+def lttb_indices(y: Sequence[float], max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（升序，含首尾）。
+    x 轴使用下标（交易日序号），与曲线展示一致。
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points <= 0 or n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    y = np.nan_to_num(y, nan=0.0)
+    idx = np.empty(max_points, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    # 中间 n-2 个点均分到 max_points-2 个桶
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 下一个桶的均值作为三角形的第三个顶点
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        nhi = max(nhi, nlo + 1)
+        cx = (nlo + nhi - 1) / 2.0
+        cy = y[nlo:nhi].mean()
+        xs = np.arange(lo, hi)
+        areas = np.abs((a - cx) * (y[lo:hi] - y[a]) - (a - xs) * (cy - y[a]))
+        a = int(lo + np.argmax(areas))
+        idx[i + 1] = a
+    return idx
+
+
+def downsample_curves(result: Dict[str, Any], max_points: int, key: str = "equity_curve_pct") -> Dict[str, Any]:
+    """
+    按 key 对应曲线选取 LTTB 下标，并对 curve_dates 与全部 CURVE_FIELDS 应用同一组下标。
+    返回仅包含曲线相关字段的新 dict，长度不一致的字段原样保留。
+    """
+    dates = list(result.get("curve_dates") or [])
+    n = len(dates)
+    out: Dict[str, Any] = {"curve_dates": dates}
+    for f in CURVE_FIELDS:
+        out[f] = list(result.get(f) or [])
+    if max_points <= 0 or n <= max_points:
+        return out
+
+    driver = out.get(key) or []
+    if len(driver) != n:
+        driver = out.get("equity_curve_values") or []
+    if len(driver) != n:
+        return out
+    idx = lttb_indices(driver, max_points)
+    out["curve_dates"] = [dates[i] for i in idx]
+    for f in CURVE_FIELDS:
+        vals = out[f]
+        if len(vals) == n:
+            out[f] = [vals[i] for i in idx]
+    return out
+
+
+def compact_curve_fields(result: Dict[str, Any], max_points: int = 0) -> Dict[str, Any]:
+    """
+    生成紧凑编码的曲线字段，用于替换载荷中的 curve_dates / equity_curve_* / actual_end_prices。
+    日期无法解析时 curve_dates 保持原样（Go 端优先使用 packed_curve_dates，缺失时读取 curve_dates）。
+    """
+    curves = downsample_curves(result, max_points)
+    fields: Dict[str, Any] = {
+        "curves_encoding": CURVES_ENCODING,
+        "packed_curves": {f: pack_f32(curves[f]) for f in CURVE_FIELDS},
+    }
+    packed_dates = pack_dates(curves["curve_dates"])
+    if packed_dates is not None:
+        fields["packed_curve_dates"] = packed_dates
+    else:
+        fields["curve_dates"] = [str(d) for d in curves["curve_dates"]]
+    return fields
@@ -0,0 +1,309 @@
+"""
+分块预测响应的列式存储（替代 {stock_code}_chunked_response.json）
+
+目录布局：forecast-results/{stock_code}_chunked_response/
+- header.json                         元信息（标量字段、分块日期、精简后的 metrics、各列长度）
+- {section}__actual.npy               实际值，float32，形状 (分块数, 最大长度)，不足部分填 NaN
+- {section}__{列名}.npy               预测列（如 mtf-0.5），float32，同上
+- concatenated__actual.npy / concatenated__{列名}.npy   拼接后的一维序列
+
+section 为 chunk_results / validation_chunk_results。
+每一列都是独立的 .npy 文件，读取时可使用 mmap，且只加载需要的分位数列。
+旧版 JSON 在首次读取时自动迁移为该格式。
+"""
+
+import os
+import json
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from req_res_types import ChunkedPredictionResponse, ChunkPredictionResult
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+finance_dir = os.path.dirname(current_dir)
+
+FORMAT_NAME = "chunked-columnar"
+FORMAT_VERSION = 1
+SECTIONS = ("chunk_results", "validation_chunk_results")
+# all_quantile_metrics 中可由 predictions/actual_values 还原的冗余字段，不写入 header
+_REDUNDANT_METRIC_KEYS = ("pred_values", "actual_values")
+
+
+def _out_dir() -> str:
+    return os.path.join(finance_dir, "forecast-results")
+
+
+def columnar_path(stock_code: str) -> str:
+    return os.path.join(_out_dir(), f"{stock_code}_chunked_response")
+
+
+def legacy_json_path(stock_code: str) -> str:
+    return os.path.join(_out_dir(), f"{stock_code}_chunked_response.json")
+
+
+def _json_default(o):
+    if isinstance(o, np.floating):
+        return float(o)
+    if isinstance(o, np.integer):
+        return int(o)
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return str(o)
+
+
+def _slim_metrics(metrics: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not metrics:
+        return {}
+    out = dict(metrics)
+    qm = out.get("all_quantile_metrics")
+    if isinstance(qm, dict):
+        out["all_quantile_metrics"] = {
+            q: {k: v for k, v in (m or {}).items() if k not in _REDUNDANT_METRIC_KEYS}
+            for q, m in qm.items()
+        }
+    return out
+
+
+def _restore_metrics(metrics: Dict[str, Any], predictions: Dict[str, List[float]], actual_values: List[float]) -> Dict[str, Any]:
+    """还原 all_quantile_metrics 中被省略的 pred_values/actual_values（按两者最短长度截断，与生成逻辑一致）"""
+    qm = metrics.get("all_quantile_metrics") if metrics else None
+    if not isinstance(qm, dict):
+        return metrics
+    for q, m in qm.items():
+        if isinstance(m, dict) and q in predictions:
+            min_len = min(len(predictions[q]), len(actual_values))
+            m["pred_values"] = predictions[q][:min_len]
+            m["actual_values"] = actual_values[:min_len]
+    return metrics
+
+
+def _get(obj, name, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def _pack_rows(rows: List[Optional[List[float]]]) -> Tuple[np.ndarray, List[int]]:
+    lengths = [len(r) if r is not None else 0 for r in rows]
+    width = max(lengths) if lengths else 0
+    arr = np.full((len(rows), width), np.nan, dtype=np.float32)
+    for i, r in enumerate(rows):
+        if lengths[i]:
+            arr[i, :lengths[i]] = np.asarray([np.nan if v is None else v for v in r], dtype=np.float32)
+    return arr, lengths
+
+
+def _write_section(path: str, section: str, chunks: List[Any]) -> Dict[str, Any]:
+    columns: List[str] = []
+    for cr in chunks:
+        for col in (_get(cr, "predictions") or {}).keys():
+            if col not in columns:
+                columns.append(col)
+
+    actual, actual_lengths = _pack_rows([list(_get(cr, "actual_values") or []) for cr in chunks])
+    np.save(os.path.join(path, f"{section}__actual.npy"), actual)
+
+    pred_lengths: Dict[str, List[int]] = {}
+    for col in columns:
+        arr, lengths = _pack_rows([(_get(cr, "predictions") or {}).get(col) for cr in chunks])
+        np.save(os.path.join(path, f"{section}__{col}.npy"), arr)
+        pred_lengths[col] = lengths
+
+    return {
+        "columns": columns,
+        "actual_lengths": actual_lengths,
+        "pred_lengths": pred_lengths,
+        "chunks": [
+            {
+                "chunk_index": int(_get(cr, "chunk_index", 0)),
+                "chunk_start_date": str(_get(cr, "chunk_start_date", "")),
+                "chunk_end_date": str(_get(cr, "chunk_end_date", "")),
+                "metrics": _slim_metrics(_get(cr, "metrics")),
+            }
+            for cr in chunks
+        ],
+    }
+
+
+def save_chunked_response(resp: Any, stock_code: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> str:
+    """
+    将分块预测响应写为列式格式。resp 可为 ChunkedPredictionResponse 或旧版 JSON 解析出的 dict。
+    先写入临时目录再原子替换，避免读取到写了一半的文件。
+    """
+    stock_code = stock_code or _get(resp, "stock_code")
+    path = columnar_path(stock_code)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp_path, exist_ok=True)
+
+    header: Dict[str, Any] = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "stock_code": stock_code,
+        "total_chunks": _get(resp, "total_chunks", 0),
+        "horizon_len": _get(resp, "horizon_len", 0),
+        "context_len": _get(resp, "context_len", 0),
+        "overall_metrics": _get(resp, "overall_metrics") or {},
+        "processing_time": _get(resp, "processing_time", 0.0),
+        "concatenated_dates": _get(resp, "concatenated_dates"),
+        "sections": {},
+    }
+    if extra:
+        header.update(extra)
+
+    for section in SECTIONS:
+        chunks = _get(resp, section)
+        if chunks is None:
+            header["sections"][section] = None
+            continue
+        header["sections"][section] = _write_section(tmp_path, section, list(chunks))
+
+    concat_preds = _get(resp, "concatenated_predictions")
+    concat_actual = _get(resp, "concatenated_actual")
+    header["concatenated_columns"] = list(concat_preds.keys()) if concat_preds else None
+    header["has_concatenated_actual"] = concat_actual is not None
+    if concat_preds:
+        for col, values in concat_preds.items():
+            np.save(os.path.join(tmp_path, f"concatenated__{col}.npy"), np.asarray(values, dtype=np.float32))
+    if concat_actual is not None:
+        np.save(os.path.join(tmp_path, "concatenated__actual.npy"), np.asarray(concat_actual, dtype=np.float32))
+
+    with open(os.path.join(tmp_path, "header.json"), "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, default=_json_default)
+
+    if os.path.isdir(path):
+        old_path = f"{path}.old-{os.getpid()}"
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+
+def _load_array(path: str, name: str, mmap: bool) -> Optional[np.ndarray]:
+    file_path = os.path.join(path, f"{name}.npy")
+    if not os.path.exists(file_path):
+        return None
+    return np.load(file_path, mmap_mode="r" if mmap else None)
+
+
+def _to_list(arr: np.ndarray) -> List[float]:
+    # float32 转回 Python float 时按写入精度（4位小数）取整，避免 3.2100000381 之类的尾差
+    return np.round(arr.astype(np.float64), 4).tolist()
+
+
+def _row(arr: np.ndarray, i: int, length: int) -> List[float]:
+    return _to_list(arr[i, :length])
+
+
+def _read_section(path: str, section: str, meta: Dict[str, Any], quantiles: Optional[List[str]], mmap: bool) -> List[ChunkPredictionResult]:
+    columns = meta.get("columns") or []
+    if quantiles is not None:
+        columns = [c for c in columns if c in quantiles]
+    actual = _load_array(path, f"{section}__actual", mmap)
+    actual_lengths = meta.get("actual_lengths") or []
+    pred_arrays = {c: _load_array(path, f"{section}__{c}", mmap) for c in columns}
+    pred_lengths = meta.get("pred_lengths") or {}
+
+    results = []
+    for i, chunk in enumerate(meta.get("chunks") or []):
+        actual_values = _row(actual, i, actual_lengths[i]) if actual is not None and actual_lengths[i] else []
+        predictions = {}
+        for c, arr in pred_arrays.items():
+            n = pred_lengths.get(c, [0] * (i + 1))[i]
+            if arr is not None and n:
+                predictions[c] = _row(arr, i, n)
+        metrics = chunk.get("metrics") or {}
+        if quantiles is None:
+            metrics = _restore_metrics(metrics, predictions, actual_values)
+        results.append(ChunkPredictionResult(
+            chunk_index=int(chunk.get("chunk_index", i)),
+            chunk_start_date=str(chunk.get("chunk_start_date", "")),
+            chunk_end_date=str(chunk.get("chunk_end_date", "")),
+            predictions=predictions,
+            actual_values=actual_values,
+            metrics=metrics,
+        ))
+    return results
+
+
+def load_chunked_response(stock_code: str, quantiles: Optional[List[str]] = None, mmap: bool = True) -> Optional[ChunkedPredictionResponse]:
+    """
+    读取列式格式的分块响应。
+
+    Args:
+        stock_code: 股票代码
+        quantiles: 只加载这些预测列（如 ["mtf-0.5"]）；None 表示全部加载并还原完整 metrics
+        mmap: 是否以内存映射方式打开 .npy
+
+    Returns:
+        ChunkedPredictionResponse；目录不存在或格式不符时返回 None
+    """
+    path = columnar_path(stock_code)
+    header_path = os.path.join(path, "header.json")
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, "r", encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_NAME or header.get("stock_code") != stock_code:
+        return None
+
+    sections = header.get("sections") or {}
+    chunk_results = []
+    if sections.get("chunk_results"):
+        chunk_results = _read_section(path, "chunk_results", sections["chunk_results"], quantiles, mmap)
+    val_results = None
+    if sections.get("validation_chunk_results") is not None:
+        val_results = _read_section(path, "validation_chunk_results", sections["validation_chunk_results"], quantiles, mmap)
+
+    concatenated_predictions = None
+    concat_cols = header.get("concatenated_columns")
+    if concat_cols:
+        if quantiles is not None:
+            concat_cols = [c for c in concat_cols if c in quantiles]
+        concatenated_predictions = {}
+        for c in concat_cols:
+            arr = _load_array(path, f"concatenated__{c}", mmap)
+            if arr is not None:
+                concatenated_predictions[c] = _to_list(arr)
+    concatenated_actual = None
+    if header.get("has_concatenated_actual"):
+        arr = _load_array(path, "concatenated__actual", mmap)
+        concatenated_actual = _to_list(arr) if arr is not None else None
+
+    return ChunkedPredictionResponse(
+        stock_code=header.get("stock_code", stock_code),
+        total_chunks=int(header.get("total_chunks") or len(chunk_results)),
+        horizon_len=int(header.get("horizon_len") or 0),
+        context_len=int(header.get("context_len") or 0),
+        chunk_results=chunk_results,
+        overall_metrics=header.get("overall_metrics") or {},
+        processing_time=float(header.get("processing_time") or 0.0),
+        concatenated_predictions=concatenated_predictions,
+        concatenated_actual=concatenated_actual,
+        concatenated_dates=header.get("concatenated_dates"),
+        validation_chunk_results=val_results,
+    )
+
+
+def migrate_legacy_json(stock_code: str) -> Optional[str]:
+    """
+    将旧版 {stock_code}_chunked_response.json 转换为列式格式。
+    旧 JSON 保留不删；当 JSON 比列式目录更新时（例如旧进程仍在写 JSON）重新迁移。
+    """
+    json_path = legacy_json_path(stock_code)
+    if not os.path.exists(json_path):
+        return None
+    header_path = os.path.join(columnar_path(stock_code), "header.json")
+    if os.path.exists(header_path) and os.path.getmtime(header_path) >= os.path.getmtime(json_path):
+        return columnar_path(stock_code)
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get("stock_code") != stock_code:
+        return None
+    extra = {k: data[k] for k in ("is_public", "user_id") if k in data}
+    path = save_chunked_response(data, stock_code=stock_code, extra=extra)
+    print(f"✅ 已将分块响应 JSON 迁移为列式格式: {json_path} -> {path}")
+    return path
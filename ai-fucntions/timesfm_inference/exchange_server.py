@@ -25,6 +25,9 @@ from timesfm_init import init_timesfm
 from predict_chunked_functions import predict_chunked_mode_for_best, predict_validation_chunks_only
 from req_res_types import ChunkedPredictionRequest, ChunkedPredictionResponse, ChunkPredictionResult
 from http_client import get_json, post_gzip_json
+from lookup_cache import get_strategy_params, get_best_quantile
+from chunked_store import load_chunked_response, migrate_legacy_json
+from backtest_payload import compact_curve_fields, downsample_curves, CURVE_FIELDS
 import os
 import json
 ak_tools_dir = os.path.join(finance_dir, 'akshare-tools')
@@ -473,12 +476,14 @@ def backtest_on_results(
         take_profit_sell_frac=take_profit_sell_frac,
     )
 
-def _load_cached_chunked_response(stock_code: str) -> Optional[ChunkedPredictionResponse]:
+def _load_cached_chunked_response(stock_code: str, quantile_key: Optional[str] = None) -> Optional[ChunkedPredictionResponse]:
     """
-    尝试从 forecast-results 目录加载之前保存的分块预测响应（JSON）。
+    尝试从 forecast-results 目录加载之前保存的分块预测响应。
+    优先读取列式格式（见 chunked_store），旧版 JSON 会在首次读取时自动迁移；
+    指定 quantile_key 时只加载该分位数列。迁移或读取失败时回退到直接解析 JSON。
     若存在并格式正确，则返回 ChunkedPredictionResponse；否则返回 None。
 
-    期望JSON结构:
+    旧版JSON结构:
     {
         "stock_code": str,
         "total_chunks": int,
@@ -501,6 +506,13 @@ def _load_cached_chunked_response(stock_code: str) -> Optional[ChunkedPrediction
         "validation_chunk_results": [ ... ] | null
     }
     """
+    try:
+        migrate_legacy_json(stock_code)
+        resp = load_chunked_response(stock_code, quantiles=[quantile_key] if quantile_key else None)
+        if resp is not None:
+            return resp
+    except Exception as e:
+        print(f"⚠️ 加载列式分块响应失败，回退到JSON: {e}")
     try:
         out_dir = os.path.join(finance_dir, "forecast-results")
         out_path = os.path.join(out_dir, f"{stock_code}_chunked_response.json")
@@ -557,15 +569,7 @@ def _load_cached_chunked_response(stock_code: str) -> Optional[ChunkedPrediction
         return None
 
 async def fetch_strategy_params(unique_key: str) -> Optional[Dict[str, Any]]:
-    status_code, data, text = await get_json(
-        "/api/v1/strategy/params/by-unique",
-        params={"unique_key": unique_key},
-        headers={"Accept-Encoding": "gzip, deflate", "X-Token": "fintrack-dev-token"},
-    )
-    if status_code == 200 and data:
-        if isinstance(data, dict):
-            return data.get("Data") or data.get("data") or data
-    return None
+    return await get_strategy_params(unique_key)
 
 async def run_backtest(
     request: ChunkedPredictionRequest,
@@ -592,7 +596,7 @@ async def run_backtest(
        若不存在最佳分位，则初始化模型并执行“完整分块预测”（含测试集）以选取最佳分位；
     3. 基于预测结果运行回测策略（验证集优先，其次测试集）。
     
-    说明：为保证回测所需的分块数据可用，只有在读取到最佳分位数且存在缓存的 chunked_response.json 时才会跳过预测；
+    说明：为保证回测所需的分块数据可用，只有在读取到最佳分位数且存在缓存的分块响应（列式目录或旧版 chunked_response.json）时才会跳过预测；
     若设置环境变量 FORCE_REPREDICT=1，将强制重新预测以刷新缓存。
     
     Args:
@@ -651,41 +655,14 @@ async def run_backtest(
         pass
 
     # 选择用于回测的固定分位数：优先读取 Go 后端，其次本地 JSON，然后环境变量，最后回退到响应中的测试集最佳分位
+    # 查询结果经 lookup_cache 缓存（TTL + 并发合并），Go后端不可用时回退本地JSON
     fixed_quantile_key = None
-    # 优先从Go后端查询是否已存在记录：/api/v1/predictions/timesfm-best/by-unique?unique_key=...
     try:
         unique_key = f"{request.stock_code}_best_hlen_{request.horizon_len}_clen_{request.context_len}_v_{request.timesfm_version}"
-        status_code, data, text = await get_json(
-            "/api/v1/save-predictions/mtf-best/by-unique",
-            params={"unique_key": unique_key},
-            headers = {
-                "Accept-Encoding": "gzip, deflate",
-                "X-Token": "fintrack-dev-token",
-            }
-        )
-        if status_code == 200 and data:
-            pred = (data or {}).get('prediction') or {}
-            fixed_quantile_key = pred.get('best_prediction_item')
-            if fixed_quantile_key:
-                print(f"从Go后端读取到的固定分位数: {fixed_quantile_key}")
-        else:
-            print(f"ℹ️ 查询Go后端最佳分位失败，HTTP {status_code}: {str(text)[:200]}")
+        fixed_quantile_key = await get_best_quantile(unique_key)
     except Exception as go_err:
-        print(f"ℹ️ 查询Go后端最佳分位异常，回退到本地JSON: {go_err}")
-
-    # 回退：本地JSON缓存
-    if not fixed_quantile_key:
-        try:
-            out_dir = os.path.join(finance_dir, "forecast-results")
-            out_path = os.path.join(out_dir, f"{request.stock_code}_best_hlen_{request.horizon_len}_clen_{request.context_len}_v_{request.timesfm_version}.json")
-            if os.path.exists(out_path):
-                with open(out_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    fixed_quantile_key = data.get("best_prediction_item")
-                    print(f"从 JSON 文件读取到的固定分位数: {fixed_quantile_key}")
-        except Exception as read_err:
-            print(f"⚠️ 读取最佳分位 JSON 失败: {read_err}")
-            fixed_quantile_key = None
+        print(f"ℹ️ 查询最佳分位异常: {go_err}")
+        fixed_quantile_key = None
 
     # 是否强制重新预测（忽略缓存）
     force_repredict = os.getenv("FORCE_REPREDICT", "0").strip().lower() in ("1", "true", "yes", "y")
@@ -737,7 +714,7 @@ async def run_backtest(
         except Exception as e:
             print(f"⚠️ 查询数据库验证分块失败: {e}")
         if response is None:
-            response = _load_cached_chunked_response(request.stock_code)
+            response = _load_cached_chunked_response(request.stock_code, fixed_quantile_key)
             if response is not None:
                 print(f"✅ 已加载缓存分块响应，跳过预测: {request.stock_code}")
             else:
@@ -854,7 +831,17 @@ async def run_backtest(
         "backtest": result
     }
 
-async def save_backtest_result_to_pg(request, response, result):
+async def save_backtest_result_to_pg(request, response, result, compact: Optional[bool] = None, max_curve_points: Optional[int] = None):
+    """
+    保存回测结果到 Go 后端（/api/v1/save-predictions/backtest），请求体始终 gzip 压缩。
+
+    compact: 曲线以 float32+base64、日期以增量编码上传（默认读取 BACKTEST_PAYLOAD_COMPACT，默认开启）
+    max_curve_points: 曲线展示用降采样点数上限（默认读取 BACKTEST_CURVE_MAX_POINTS，0 表示不降采样）
+    """
+    if compact is None:
+        compact = os.environ.get("BACKTEST_PAYLOAD_COMPACT", "1").strip().lower() in ("1", "true", "yes", "y")
+    if max_curve_points is None:
+        max_curve_points = int(os.environ.get("BACKTEST_CURVE_MAX_POINTS", "0") or 0)
     try:
         unique_key = f"{request.stock_code}_best_hlen_{request.horizon_len}_clen_{request.context_len}_v_{str(request.timesfm_version)}"
 
@@ -912,13 +899,15 @@ async def save_backtest_result_to_pg(request, response, result):
             "predicted_change_stats": _round_obj(result.get("predicted_change_stats", {})),
             "per_chunk_signals": _round_obj(signals_map),
 
-            "equity_curve_values": _round_obj(result.get("equity_curve_values", [])),
-            "equity_curve_pct": _round_obj(result.get("equity_curve_pct", [])),
-            "equity_curve_pct_gross": _round_obj(result.get("equity_curve_pct_gross", [])),
-            "curve_dates": result.get("curve_dates", []),
-            "actual_end_prices": _round_obj(result.get("actual_end_prices", [])),
             "trades": _round_obj(result.get("trades", [])),
         }
+        if compact:
+            payload.update(compact_curve_fields(result, max_curve_points))
+        else:
+            curves = downsample_curves(result, max_curve_points)
+            for f in CURVE_FIELDS:
+                payload[f] = _round_obj(curves[f])
+            payload["curve_dates"] = curves["curve_dates"]
 
         try:
             user_id = int(request.user_id) if getattr(request, 'user_id', None) is not None else None
@@ -957,8 +946,12 @@ async def save_backtest_result_to_pg(request, response, result):
             print("ℹ️ 跳过保存回测结果：缺少有效的验证起止日期")
             return
         base_url = os.environ.get('POSTGRES_API', 'http://go-api.meetlife.com.cn:8000')
-        async with PostgresHandler(base_url=base_url, api_token="fintrack-dev-token") as pg:
-            status_code, data, body_text = await pg.save_backtest_result(payload)
+        status_code, data, body_text = await post_gzip_json(
+            f"{base_url.rstrip('/')}/api/v1/save-predictions/backtest",
+            payload,
+            headers={"Authorization": "Bearer fintrack-dev-token"},
+            timeout=30.0,
+        )
         if status_code == 200:
             print(f"✅ 回测结果已保存: unique_key={unique_key}")
         else:
@@ -24,6 +24,9 @@ import uvicorn
 from predict_chunked_functions import predict_chunked_mode_for_best
 from exchange_server import run_backtest
 from req_res_types import ChunkedPredictionRequest
+from http_client import startup_http_client, shutdown_http_client
+from lookup_cache import invalidate_unique_key, strategy_params_cache, best_quantile_cache
+from df_cache import df_preprocess_cache
 # 设置环境变量
 os.environ['XLA_PYTHON_CLIENT_PREALLOCATE'] = 'false'
 os.environ['JAX_PMAP_USE_TENSORSTORE'] = 'false'
@@ -163,7 +166,13 @@ app.add_middleware(GZipMiddleware, minimum_size=512)
 async def startup_event():
     """应用启动事件"""
     logger.info(f"启动TimesFM推理服务，GPU ID: {GPU_ID}, 端口: {SERVICE_PORT}")
-    
+    await startup_http_client()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭事件"""
+    await shutdown_http_client()
+    logger.info("TimesFM推理服务已关闭")
 
 @app.get("/health")
 async def health_check():
@@ -282,6 +291,38 @@ async def run_backtest_api(req: RunBacktestRequest):
 
 
 
+class CacheInvalidateRequest(BaseModel):
+    """缓存失效请求：策略参数或最佳分位在外部被修改后调用"""
+    unique_key: Optional[str] = None
+
+
+@app.post("/cache/invalidate")
+async def invalidate_lookup_cache(req: CacheInvalidateRequest):
+    """使策略参数/最佳分位缓存失效；未提供 unique_key 时清空全部（含 df_preprocess 数据缓存）"""
+    if req.unique_key:
+        invalidate_unique_key(req.unique_key)
+    else:
+        strategy_params_cache.clear()
+        best_quantile_cache.clear()
+        df_preprocess_cache.clear()
+    return {
+        "success": True,
+        "unique_key": req.unique_key,
+        "strategy_params_cache": strategy_params_cache.stats(),
+        "best_quantile_cache": best_quantile_cache.stats(),
+        "df_preprocess_cache": df_preprocess_cache.stats(),
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """各进程内缓存的命中/未命中统计"""
+    return {
+        "strategy_params_cache": strategy_params_cache.stats(),
+        "best_quantile_cache": best_quantile_cache.stats(),
+        "df_preprocess_cache": df_preprocess_cache.stats(),
+    }
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -1,9 +1,16 @@
 import os
 import asyncio
+import logging
 from typing import Any, Dict, Optional, Tuple
 
 import httpx
 
+logger = logging.getLogger(__name__)
+
+# 进程级共享连接池：同一事件循环内复用 TCP/TLS 连接（keep-alive），避免每次请求重新建连
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
 
 def get_base_url() -> str:
     return os.environ.get("FINTRACK_API_URL", "http://go-api.meetlife.com.cn:8000").rstrip("/")
@@ -17,6 +24,79 @@ def build_url(path_or_url: str) -> str:
     return f"{base}{path}"
 
 
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "y")
+
+
+def _build_limits() -> httpx.Limits:
+    """连接池限制，可通过环境变量调整"""
+    return httpx.Limits(
+        max_connections=int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.environ.get("HTTP_POOL_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 需要额外安装 h2（pip install httpx[http2]），未安装时自动回退到 HTTP/1.1"""
+    if not _env_flag("HTTP_POOL_HTTP2"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP_POOL_HTTP2=1 但未安装 h2，回退到 HTTP/1.1")
+        return False
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def get_client() -> httpx.AsyncClient:
+    """
+    获取进程级共享的 httpx.AsyncClient。
+
+    httpx 的连接绑定到创建时的事件循环；脚本中多次 asyncio.run 会产生新的事件循环，
+    此时丢弃旧客户端并重新创建，保证在 FastAPI 与命令行脚本中都可安全使用。
+    """
+    global _client, _client_loop
+    loop = _current_loop()
+    if _client is not None and not _client.is_closed and _client_loop is loop:
+        return _client
+    stale = _client
+    _client = httpx.AsyncClient(limits=_build_limits(), http2=_http2_enabled())
+    _client_loop = loop
+    if stale is not None and not stale.is_closed:
+        try:
+            await stale.aclose()
+        except Exception:
+            # 旧事件循环已关闭时，其连接无法再优雅关闭，直接丢弃
+            pass
+    return _client
+
+
+async def startup_http_client() -> None:
+    """FastAPI startup 钩子：预先创建共享客户端"""
+    await get_client()
+    logger.info("共享 HTTP 客户端已创建")
+
+
+async def shutdown_http_client() -> None:
+    """FastAPI shutdown 钩子：关闭共享客户端并释放连接"""
+    global _client, _client_loop
+    if _client is not None:
+        try:
+            await _client.aclose()
+        finally:
+            _client = None
+            _client_loop = None
+            logger.info("共享 HTTP 客户端已关闭")
+
+
 def _should_retry(status_code: Optional[int]) -> bool:
     if status_code is None:
         return True
@@ -46,14 +126,14 @@ async def get_json(
     attempt = 0
     while attempt <= max_retries:
         try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                resp = await client.get(url, params=params, headers=hdrs)
-                status_code = resp.status_code
-                text = resp.text
-                try:
-                    data = resp.json()
-                except Exception:
-                    data = None
+            client = await get_client()
+            resp = await client.get(url, params=params, headers=hdrs, timeout=timeout)
+            status_code = resp.status_code
+            text = resp.text
+            try:
+                data = resp.json()
+            except Exception:
+                data = None
             if not _should_retry(status_code):
                 break
         except Exception:
@@ -97,14 +177,14 @@ async def post_gzip_json(
     attempt = 0
     while attempt <= max_retries:
         try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                resp = await client.post(url, content=gz_bytes, headers=hdrs)
-                status_code = resp.status_code
-                text = resp.text
-                try:
-                    data = resp.json()
-                except Exception:
-                    data = None
+            client = await get_client()
+            resp = await client.post(url, content=gz_bytes, headers=hdrs, timeout=timeout)
+            status_code = resp.status_code
+            text = resp.text
+            try:
+                data = resp.json()
+            except Exception:
+                data = None
             if not _should_retry(status_code):
                 break
         except Exception:
@@ -116,4 +196,3 @@ async def post_gzip_json(
             await asyncio.sleep(backoff_factor * attempt)
 
     return status_code or 0, data, text
-
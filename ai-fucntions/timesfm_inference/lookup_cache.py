@@ -0,0 +1,180 @@
+"""
+策略参数与最佳分位数查询的异步 TTL 缓存
+
+run_backtest、predict_next_chunk_by_unique_key 以及验证集批量流程都会按 unique_key 查询：
+- /api/v1/strategy/params/by-unique           -> 策略参数
+- /api/v1/save-predictions/mtf-best/by-unique -> 最佳分位数（失败时回退 forecast-results/{unique_key}.json）
+
+这里统一做进程内缓存：
+- TTL 过期（LOOKUP_CACHE_TTL，默认 300 秒）
+- 显式失效（写入新的最佳分位/策略参数后调用 invalidate_unique_key）
+- 防击穿：同一 key 的并发请求只会触发一次上游调用，其余请求等待同一结果
+"""
+
+import os
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from http_client import get_json
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+finance_dir = os.path.dirname(current_dir)
+
+GO_API_HEADERS = {"Accept-Encoding": "gzip, deflate", "X-Token": "fintrack-dev-token"}
+
+
+class AsyncTTLCache:
+    """带 TTL、显式失效与单飞（single-flight）加载的异步缓存"""
+
+    def __init__(self, ttl: float = 300.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if len(self._data) >= self.maxsize and key not in self._data:
+            # 先清理过期项，仍然超限时淘汰最早写入的项
+            now = time.monotonic()
+            for k in [k for k, (exp, _) in self._data.items() if exp <= now]:
+                self._data.pop(k, None)
+            if len(self._data) >= self.maxsize:
+                self._data.pop(next(iter(self._data)), None)
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "inflight": len(self._inflight)}
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """
+        命中则直接返回；未命中时调用 loader。同一 key 已有加载在进行时，等待其结果而不是重复请求上游。
+        loader 返回 None 视为未找到，不写入缓存（下次仍会重新查询）。
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # 标记异常已被读取，避免无人等待时打印 "exception was never retrieved"
+            fut.exception()
+            raise
+        else:
+            if value is not None:
+                self.set(key, value, ttl)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+
+_ttl = float(os.environ.get("LOOKUP_CACHE_TTL", "300"))
+strategy_params_cache = AsyncTTLCache(ttl=_ttl)
+best_quantile_cache = AsyncTTLCache(ttl=_ttl)
+
+
+async def _load_strategy_params(unique_key: str) -> Optional[Dict[str, Any]]:
+    status_code, data, text = await get_json(
+        "/api/v1/strategy/params/by-unique",
+        params={"unique_key": unique_key},
+        headers=GO_API_HEADERS,
+    )
+    if status_code == 200 and data:
+        if isinstance(data, dict):
+            return data.get("Data") or data.get("data") or data
+    return None
+
+
+def _read_local_best_quantile(unique_key: str) -> Optional[str]:
+    out_path = os.path.join(finance_dir, "forecast-results", f"{unique_key}.json")
+    if not os.path.exists(out_path):
+        return None
+    try:
+        with open(out_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        best = data.get("best_prediction_item")
+        if best:
+            print(f"从 JSON 文件读取到的固定分位数: {best}")
+        return best
+    except Exception as read_err:
+        print(f"⚠️ 读取最佳分位 JSON 失败: {read_err}")
+        return None
+
+
+async def _load_best_quantile(unique_key: str) -> Optional[str]:
+    best = None
+    try:
+        status_code, data, text = await get_json(
+            "/api/v1/save-predictions/mtf-best/by-unique",
+            params={"unique_key": unique_key},
+            headers=GO_API_HEADERS,
+        )
+        if status_code == 200 and data:
+            pred = (data or {}).get('prediction') or {}
+            best = pred.get('best_prediction_item')
+            if best:
+                print(f"从Go后端读取到的固定分位数: {best}")
+        else:
+            print(f"ℹ️ 查询Go后端最佳分位失败，HTTP {status_code}: {str(text)[:200]}")
+    except Exception as go_err:
+        print(f"ℹ️ 查询Go后端最佳分位异常，回退到本地JSON: {go_err}")
+    if not best:
+        best = _read_local_best_quantile(unique_key)
+    return best
+
+
+async def get_strategy_params(unique_key: str) -> Optional[Dict[str, Any]]:
+    """按 unique_key 获取策略参数（带缓存）"""
+    return await strategy_params_cache.get_or_load(unique_key, lambda: _load_strategy_params(unique_key))
+
+
+async def get_best_quantile(unique_key: str) -> Optional[str]:
+    """按 unique_key 获取最佳分位数（Go后端优先，其次本地JSON；带缓存）"""
+    return await best_quantile_cache.get_or_load(unique_key, lambda: _load_best_quantile(unique_key))
+
+
+def set_best_quantile(unique_key: str, best_prediction_item: Optional[str]) -> None:
+    """写入新的最佳分位后直接更新缓存，避免下一次查询读到旧值"""
+    if best_prediction_item:
+        best_quantile_cache.set(unique_key, best_prediction_item)
+    else:
+        best_quantile_cache.invalidate(unique_key)
+
+
+def invalidate_unique_key(unique_key: str) -> None:
+    """显式失效某个 unique_key 下的全部缓存项"""
+    strategy_params_cache.invalidate(unique_key)
+    best_quantile_cache.invalidate(unique_key)
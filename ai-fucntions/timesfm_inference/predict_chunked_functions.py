@@ -35,6 +35,8 @@ from trading_date_processor import get_trading_date_range
 from math_functions import mean_squared_error, mean_absolute_error
 from postgres import PostgresHandler
 from timesfm_init import init_timesfm
+from lookup_cache import get_best_quantile, set_best_quantile
+from chunked_store import save_chunked_response
 # 在需要时才导入timesfm-2.5版本的inference模块
 def import_predict_2p5():
     # 保存原始sys.path
@@ -113,6 +115,8 @@ async def predict_next_chunk_by_unique_key(
         if not info:
             print(f"❌ 无法解析 unique_key: {unique_key}")
             return None
+        if not best_prediction_item:
+            best_prediction_item = await get_best_quantile(unique_key)
         if not best_prediction_item:
             print(f"❌ 未提供最佳预测项: {best_prediction_item}")
             return None
@@ -778,6 +782,10 @@ async def predict_chunked_mode_for_best(request: ChunkedPredictionRequest) -> Ch
             with open(out_path, "w", encoding="utf-8") as f:
                 json.dump(_round_obj(payload), f, ensure_ascii=False, indent=2)
             print(f"✅ 最佳分位数已保存: {out_path} -> {best_prediction_item}")
+            set_best_quantile(
+                f"{request.stock_code}_best_hlen_{request.horizon_len}_clen_{request.context_len}_v_{request.timesfm_version}",
+                best_prediction_item,
+            )
 
             try:
                 def to_date_str(x):
@@ -882,40 +890,12 @@ async def predict_chunked_mode_for_best(request: ChunkedPredictionRequest) -> Ch
             validation_chunk_results=val_results if val_results else None
         )
 
-        # 将完整的分块响应保存为 JSON，便于后续直接加载并跳过预测
+        # 将完整的分块响应保存为列式格式（float32 .npy + JSON header），便于后续按分位数直接加载并跳过预测
         try:
-            out_dir = os.path.join(finance_dir, "forecast-results")
-            os.makedirs(out_dir, exist_ok=True)
-            out_path = os.path.join(out_dir, f"{request.stock_code}_chunked_response.json")
-
-            def _cr_to_dict(cr: ChunkPredictionResult):
-                return {
-                    "chunk_index": cr.chunk_index,
-                    "chunk_start_date": cr.chunk_start_date,
-                    "chunk_end_date": cr.chunk_end_date,
-                    "predictions": cr.predictions,
-                    "actual_values": cr.actual_values,
-                    "metrics": cr.metrics,
-                }
-
-            payload = {
-                "stock_code": resp.stock_code,
-                "total_chunks": resp.total_chunks,
-                "horizon_len": resp.horizon_len,
-                "chunk_results": [ _cr_to_dict(cr) for cr in (resp.chunk_results or []) ],
-                "overall_metrics": resp.overall_metrics,
-                "processing_time": resp.processing_time,
-                "concatenated_predictions": resp.concatenated_predictions,
-                "concatenated_actual": resp.concatenated_actual,
-                "concatenated_dates": resp.concatenated_dates,
-                "validation_chunk_results": [ _cr_to_dict(vcr) for vcr in (resp.validation_chunk_results or []) ] if resp.validation_chunk_results else None,
-            }
-
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(_round_obj(payload), f, ensure_ascii=False, indent=2)
+            out_path = save_chunked_response(resp)
             print(f"✅ 分块响应已保存: {out_path}")
         except Exception as save_err:
-            print(f"⚠️ 保存分块响应 JSON 失败: {save_err}")
+            print(f"⚠️ 保存分块响应失败: {save_err}")
 
         return resp
     except Exception as e:
@@ -1123,6 +1103,7 @@ async def predict_validation_chunks_only(
                 if status_code == 200:
                     print(f"✅ 已通过Go后端保存timesfm-best(仅验证模式): unique_key={unique_key_best}")
                     saved_best_ok = True
+                    set_best_quantile(unique_key_best, fixed_best_prediction_item)
                 else:
                     print(f"⚠️ 保存timesfm-best失败(仅验证模式): status={status_code}, body={body_text}")
         except Exception as go_err:
@@ -1183,6 +1164,7 @@ async def predict_validation_chunks_only(
                             best_confirmed = (status_code == 200)
                             if best_confirmed:
                                 print(f"✅ 已补写timesfm-best: unique_key={unique_key_val}")
+                                set_best_quantile(unique_key_val, fixed_best_prediction_item)
                             else:
                                 print(f"⚠️ 补写timesfm-best失败: status={status_code}, body={body_text}")
                     except Exception as add_err:
@@ -1289,41 +1271,12 @@ async def predict_validation_chunks_only(
             validation_chunk_results=val_results if val_results else None,
         )
 
-        # 保存响应到JSON，便于回测直接加载
+        # 保存响应为列式格式，便于回测直接加载
         try:
-            out_dir = os.path.join(finance_dir, "forecast-results")
-            os.makedirs(out_dir, exist_ok=True)
-            out_path = os.path.join(out_dir, f"{request.stock_code}_chunked_response.json")
-
-            def _cr_to_dict(cr: ChunkPredictionResult):
-                return {
-                    "chunk_index": cr.chunk_index,
-                    "chunk_start_date": cr.chunk_start_date,
-                    "chunk_end_date": cr.chunk_end_date,
-                    "predictions": cr.predictions,
-                    "actual_values": cr.actual_values,
-                    "metrics": cr.metrics,
-                }
-
-            payload = {
-                "stock_code": resp.stock_code,
-                "total_chunks": resp.total_chunks,
-                "horizon_len": resp.horizon_len,
-                "chunk_results": [],
-                "overall_metrics": resp.overall_metrics,
-                "processing_time": resp.processing_time,
-                "concatenated_predictions": resp.concatenated_predictions,
-                "concatenated_actual": resp.concatenated_actual,
-                "concatenated_dates": resp.concatenated_dates,
-                "validation_chunk_results": [ _cr_to_dict(vcr) for vcr in (resp.validation_chunk_results or []) ] if resp.validation_chunk_results else None,
-                "is_public": 1,
-                "user_id": 1,
-            }
-            with open(out_path, "w", encoding="utf-8") as f:
-                json.dump(_round_obj(payload), f, ensure_ascii=False, indent=2)
+            out_path = save_chunked_response(resp, extra={"is_public": 1, "user_id": 1})
             print(f"✅ 验证集分块响应已保存: {out_path}")
         except Exception as save_err:
-            print(f"⚠️ 保存验证集分块响应 JSON 失败: {save_err}")
+            print(f"⚠️ 保存验证集分块响应失败: {save_err}")
 
         return resp
     except Exception as e:
@@ -0,0 +1,470 @@
+"""
+滚动（walk-forward）优化：预测 + 分位数选择 + 回测
+
+现有流程使用 df_preprocess 的固定 7:2:1 切分：在测试集上选最佳分位数，再在验证集上回测。
+这里把 [训练 | 测试 | 验证] 窗口按固定步长向前滚动，得到多个 fold，用于评估策略的稳健性：
+
+- 所有分块锚点（预测起点）对齐到同一个 horizon_len 网格，相邻 fold 重叠区域的锚点完全相同；
+  每个锚点只预测一次，结果缓存在 forecast-results/walk_forward/ 下（.npz，float32），
+  再次运行或扩大区间时只预测新增锚点
+- 预测只依赖锚点之前的历史数据，因此缓存的预测可以被任意 fold 的测试段或验证段复用
+- 各 fold 的分位数选择与策略回测互不依赖，使用线程池并行执行（WALK_FORWARD_WORKERS，默认 4）
+"""
+
+import os
+import sys
+import time
+import asyncio
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+finance_dir = os.path.dirname(current_dir)
+pre_data_dir = os.path.join(finance_dir, 'preprocess_data')
+if pre_data_dir not in sys.path:
+    sys.path.append(pre_data_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from req_res_types import ChunkedPredictionRequest, ChunkedPredictionResponse, ChunkPredictionResult
+from processor import df_preprocess
+from math_functions import mean_squared_error, mean_absolute_error
+from predict_chunked_functions import predict_single_chunk_mode1
+from exchange_server import backtest_on_results
+from timesfm_init import init_timesfm
+
+PREDICTION_ITEMS = [f"mtf-0.{i}" for i in range(1, 10)]
+
+# 与 run_backtest 默认值保持一致
+DEFAULT_STRATEGY_PARAMS: Dict[str, Any] = {
+    "buy_threshold_pct": 3.0,
+    "sell_threshold_pct": -1.0,
+    "initial_cash": 100000.0,
+    "enable_rebalance": True,
+    "max_position_pct": 1.0,
+    "min_position_pct": 0.2,
+    "slope_position_per_pct": 0.1,
+    "rebalance_tolerance_pct": 0.05,
+    "trade_fee_rate": 0.006,
+    "take_profit_threshold_pct": 10.0,
+    "take_profit_sell_frac": 0.5,
+}
+
+
+@dataclass
+class WalkForwardFold:
+    """单个 fold 的行号区间（左闭右开，均为 horizon_len 的整数倍）"""
+    fold_index: int
+    train_start: int
+    test_start: int
+    val_start: int
+    val_end: int
+
+    def test_anchors(self, horizon_len: int) -> List[int]:
+        return list(range(self.test_start, self.val_start, horizon_len))
+
+    def val_anchors(self, horizon_len: int) -> List[int]:
+        return list(range(self.val_start, self.val_end, horizon_len))
+
+
+def _round_up(x: int, base: int) -> int:
+    return max(base, ((int(x) + base - 1) // base) * base)
+
+
+def build_walk_forward_folds(
+    total_rows: int,
+    horizon_len: int,
+    train_len: int,
+    test_len: int,
+    val_len: int,
+    step: int,
+    max_folds: Optional[int] = None,
+) -> List[WalkForwardFold]:
+    """
+    生成滚动窗口。test_len / val_len / step 向上取整到 horizon_len 的倍数，
+    保证所有 fold 的锚点落在同一网格上（相邻 fold 的重叠锚点可直接复用预测）。
+    """
+    h = int(horizon_len)
+    test_len, val_len, step = _round_up(test_len, h), _round_up(val_len, h), _round_up(step, h)
+    folds: List[WalkForwardFold] = []
+    test_start = int(train_len)
+    while test_start + test_len + val_len <= total_rows:
+        folds.append(WalkForwardFold(
+            fold_index=len(folds),
+            train_start=max(0, test_start - int(train_len)),
+            test_start=test_start,
+            val_start=test_start + test_len,
+            val_end=test_start + test_len + val_len,
+        ))
+        if max_folds is not None and len(folds) >= max_folds:
+            break
+        test_start += step
+    return folds
+
+
+class ForecastCache:
+    """
+    按锚点日期缓存各分位数的预测值。
+
+    key 为锚点（预测区间第一天）的日期；预测只依赖其之前的历史，与所在 fold 无关。
+    落盘格式：anchors (U10) + quantiles (U) + values float32 [锚点数, 分位数, horizon_len]
+    """
+
+    def __init__(self, path: Optional[str], horizon_len: int):
+        self.path = path
+        self.horizon_len = int(horizon_len)
+        self._data: Dict[str, Dict[str, List[float]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.path, allow_pickle=False) as z:
+                anchors, quantiles, values = z["anchors"], z["quantiles"], z["values"]
+            if values.ndim != 3 or values.shape[2] != self.horizon_len:
+                print(f"⚠️ 预测缓存形状不匹配，忽略: {self.path}")
+                return
+            for i, a in enumerate(anchors):
+                self._data[str(a)] = {
+                    str(q): values[i, j].astype(float).tolist()
+                    for j, q in enumerate(quantiles)
+                    if not np.isnan(values[i, j]).any()
+                }
+            print(f"✅ 已加载预测缓存: {self.path}（{len(self._data)} 个锚点）")
+        except Exception as e:
+            print(f"⚠️ 读取预测缓存失败，忽略: {e}")
+            self._data = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, anchor: str) -> Optional[Dict[str, List[float]]]:
+        preds = self._data.get(anchor)
+        if preds:
+            self.hits += 1
+            return preds
+        self.misses += 1
+        return None
+
+    def put(self, anchor: str, predictions: Dict[str, List[float]]) -> None:
+        preds = {k: list(v) for k, v in (predictions or {}).items() if len(v) == self.horizon_len}
+        if preds:
+            self._data[anchor] = preds
+            self._dirty = True
+
+    def save(self) -> Optional[str]:
+        if not self.path or not self._dirty or not self._data:
+            return None
+        anchors = sorted(self._data)
+        quantiles = sorted({q for p in self._data.values() for q in p})
+        values = np.full((len(anchors), len(quantiles), self.horizon_len), np.nan, dtype=np.float32)
+        q_index = {q: j for j, q in enumerate(quantiles)}
+        for i, a in enumerate(anchors):
+            for q, v in self._data[a].items():
+                values[i, q_index[q]] = v
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp.npz"
+        np.savez_compressed(tmp, anchors=np.array(anchors), quantiles=np.array(quantiles), values=values)
+        os.replace(tmp, self.path)
+        self._dirty = False
+        return self.path
+
+
+def forecast_cache_path(request: ChunkedPredictionRequest) -> str:
+    return os.path.join(
+        finance_dir, "forecast-results", "walk_forward",
+        f"{request.stock_code}_hlen_{request.horizon_len}_clen_{request.context_len}_v_{request.timesfm_version}.npz",
+    )
+
+
+def _anchor_key(df: pd.DataFrame, idx: int) -> str:
+    return pd.to_datetime(df['ds'].iloc[idx]).strftime('%Y-%m-%d')
+
+
+def _chunk_result(df: pd.DataFrame, anchor: int, horizon_len: int, chunk_index: int, predictions: Dict[str, List[float]]) -> ChunkPredictionResult:
+    chunk = df.iloc[anchor:anchor + horizon_len]
+    return ChunkPredictionResult(
+        chunk_index=chunk_index,
+        chunk_start_date=pd.to_datetime(chunk['ds'].iloc[0]).strftime('%Y-%m-%d'),
+        chunk_end_date=pd.to_datetime(chunk['ds'].iloc[-1]).strftime('%Y-%m-%d'),
+        predictions=predictions,
+        actual_values=chunk['close'].astype(float).tolist(),
+        metrics={'base_price': float(df['close'].iloc[anchor - 1])},
+    )
+
+
+def select_best_quantile(chunk_results: List[ChunkPredictionResult]) -> Tuple[Optional[str], Dict[str, float]]:
+    """
+    与 predict_chunked_mode_for_best 相同的综合评分：0.3*MSE + 0.3*MAE + 0.4*Var(|预测涨跌幅-实际涨跌幅|)。
+    涨跌幅以各分块锚点前一日收盘价为基准。
+    """
+    best_item, best_score, best_metrics = None, float('inf'), {}
+    for item in PREDICTION_ITEMS:
+        item_mse, item_mae, item_returns = [], [], []
+        for cr in chunk_results:
+            pred_values = (cr.predictions or {}).get(item)
+            if not pred_values or not cr.actual_values:
+                continue
+            item_mse.append(mean_squared_error(cr.actual_values, pred_values))
+            item_mae.append(mean_absolute_error(cr.actual_values, pred_values))
+            base_price = (cr.metrics or {}).get('base_price') or cr.actual_values[0]
+            pred_return = (pred_values[-1] - base_price) / base_price * 100
+            actual_return = (cr.actual_values[-1] - base_price) / base_price * 100
+            item_returns.append(abs(pred_return - actual_return))
+        if not item_mse:
+            continue
+        avg_mse, avg_mae = float(np.mean(item_mse)), float(np.mean(item_mae))
+        return_diff = float(np.var(item_returns)) if item_returns else float('inf')
+        composite_score = 0.3 * avg_mse + 0.3 * avg_mae + 0.4 * return_diff
+        if composite_score < best_score:
+            best_item, best_score = item, composite_score
+            best_metrics = {'mse': avg_mse, 'mae': avg_mae, 'return_diff': return_diff, 'composite_score': composite_score}
+    return best_item, best_metrics
+
+
+def _max_drawdown_pct(values: List[float]) -> float:
+    if not values:
+        return 0.0
+    arr = np.asarray(values, dtype=float)
+    peak = np.maximum.accumulate(arr)
+    dd = np.where(peak > 0, arr / peak - 1.0, 0.0)
+    return float(max(0.0, -dd.min()) * 100)
+
+
+def evaluate_fold(
+    fold: WalkForwardFold,
+    df: pd.DataFrame,
+    predictions_by_anchor: Dict[int, Dict[str, List[float]]],
+    request: ChunkedPredictionRequest,
+    strategy_params: Dict[str, Any],
+) -> Dict[str, Any]:
+    """单个 fold：测试段选分位数，验证段用该分位数回测（纯 CPU，可并行）"""
+    h = request.horizon_len
+    test_results = [
+        _chunk_result(df, a, h, i, predictions_by_anchor[a])
+        for i, a in enumerate(fold.test_anchors(h)) if a in predictions_by_anchor
+    ]
+    val_results = [
+        _chunk_result(df, a, h, i, predictions_by_anchor[a])
+        for i, a in enumerate(fold.val_anchors(h)) if a in predictions_by_anchor
+    ]
+    best_item, best_metrics = select_best_quantile(test_results)
+    out: Dict[str, Any] = {
+        "fold_index": fold.fold_index,
+        "train_start_date": _anchor_key(df, fold.train_start),
+        "test_start_date": _anchor_key(df, fold.test_start),
+        "val_start_date": _anchor_key(df, fold.val_start),
+        "val_end_date": _anchor_key(df, fold.val_end - 1),
+        "test_chunks": len(test_results),
+        "val_chunks": len(val_results),
+        "best_prediction_item": best_item,
+        "best_metrics": best_metrics,
+    }
+    if not best_item or not val_results:
+        out["error"] = "no forecasts for this fold"
+        return out
+
+    response = ChunkedPredictionResponse(
+        stock_code=request.stock_code,
+        total_chunks=len(val_results),
+        horizon_len=h,
+        context_len=request.context_len,
+        chunk_results=val_results,
+        overall_metrics={'best_prediction_item': best_item, 'best_metrics': best_metrics},
+        processing_time=0.0,
+    )
+    bt = backtest_on_results(response, val_results, fixed_quantile_key=best_item, **strategy_params)
+    out.update({
+        "total_return_pct": bt.get("total_return_pct"),
+        "annualized_return_pct": bt.get("annualized_return_pct"),
+        "benchmark_return_pct": bt.get("benchmark_return_pct"),
+        "excess_return_pct": round(float(bt.get("total_return_pct", 0.0)) - float(bt.get("benchmark_return_pct", 0.0)), 4),
+        "max_drawdown_pct": round(_max_drawdown_pct(bt.get("equity_curve_values") or []), 4),
+        "trades": len(bt.get("trades") or []),
+        "total_fees_paid": bt.get("total_fees_paid"),
+    })
+    return out
+
+
+def summarize_folds(fold_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in fold_results if "total_return_pct" in r]
+    if not ok:
+        return {"folds": len(fold_results), "evaluated_folds": 0}
+    returns = np.array([float(r["total_return_pct"]) for r in ok])
+    excess = np.array([float(r["excess_return_pct"]) for r in ok])
+    drawdowns = np.array([float(r["max_drawdown_pct"]) for r in ok])
+    quantiles: Dict[str, int] = {}
+    for r in ok:
+        quantiles[r["best_prediction_item"]] = quantiles.get(r["best_prediction_item"], 0) + 1
+    return {
+        "folds": len(fold_results),
+        "evaluated_folds": len(ok),
+        "mean_return_pct": round(float(returns.mean()), 4),
+        "median_return_pct": round(float(np.median(returns)), 4),
+        "std_return_pct": round(float(returns.std()), 4),
+        "min_return_pct": round(float(returns.min()), 4),
+        "max_return_pct": round(float(returns.max()), 4),
+        "mean_excess_return_pct": round(float(excess.mean()), 4),
+        "beat_benchmark_ratio": round(float((excess > 0).mean()), 4),
+        "positive_return_ratio": round(float((returns > 0).mean()), 4),
+        "mean_max_drawdown_pct": round(float(drawdowns.mean()), 4),
+        "best_quantile_counts": dict(sorted(quantiles.items())),
+    }
+
+
+async def run_walk_forward(
+    request: ChunkedPredictionRequest,
+    train_len: Optional[int] = None,
+    test_len: Optional[int] = None,
+    val_len: Optional[int] = None,
+    step: Optional[int] = None,
+    max_folds: Optional[int] = None,
+    strategy_params: Optional[Dict[str, Any]] = None,
+    max_workers: Optional[int] = None,
+    use_disk_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    运行滚动优化。
+
+    Args:
+        request: 与 predict_chunked_mode_for_best 相同的请求对象（股票、区间、horizon_len、context_len、版本）
+        train_len: 首个 fold 测试段之前至少保留的历史行数（默认 context_len）
+        test_len / val_len: 测试段 / 验证段行数（默认 20 / 10 个 horizon_len）
+        step: 每次向前滚动的行数（默认 val_len）
+        max_folds: fold 数上限
+        strategy_params: 回测参数，缺省项使用 DEFAULT_STRATEGY_PARAMS
+        max_workers: 并行评估的线程数（默认 WALK_FORWARD_WORKERS 或 4）
+        use_disk_cache: 是否读写锚点预测缓存
+
+    Returns:
+        Dict[str, Any]: folds（每个 fold 的分位数与回测指标）、summary（稳健性统计）、forecast_cache（复用情况）
+    """
+    start_time = time.time()
+    h = int(request.horizon_len)
+    params = dict(DEFAULT_STRATEGY_PARAMS)
+    params.update(strategy_params or {})
+    if max_workers is None:
+        max_workers = int(os.environ.get("WALK_FORWARD_WORKERS", "4"))
+
+    df, _, _, _ = await df_preprocess(
+        request.stock_code,
+        request.stock_type,
+        request.start_date,
+        request.end_date,
+        request.time_step,
+        years=request.years,
+        horizon_len=h,
+    )
+    if df is None or df.empty:
+        return {"stock_code": request.stock_code, "folds": [], "summary": {}, "error": "Data preprocessing failed"}
+    df = df.reset_index(drop=True)
+    df["unique_id"] = df["stock_code"].astype(str)
+
+    folds = build_walk_forward_folds(
+        total_rows=len(df),
+        horizon_len=h,
+        train_len=train_len if train_len is not None else request.context_len,
+        test_len=test_len if test_len is not None else 20 * h,
+        val_len=val_len if val_len is not None else 10 * h,
+        step=step if step is not None else (val_len if val_len is not None else 10 * h),
+        max_folds=max_folds,
+    )
+    if not folds:
+        print(f"❌ 股票 {request.stock_code} 数据量不足以构造滚动窗口（{len(df)} 条）")
+        return {"stock_code": request.stock_code, "folds": [], "summary": {}, "error": "Not enough data for walk-forward folds"}
+
+    anchors = sorted({a for f in folds for a in f.test_anchors(h) + f.val_anchors(h)})
+    total_chunk_slots = sum(len(f.test_anchors(h)) + len(f.val_anchors(h)) for f in folds)
+    print(f"📊 滚动窗口: {len(folds)} 个 fold, 分块 {total_chunk_slots} 个, 去重后锚点 {len(anchors)} 个")
+
+    cache = ForecastCache(forecast_cache_path(request) if use_disk_cache else None, h)
+    predictions_by_anchor: Dict[int, Dict[str, List[float]]] = {}
+    missing: List[int] = []
+    for a in anchors:
+        preds = cache.get(_anchor_key(df, a))
+        if preds:
+            predictions_by_anchor[a] = preds
+        else:
+            missing.append(a)
+
+    if missing:
+        tfm = init_timesfm(h, request.context_len) if request.timesfm_version == "2.0" else None
+        for i, a in enumerate(tqdm(missing, desc="滚动窗口锚点预测")):
+            result = predict_single_chunk_mode1(
+                df_train=df.iloc[:a],
+                df_test=df.iloc[a:a + h],
+                tfm=tfm,
+                chunk_index=i,
+                request=request,
+            )
+            if result.predictions:
+                cache.put(_anchor_key(df, a), result.predictions)
+                predictions_by_anchor[a] = result.predictions
+        try:
+            saved = cache.save()
+            if saved:
+                print(f"✅ 锚点预测缓存已保存: {saved}")
+        except Exception as save_err:
+            print(f"⚠️ 保存锚点预测缓存失败: {save_err}")
+
+    sem = asyncio.Semaphore(max(1, max_workers))
+
+    async def _run(fold: WalkForwardFold) -> Dict[str, Any]:
+        async with sem:
+            try:
+                return await asyncio.to_thread(evaluate_fold, fold, df, predictions_by_anchor, request, params)
+            except Exception as e:
+                print(f"⚠️ fold {fold.fold_index} 评估失败: {e}")
+                return {"fold_index": fold.fold_index, "error": str(e)}
+
+    fold_results = await asyncio.gather(*[_run(f) for f in folds])
+
+    return {
+        "stock_code": request.stock_code,
+        "horizon_len": h,
+        "context_len": request.context_len,
+        "timesfm_version": request.timesfm_version,
+        "fold_layout": [asdict(f) for f in folds],
+        "folds": list(fold_results),
+        "summary": summarize_folds(list(fold_results)),
+        "strategy_params": params,
+        "forecast_cache": {
+            "anchors": len(anchors),
+            "chunk_slots": total_chunk_slots,
+            "reused_from_cache": len(anchors) - len(missing),
+            "newly_forecasted": len(missing),
+        },
+        "processing_time": time.time() - start_time,
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    test_request = ChunkedPredictionRequest(
+        user_id=1,
+        stock_code="sh510050",
+        years=15,
+        horizon_len=7,
+        start_date="20100101",
+        end_date="20251114",
+        context_len=2048,
+        time_step=0,
+        stock_type=2,
+        timesfm_version="2.5",
+    )
+    wf = asyncio.run(run_walk_forward(test_request, max_folds=int(os.environ.get("WALK_FORWARD_MAX_FOLDS", "12"))))
+    for r in wf["folds"]:
+        print(
+            f"fold {r.get('fold_index')}: {r.get('val_start_date')} ~ {r.get('val_end_date')} "
+            f"分位={r.get('best_prediction_item')} 收益={r.get('total_return_pct')}% 基准={r.get('benchmark_return_pct')}%"
+        )
+    print(json.dumps(wf["summary"], ensure_ascii=False, indent=2))
+    print(json.dumps(wf["forecast_cache"], ensure_ascii=False, indent=2))
@@ -2,9 +2,12 @@ package main
 
 import (
 	"database/sql"
+	"encoding/base64"
+	"encoding/binary"
 	"encoding/json"
 	"fmt"
 	"log/slog"
+	"math"
 	"net/http"
 	"strconv"
 	"strings"
@@ -719,6 +722,49 @@ func (h *DatabaseHandler) getTimesfmValChunkListHandler(c *gin.Context) {
     c.JSON(http.StatusOK, ApiResponse{Code: 200, Message: "Success", Data: list})
 }
 
+// packedDates 增量编码的日期序列：起始日期 + 相邻日期的天数差
+type packedDates struct {
+	Start  string `json:"start"`
+	Deltas []int  `json:"deltas"`
+}
+
+func (p *packedDates) decode() ([]string, error) {
+	if strings.TrimSpace(p.Start) == "" {
+		return []string{}, nil
+	}
+	t, err := time.Parse("2006-01-02", p.Start)
+	if err != nil {
+		return nil, err
+	}
+	out := make([]string, 0, len(p.Deltas)+1)
+	out = append(out, t.Format("2006-01-02"))
+	for _, d := range p.Deltas {
+		t = t.AddDate(0, 0, d)
+		out = append(out, t.Format("2006-01-02"))
+	}
+	return out, nil
+}
+
+// decodeFloat32LE 解码 base64 的 float32 小端数组，并保留 4 位小数（与明文上传时的精度一致）
+func decodeFloat32LE(s string) ([]float64, error) {
+	raw, err := base64.StdEncoding.DecodeString(s)
+	if err != nil {
+		return nil, err
+	}
+	if len(raw)%4 != 0 {
+		return nil, fmt.Errorf("byte length %d is not a multiple of 4", len(raw))
+	}
+	out := make([]float64, len(raw)/4)
+	for i := range out {
+		v := float64(math.Float32frombits(binary.LittleEndian.Uint32(raw[i*4:])))
+		if math.IsNaN(v) || math.IsInf(v, 0) {
+			v = 0
+		}
+		out[i] = math.Round(v*1e4) / 1e4
+	}
+	return out, nil
+}
+
 func (h *DatabaseHandler) saveTimesfmBacktestHandler(c *gin.Context) {
     var req struct {
         UniqueKey                              string                   `json:"unique_key"`
@@ -751,6 +797,10 @@ func (h *DatabaseHandler) saveTimesfmBacktestHandler(c *gin.Context) {
 		CurveDates                             []string                 `json:"curve_dates"`
 		ActualEndPrices                        []float64                `json:"actual_end_prices"`
 		Trades                                 []map[string]interface{} `json:"trades"`
+		// 紧凑编码（可选）：curves_encoding = "f32le-b64" 时曲线来自 packed_curves，日期来自 packed_curve_dates
+		CurvesEncoding   string            `json:"curves_encoding"`
+		PackedCurves     map[string]string `json:"packed_curves"`
+		PackedCurveDates *packedDates      `json:"packed_curve_dates"`
 	}
 	if err := c.ShouldBindJSON(&req); err != nil {
 		c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid JSON"})
@@ -760,6 +810,38 @@ func (h *DatabaseHandler) saveTimesfmBacktestHandler(c *gin.Context) {
 		c.JSON(http.StatusBadRequest, gin.H{"error": "unique_key, symbol, timesfm_version are required"})
 		return
 	}
+	if req.CurvesEncoding != "" {
+		if req.CurvesEncoding != "f32le-b64" {
+			c.JSON(http.StatusBadRequest, gin.H{"error": fmt.Sprintf("unsupported curves_encoding: %s", req.CurvesEncoding)})
+			return
+		}
+		targets := map[string]*[]float64{
+			"equity_curve_values":    &req.EquityCurveValues,
+			"equity_curve_pct":       &req.EquityCurvePct,
+			"equity_curve_pct_gross": &req.EquityCurvePctGross,
+			"actual_end_prices":      &req.ActualEndPrices,
+		}
+		for name, dst := range targets {
+			packed, ok := req.PackedCurves[name]
+			if !ok {
+				continue
+			}
+			vals, err := decodeFloat32LE(packed)
+			if err != nil {
+				c.JSON(http.StatusBadRequest, gin.H{"error": fmt.Sprintf("invalid packed curve %s: %v", name, err)})
+				return
+			}
+			*dst = vals
+		}
+		if req.PackedCurveDates != nil {
+			dates, err := req.PackedCurveDates.decode()
+			if err != nil {
+				c.JSON(http.StatusBadRequest, gin.H{"error": fmt.Sprintf("invalid packed_curve_dates: %v", err)})
+				return
+			}
+			req.CurveDates = dates
+		}
+	}
 	posJSON, _ := json.Marshal(req.PositionControl)
 	statsJSON, _ := json.Marshal(req.PredictedChangeStats)
 	signalsJSON, _ := json.Marshal(req.PerChunkSignals)
@@ -1139,6 +1221,44 @@ func (h *DatabaseHandler) getStockDataByDateRangeHandler(c *gin.Context) {
 	c.JSON(http.StatusOK, ApiResponse{Code: 200, Message: "Success", Data: data})
 }
 
+// getStockDataColumnsByDateRangeHandler 与 /range 相同的查询条件，按列返回 datetime/open/high/low/close/volume/amount
+func (h *DatabaseHandler) getStockDataColumnsByDateRangeHandler(c *gin.Context) {
+	symbol := c.Param("symbol")
+	var req struct {
+		Type      *int   `json:"type"`
+		StartDate string `json:"start_date"`
+		EndDate   string `json:"end_date"`
+	}
+	if err := c.ShouldBindJSON(&req); err != nil {
+		c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid JSON"})
+		return
+	}
+	stockType := 1
+	if req.Type != nil {
+		stockType = *req.Type
+	}
+	if req.StartDate == "" || req.EndDate == "" {
+		c.JSON(http.StatusBadRequest, gin.H{"error": "start_date and end_date parameters are required"})
+		return
+	}
+	startDate, err := time.Parse("2006-01-02", req.StartDate)
+	if err != nil {
+		c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid start_date format (YYYY-MM-DD)"})
+		return
+	}
+	endDate, err := time.Parse("2006-01-02", req.EndDate)
+	if err != nil {
+		c.JSON(http.StatusBadRequest, gin.H{"error": "Invalid end_date format (YYYY-MM-DD)"})
+		return
+	}
+	data, err := h.GetStockDataColumnsByDateRange(symbol, stockType, startDate, endDate)
+	if err != nil {
+		c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
+		return
+	}
+	c.JSON(http.StatusOK, ApiResponse{Code: 200, Message: "Success", Data: data})
+}
+
 func (h *DatabaseHandler) insertEtfDailyHandler(c *gin.Context) {
 	var req struct {
 		Code          string  `json:"code"`
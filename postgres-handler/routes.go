@@ -23,6 +23,7 @@ func RegisterRoutes(r *gin.Engine, handler *DatabaseHandler, apiToken string) {
 		api.POST("/stock-data/batch", handler.batchInsertStockDataHandler)
 		api.POST("/stock-data/:symbol", handler.getStockDataHandler)
 		api.POST("/stock-data/:symbol/range", handler.getStockDataByDateRangeHandler)
+		api.POST("/stock-data/:symbol/range/columns", handler.getStockDataColumnsByDateRangeHandler)
 
 		api.POST("/etf/daily", handler.insertEtfDailyHandler)
 		api.POST("/etf/daily/batch", handler.batchInsertEtfDailyHandler)
@@ -72,6 +73,7 @@ func RegisterRoutes(r *gin.Engine, handler *DatabaseHandler, apiToken string) {
 	log.Printf("  POST /api/v1/stock-data/batch - Batch insert stock data")
 	log.Printf("  POST /api/v1/stock-data/:symbol - Get stock data (JSON body: {type, limit, offset})")
 	log.Printf("  POST /api/v1/stock-data/:symbol/range - Get stock data by date range (JSON body: {type, start_date, end_date})")
+	log.Printf("  POST /api/v1/stock-data/:symbol/range/columns - Get datetime/open/high/low/close/volume/amount as per-column arrays (JSON body: {type, start_date, end_date})")
 	log.Printf("  POST /api/v1/etf/daily - Upsert single ETF daily data")
 	log.Printf("  POST /api/v1/etf/daily/batch - Batch upsert ETF daily data")
 	log.Printf("  POST /api/v1/etf/daily/:code - Query ETF daily data (JSON body: {limit, offset})")
@@ -423,6 +423,45 @@ func (h *DatabaseHandler) GetStockDataByDateRange(symbol string, stockType int,
 	return results, nil
 }
 
+func (h *DatabaseHandler) GetStockDataColumnsByDateRange(symbol string, stockType int, startDate, endDate time.Time) (*StockDataColumns, error) {
+	rows, err := h.db.Raw(`
+    SELECT datetime, open, high, low, close, volume, amount
+    FROM stock_data
+    WHERE symbol = $1 AND type = $2 AND datetime >= $3 AND datetime <= $4
+    ORDER BY datetime ASC`, symbol, stockType, startDate, endDate).Rows()
+	if err != nil {
+		return nil, fmt.Errorf("failed to query stock data columns by date range: %v", err)
+	}
+	defer rows.Close()
+	cols := &StockDataColumns{
+		Datetime: []int64{},
+		Open:     []float64{},
+		High:     []float64{},
+		Low:      []float64{},
+		Close:    []float64{},
+		Volume:   []int64{},
+		Amount:   []float64{},
+	}
+	for rows.Next() {
+		var (
+			dt                           time.Time
+			open, high, low, close, amnt float64
+			volume                       int64
+		)
+		if err := rows.Scan(&dt, &open, &high, &low, &close, &volume, &amnt); err != nil {
+			return nil, fmt.Errorf("failed to scan row: %v", err)
+		}
+		cols.Datetime = append(cols.Datetime, dt.Unix())
+		cols.Open = append(cols.Open, open)
+		cols.High = append(cols.High, high)
+		cols.Low = append(cols.Low, low)
+		cols.Close = append(cols.Close, close)
+		cols.Volume = append(cols.Volume, volume)
+		cols.Amount = append(cols.Amount, amnt)
+	}
+	return cols, nil
+}
+
 func (h *DatabaseHandler) GetEtfDaily(code string, limit int, offset int) ([]EtfDailyData, error) {
 	rows, err := h.db.Raw(`
     SELECT code, trading_date, name, latest_price, change_amount, change_percent,
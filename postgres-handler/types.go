@@ -24,6 +24,17 @@ type StockData struct {
 
 func (StockData) TableName() string { return "stock_data" }
 
+// StockDataColumns 按列返回的行情数据（仅预测所需列），datetime 为 Unix 秒
+type StockDataColumns struct {
+	Datetime []int64   `json:"datetime"`
+	Open     []float64 `json:"open"`
+	High     []float64 `json:"high"`
+	Low      []float64 `json:"low"`
+	Close    []float64 `json:"close"`
+	Volume   []int64   `json:"volume"`
+	Amount   []float64 `json:"amount"`
+}
+
 type EtfDailyData struct {
 	Code          string    `json:"code" gorm:"column:code;primaryKey"`
 	TradingDate   time.Time `json:"trading_date" gorm:"column:trading_date;primaryKey"`